@@ -23,7 +23,12 @@ import memspaces implementations to module level
 import logging
 from logging.config import dictConfig
 from .xmlrpc import MemSpaceClient, MemSpaceServer
-from .shmem import MemSpace
+from .binary import MemSpaceBinaryClient, MemSpaceBinaryServer
+from .shmem import MemSpace, Blob
+from .aio import AsyncMemSpace, AsyncMemSpaceClient
+from .shard import ShardedMemSpaceClient
+from .replica import MemSpaceReplicaServer
+from .templates import Typed, Range, Prefix, OneOf
 
 
 LOGGING_CONFIG = dict(
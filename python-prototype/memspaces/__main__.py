@@ -21,23 +21,45 @@ this module is the entry point for the tuple spaces server.
 '''
 
 import argparse
-from memspaces import MemSpaceServer
+from memspaces import MemSpaceServer, MemSpaceBinaryServer
+from memspaces.xmlrpc import space_api
 
 
 def main():
     '''
     entry point - invoked when run from the command line.
     '''
-    parser = argparse.ArgumentParser(description='memspaces xmlrpc server')
+    parser = argparse.ArgumentParser(description='memspaces server')
     parser.add_argument(
         '--listen', action='store', default='127.0.0.1',
         help='the host to listen on for memspaces client connections')
     parser.add_argument(
         '--port', action='store', default=8888, type=int,
         help='the port to listen on for memspaces client connections')
+    parser.add_argument(
+        '--protocol', action='store', default='xmlrpc', choices=['xmlrpc', 'binary'],
+        help='the protocol to talk to memspaces clients')
+    parser.add_argument(
+        '--workers', action='store', default=1, type=int,
+        help='the number of threads handling xmlrpc requests concurrently')
+    parser.add_argument(
+        '--shmem', action='store', default=None,
+        help='the name of the shared memory to keep the spaces in, to share them with local processes')
+    parser.add_argument(
+        '--path', action='store', default=None,
+        help='the directory to keep the spaces in durably')
 
     args = parser.parse_args()
-    server = MemSpaceServer(args.listen, args.port)
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.protocol == 'binary' and args.workers != 1:
+        parser.error('--workers is only supported with the xmlrpc protocol')
+    if args.protocol == 'binary':
+        api = space_api('', args.shmem, args.path)
+        server = MemSpaceBinaryServer(args.listen, args.port, api=api)
+    else:
+        server = MemSpaceServer(args.listen, args.port, workers=args.workers,
+                                shmem=args.shmem, path=args.path)
     server.serve_forever()
 
 
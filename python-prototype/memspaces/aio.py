@@ -0,0 +1,415 @@
+ ##############################################################################
+ #    memspaces - tuple spaces in shared memory                               #
+ #    Copyright (C) 2017  Andreas Grapentin                                   #
+ #                                                                            #
+ #    This program is free software: you can redistribute it and/or modify    #
+ #    it under the terms of the GNU General Public License as published by    #
+ #    the Free Software Foundation, either version 3 of the License, or       #
+ #    (at your option) any later version.                                     #
+ #                                                                            #
+ #    This program is distributed in the hope that it will be useful,         #
+ #    but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+ #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+ #    GNU General Public License for more details.                            #
+ #                                                                            #
+ #    You should have received a copy of the GNU General Public License       #
+ #    along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+ ##############################################################################
+
+'''
+This module implements asyncio interfaces to the tuple spaces.
+
+AsyncMemSpace wraps a shared memory space. calls that do not wait for tuples
+run right on the event loop, since they only ever wait for the locks of the
+space. coroutines waiting for tuples do not hold a thread each: one watcher
+thread per arity parks on a waiter slot of the space, and retries the
+templates of all coroutines waiting for tuples of that arity whenever such
+tuples are put.
+
+AsyncMemSpaceClient talks the binary protocol to a MemSpaceBinaryServer, with
+the requests of all coroutines sharing one connection.
+'''
+
+import socket
+import asyncio
+import logging
+import threading
+import collections
+from xmlrpc.client import Fault
+import posix_ipc
+from .shmem import MemSpace, WAIT_POLL, SCAN_COUNT
+from .binary import OPS, STATUS_OK, _FRAME, _frame, _unpack
+
+LOG = logging.getLogger()
+
+# the longest pause between the attempts of a waiting get or read of the
+# network client, in seconds
+POLL_MAX = 0.1
+
+
+class _Watcher(threading.Thread):
+    '''
+    a thread waiting for puts of tuples of one arity, on behalf of the
+    coroutines waiting for such tuples
+    '''
+
+    def __init__(self, space, fields):
+        '''
+        constructor - prepare to watch for tuples of the given arity
+        '''
+        super(_Watcher, self).__init__(daemon=True)
+        self.waiters = []
+        self.stopped = False
+        self._space = space
+        self._fields = fields
+        self._slot = None
+
+    def run(self):
+        '''
+        retry the templates of the waiting coroutines until all of them are
+        served, parking on a waiter slot in between
+        '''
+        space = self._space._space
+        self._slot = space._claim_waiter((None,) * self._fields)
+        try:
+            while True:
+                with self._space._lock:
+                    waiters = list(self.waiters)
+                    if not waiters or self.stopped:
+                        del self._space._watchers[self._fields]
+                        for (_, _, loop, future) in waiters:
+                            loop.call_soon_threadsafe(future.cancel)
+                        return
+                for waiter in waiters:
+                    (tpl, func, loop, future) = waiter
+                    if future.done():
+                        continue
+                    res = func(tpl)
+                    if res is not None:
+                        with self._space._lock:
+                            self.waiters.remove(waiter)
+                        loop.call_soon_threadsafe(self._space._resolve, future, func, res)
+
+                if self._slot is None:
+                    threading.Event().wait(WAIT_POLL)
+                    continue
+                try:
+                    space._waiter(self._slot).acquire(WAIT_POLL * 10)
+                except posix_ipc.BusyError:
+                    pass
+        finally:
+            if self._slot is not None:
+                space._release_waiter(self._slot)
+
+    def wake(self):
+        '''
+        make the thread retry the templates right away
+        '''
+        if self._slot is not None:
+            self._space._space._waiter(self._slot).release()
+
+
+class AsyncMemSpace(object):
+    '''
+    this class implements an asyncio interface to a shared memory space.
+    '''
+
+    def __init__(self, name='MemSpace', **kwargs):
+        '''
+        constructor - connect to the shared memory space of the given name,
+        with the arguments of MemSpace
+        '''
+        self._space = MemSpace(name, **kwargs)
+        # guards the watchers and their waiters
+        self._lock = threading.Lock()
+        self._watchers = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, typ, value, traceback):
+        self.close()
+
+    async def put(self, tpl, ttl=None):
+        '''
+        put the given tuple into the tuple space. if ttl is given, the tuple
+        expires after that many seconds, unless taken before.
+        '''
+        self._space.put(tpl, ttl)
+
+    async def put_many(self, tpls, ttl=None):
+        '''
+        put all tuples of the given iterable into the tuple space, expiring
+        after ttl seconds if given.
+        '''
+        self._space.put_many(tpls, ttl)
+
+    async def get(self, tpl, block=False, timeout=None):
+        '''
+        take the queried tuple from the tuple space and return it. if block is
+        set, wait up to timeout seconds, or forever if timeout is None, for a
+        matching tuple to be put.
+        '''
+        return await self._wait(tpl, self._space._take, block, timeout)
+
+    async def read(self, tpl, block=False, timeout=None):
+        '''
+        seek the given tuple in the tuple space and return it. block and
+        timeout behave as for get.
+        '''
+        return await self._wait(tpl, self._space._read, block, timeout)
+
+    async def take_many(self, tpl, n):
+        '''
+        take up to n tuples matching the given template from the tuple space
+        and return them, oldest first.
+        '''
+        return self._space.take_many(tpl, n)
+
+    async def take_all(self, tpl):
+        '''
+        take all tuples matching the given template from the tuple space and
+        return them, oldest first.
+        '''
+        return self._space.take_all(tpl)
+
+    async def scan_page(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce up to count tuples matching the given template, without
+        taking them, from the given cursor, or from the start, and the cursor
+        to continue from, or None if there are no more.
+        '''
+        return self._space.scan_page(tpl, cursor, count)
+
+    def close(self):
+        '''
+        stop waiting for tuples, cancelling the coroutines still waiting, and
+        close the connection to the shmem
+        '''
+        with self._lock:
+            watchers = list(self._watchers.values())
+            for watcher in watchers:
+                watcher.stopped = True
+                watcher.wake()
+        for watcher in watchers:
+            watcher.join()
+        self._space.close()
+
+    async def _wait(self, tpl, func, block, timeout):
+        '''
+        apply the given lookup function to the template until it produces a
+        tuple, with the watcher of the arity of the template retrying it.
+        '''
+        res = func(tpl)
+        if res is not None or not block:
+            return res
+
+        loop = asyncio.get_running_loop()
+        waiter = (tpl, func, loop, loop.create_future())
+        with self._lock:
+            watcher = self._watchers.get(len(tpl))
+            if watcher is None:
+                watcher = self._watchers[len(tpl)] = _Watcher(self, len(tpl))
+                watcher.start()
+            watcher.waiters.append(waiter)
+            # a matching tuple may have been put since the first attempt
+            watcher.wake()
+        try:
+            return await asyncio.wait_for(waiter[3], timeout)
+        except asyncio.TimeoutError:
+            LOG.info('  wait timed out.')
+            return None
+        finally:
+            with self._lock:
+                if waiter in watcher.waiters:
+                    watcher.waiters.remove(waiter)
+
+    def _resolve(self, future, func, res):
+        '''
+        hand the tuple found by a watcher to the waiting coroutine. if it gave
+        up in the meantime, a taken tuple goes back into the space.
+        '''
+        if not future.done():
+            future.set_result(res)
+        elif func == self._space._take:
+            self._space.put(res)
+
+
+class AsyncMemSpaceClient(object):
+    '''
+    The asyncio tuple spaces binary protocol client.
+    '''
+
+    def __init__(self, server, port):
+        '''
+        constructor - prepare to connect to the given server and port. the
+        connection is made by connect, or on entering the client as an async
+        context manager.
+        '''
+        self._address = (server, port)
+        self._reader = None
+        self._writer = None
+        self._receiver = None
+        self._pending = collections.deque()
+        self._next = 0
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, typ, value, traceback):
+        await self.close()
+
+    async def connect(self):
+        '''
+        connect to the server, and produce the client
+        '''
+        (self._reader, self._writer) = await asyncio.open_connection(*self._address)
+        sock = self._writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._receiver = asyncio.ensure_future(self._receive())
+        return self
+
+    async def close(self):
+        '''
+        close the connection to the server
+        '''
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._receiver.cancel()
+        try:
+            await self._receiver
+        except asyncio.CancelledError:
+            pass
+
+    async def put(self, tpl, ttl=None):
+        '''
+        put the given tuple into the tuple space. if ttl is given, the tuple
+        expires after that many seconds, unless taken before.
+        '''
+        return await self._call('put', tpl, ttl)
+
+    async def put_many(self, tpls, ttl=None):
+        '''
+        put all tuples of the given iterable into the tuple space, in a
+        single request, expiring after ttl seconds if given.
+        '''
+        return await self._call('put_many', list(tpls), ttl)
+
+    async def get(self, tpl, block=False, timeout=None):
+        '''
+        take the queried tuple from the tuple space and return it. if block is
+        set, try again with growing pauses of up to POLL_MAX seconds, for up
+        to timeout seconds, or forever if timeout is None.
+        '''
+        return await self._wait('get', tpl, block, timeout)
+
+    async def read(self, tpl, block=False, timeout=None):
+        '''
+        seek the given tuple in the tuple space and return it. block and
+        timeout behave as for get.
+        '''
+        return await self._wait('read', tpl, block, timeout)
+
+    async def take_many(self, tpl, n):
+        '''
+        take up to n queried tuples from the tuple space and return them,
+        oldest first.
+        '''
+        return await self._call('take_many', tpl, n)
+
+    async def take_all(self, tpl):
+        '''
+        take all queried tuples from the tuple space and return them, oldest
+        first.
+        '''
+        return await self._call('take_all', tpl)
+
+    async def scan_page(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce up to count tuples matching the given template, without
+        taking them, from the given cursor, or from the start, and the cursor
+        to continue from, or None if there are no more.
+        '''
+        return tuple(await self._call('scan_page', tpl, cursor, count))
+
+    async def pipeline(self, calls):
+        '''
+        send all of the given (method, args) calls at once, and return their
+        results in order. if any call failed, the first failure is raised
+        once all responses are in.
+        '''
+        futures = [self._send(name, args) for (name, args) in calls]
+        await self._writer.drain()
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for res in results:
+            if isinstance(res, BaseException):
+                raise res
+        return results
+
+    async def _wait(self, name, tpl, block, timeout):
+        '''
+        invoke the given lookup on the server until it produces a tuple
+        '''
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        pause = 0.001
+        while True:
+            res = await self._call(name, tpl)
+            if res is not None or not block:
+                return res
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return None
+                pause = min(pause, remaining)
+            await asyncio.sleep(pause)
+            pause = min(pause * 2, POLL_MAX)
+
+    async def _call(self, name, *args):
+        '''
+        invoke the given api method on the server and return its result
+        '''
+        future = self._send(name, args)
+        await self._writer.drain()
+        return await future
+
+    def _send(self, name, args):
+        '''
+        send a request for the given api method, and produce the future of
+        its result
+        '''
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((self._next, future))
+        self._writer.write(_frame(self._next, OPS.index(name), tuple(args)))
+        self._next = (self._next + 1) & 0xffffffff
+        return future
+
+    async def _receive(self):
+        '''
+        read the responses of the server, which come in request order, and
+        hand them to the requests waiting for them
+        '''
+        try:
+            while True:
+                header = await self._reader.readexactly(_FRAME.size)
+                (length, rid, status) = _FRAME.unpack(header)
+                payload = await self._reader.readexactly(length)
+                (expected, future) = self._pending.popleft()
+                if rid != expected:
+                    raise ConnectionError('response %d out of order, expected %d' % (rid, expected))
+                if future.done():
+                    continue
+                value = _unpack(payload, 0)[0]
+                if status == STATUS_OK:
+                    future.set_result(value)
+                else:
+                    future.set_exception(Fault(status, value))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            while self._pending:
+                (_, future) = self._pending.popleft()
+                if not future.done():
+                    future.set_exception(ConnectionError('connection lost: %s' % e))
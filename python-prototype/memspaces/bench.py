@@ -0,0 +1,267 @@
+ ##############################################################################
+ #    memspaces - tuple spaces in shared memory                               #
+ #    Copyright (C) 2017  Andreas Grapentin                                   #
+ #                                                                            #
+ #    This program is free software: you can redistribute it and/or modify    #
+ #    it under the terms of the GNU General Public License as published by    #
+ #    the Free Software Foundation, either version 3 of the License, or       #
+ #    (at your option) any later version.                                     #
+ #                                                                            #
+ #    This program is distributed in the hope that it will be useful,         #
+ #    but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+ #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+ #    GNU General Public License for more details.                            #
+ #                                                                            #
+ #    You should have received a copy of the GNU General Public License       #
+ #    along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+ ##############################################################################
+
+'''
+this module implements a benchmark harness for the tuple space backends.
+
+every run measures one operation on one backend for every combination of the
+given process counts, space occupancies, tuple sizes and template
+selectivities, and emits one json object per line with throughput and latency
+percentiles.
+
+the space is prefilled with occupancy background tuples. a fraction of them,
+given by the selectivity, is tagged 'hot' and matches the read template, the
+rest is tagged 'cold'. every worker process then puts, takes or reads count
+tuples of its own, timing every call.
+'''
+
+import sys
+import time
+import json
+import socket
+import argparse
+import platform
+import itertools
+from multiprocessing import Process, Queue, Barrier
+import memspaces
+from memspaces.shmem import MEMSPACE_VERSION
+
+BACKENDS = ('shmem', 'xmlrpc', 'binary')
+OPERATIONS = ('put', 'take', 'read')
+
+
+class _ShmemBackend(object):
+    '''
+    benchmark participants on a shared memory space
+    '''
+
+    def __init__(self, name):
+        self.name = name
+
+    def start(self):
+        memspaces.MemSpace(self.name).close()
+
+    def stop(self):
+        memspaces.MemSpace(self.name).unlink()
+
+    def connect(self):
+        return memspaces.MemSpace(self.name)
+
+
+def _serve(protocol, host, port):
+    '''
+    run the server of the given protocol until terminated
+    '''
+    if protocol == 'binary':
+        server = memspaces.MemSpaceBinaryServer(host, port)
+    else:
+        server = memspaces.MemSpaceServer(host, port)
+    server.serve_forever()
+
+
+class _ServerBackend(object):
+    '''
+    benchmark participants talking to a server in a separate process
+    '''
+
+    def __init__(self, protocol, host, port):
+        self.protocol = protocol
+        self.host = host
+        self.port = port
+        self._process = None
+
+    def start(self):
+        self._process = Process(target=_serve, args=(self.protocol, self.host, self.port))
+        self._process.start()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection((self.host, self.port)).close()
+                return
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join()
+
+    def connect(self):
+        if self.protocol == 'binary':
+            return memspaces.MemSpaceBinaryClient(self.host, self.port)
+        return memspaces.MemSpaceClient('http://%s:%d' % (self.host, self.port))
+
+
+def _close(space):
+    '''
+    close the connection of the given benchmark participant
+    '''
+    if isinstance(space, memspaces.MemSpaceClient):
+        space('close')()
+    else:
+        space.close()
+
+
+def _worker(backend, op, worker, count, size, barrier, queue):
+    '''
+    run count operations of the given kind, and report the start and end
+    time and the latency of every call
+    '''
+    space = backend.connect()
+    payload = 'x' * size
+    latencies = []
+    barrier.wait()
+    start = time.perf_counter()
+    for i in range(count):
+        before = time.perf_counter()
+        if op == 'put':
+            space.put(('w', worker, i, payload))
+        elif op == 'take':
+            space.get(('w', worker, None, None))
+        else:
+            space.read(('hot', None, None, None))
+        latencies.append(time.perf_counter() - before)
+    end = time.perf_counter()
+    _close(space)
+    queue.put((start, end, latencies))
+
+
+def _percentile(values, fraction):
+    '''
+    produce the given percentile of the given sorted values
+    '''
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+def run(backend, op, procs, count, occupancy, size, selectivity):
+    '''
+    benchmark the given operation on the given backend with the given
+    parameters, and produce the results as a dict
+    '''
+    backend.start()
+    try:
+        payload = 'x' * size
+        space = backend.connect()
+        hot = int(occupancy * selectivity)
+        space.put_many(('hot' if j < hot else 'cold', -1, j, payload) for j in range(occupancy))
+        if op == 'take':
+            space.put_many(('w', worker, i, payload) for worker in range(procs) for i in range(count))
+        _close(space)
+
+        queue = Queue()
+        barrier = Barrier(procs)
+        workers = [Process(target=_worker, args=(backend, op, worker, count, size, barrier, queue))
+                   for worker in range(procs)]
+        for p in workers:
+            p.start()
+        reports = [queue.get() for _ in workers]
+        for p in workers:
+            p.join()
+    finally:
+        backend.stop()
+
+    latencies = sorted(itertools.chain.from_iterable(lat for (_, _, lat) in reports))
+    elapsed = max(end for (_, end, _) in reports) - min(start for (start, _, _) in reports)
+    return dict(
+        backend=backend.protocol if isinstance(backend, _ServerBackend) else 'shmem',
+        op=op,
+        procs=procs,
+        count=count,
+        occupancy=occupancy,
+        size=size,
+        selectivity=selectivity,
+        ops_per_sec=len(latencies) / elapsed,
+        p50_us=_percentile(latencies, 0.50) * 1e6,
+        p99_us=_percentile(latencies, 0.99) * 1e6,
+        mean_us=sum(latencies) / len(latencies) * 1e6,
+        version=MEMSPACE_VERSION,
+        python=platform.python_version(),
+        time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+    )
+
+
+def _list(kind):
+    '''
+    produce an argparse type for comma separated lists of the given kind
+    '''
+    return lambda value: [kind(x) for x in value.split(',')]
+
+
+def main(argv=None):
+    '''
+    entry point - invoked when run from the command line.
+    '''
+    parser = argparse.ArgumentParser(description='memspaces benchmark')
+    parser.add_argument(
+        '--backends', action='store', default=list(BACKENDS), type=_list(str),
+        help='comma separated backends to benchmark, of %s' % ', '.join(BACKENDS))
+    parser.add_argument(
+        '--ops', action='store', default=list(OPERATIONS), type=_list(str),
+        help='comma separated operations to benchmark, of %s' % ', '.join(OPERATIONS))
+    parser.add_argument(
+        '--procs', action='store', default=[1, 2, 4], type=_list(int),
+        help='comma separated numbers of worker processes')
+    parser.add_argument(
+        '--count', action='store', default=1000, type=int,
+        help='the number of operations per worker process')
+    parser.add_argument(
+        '--occupancy', action='store', default=[0, 10000], type=_list(int),
+        help='comma separated numbers of background tuples in the space')
+    parser.add_argument(
+        '--sizes', action='store', default=[16, 1024], type=_list(int),
+        help='comma separated payload sizes of the tuples, in bytes')
+    parser.add_argument(
+        '--selectivity', action='store', default=[1.0], type=_list(float),
+        help='comma separated fractions of background tuples matched by reads')
+    parser.add_argument(
+        '--name', action='store', default='MemSpaceBench',
+        help='the name of the shared memory space to benchmark')
+    parser.add_argument(
+        '--listen', action='store', default='127.0.0.1',
+        help='the host to run the benchmarked servers on')
+    parser.add_argument(
+        '--port', action='store', default=8899, type=int,
+        help='the port to run the benchmarked servers on')
+    parser.add_argument(
+        '--output', action='store', default=None,
+        help='the file to append the json lines of results to, instead of stdout')
+
+    args = parser.parse_args(argv)
+    for name in args.backends + args.ops:
+        if name not in BACKENDS + OPERATIONS:
+            parser.error('unknown backend or operation: %s' % name)
+
+    out = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        for (name, op, procs, occupancy, size, selectivity) in itertools.product(
+                args.backends, args.ops, args.procs, args.occupancy, args.sizes, args.selectivity):
+            if name == 'shmem':
+                backend = _ShmemBackend(args.name)
+            else:
+                backend = _ServerBackend(name, args.listen, args.port)
+            res = run(backend, op, procs, args.count, occupancy, size, selectivity)
+            out.write(json.dumps(res, sort_keys=True) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+ ##############################################################################
+ #    memspaces - tuple spaces in shared memory                               #
+ #    Copyright (C) 2017  Andreas Grapentin                                   #
+ #                                                                            #
+ #    This program is free software: you can redistribute it and/or modify    #
+ #    it under the terms of the GNU General Public License as published by    #
+ #    the Free Software Foundation, either version 3 of the License, or       #
+ #    (at your option) any later version.                                     #
+ #                                                                            #
+ #    This program is distributed in the hope that it will be useful,         #
+ #    but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+ #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+ #    GNU General Public License for more details.                            #
+ #                                                                            #
+ #    You should have received a copy of the GNU General Public License       #
+ #    along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+ ##############################################################################
+
+'''
+This module implements a client and server component for tuple spaces that
+talk a length-prefixed binary protocol over persistent connections.
+
+every request and every response is a frame: a header of payload length,
+request id and opcode or status, followed by the payload. requests carry the
+packed tuple of call arguments, responses the packed result or error message.
+predicate template fields are packed as their name and arguments.
+clients may send any number of requests before reading the responses, which
+come back in request order.
+'''
+
+import socket
+import struct
+import asyncio
+import logging
+from xmlrpc.client import Fault
+from .xmlrpc import MemSpaceApi, SCAN_COUNT
+from .templates import Predicate, predicate
+
+LOG = logging.getLogger()
+
+# the api methods, by opcode
+OPS = ('put', 'get', 'read', 'put_many', 'take_many', 'take_all', 'scan_page')
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+READ_SIZE = 64 * 1024
+MAX_FRAME = 64 * 1024 * 1024
+
+# frame header: payload length, request id, opcode or status
+_FRAME = struct.Struct('!IIB')
+_LENGTH = struct.Struct('!I')
+_INT = struct.Struct('!q')
+_FLOAT = struct.Struct('!d')
+
+
+def _pack(value, out):
+    '''
+    append the tagged binary representation of the given value to the given
+    bytearray
+    '''
+    if value is None:
+        out += b'N'
+    elif value is True:
+        out += b'T'
+    elif value is False:
+        out += b'F'
+    elif isinstance(value, int):
+        if -2**63 <= value < 2**63:
+            out += b'i' + _INT.pack(value)
+        else:
+            data = b'%d' % value
+            out += b'I' + _LENGTH.pack(len(data)) + data
+    elif isinstance(value, float):
+        out += b'd' + _FLOAT.pack(value)
+    elif isinstance(value, (bytes, bytearray)):
+        out += b'b' + _LENGTH.pack(len(value)) + value
+    elif isinstance(value, str):
+        data = value.encode('utf-8', 'surrogatepass')
+        out += b's' + _LENGTH.pack(len(data)) + data
+    elif isinstance(value, (tuple, list)):
+        out += (b't' if isinstance(value, tuple) else b'l') + _LENGTH.pack(len(value))
+        for x in value:
+            _pack(x, out)
+    elif isinstance(value, Predicate):
+        out += b'p'
+        _pack((value.name, value.args), out)
+    else:
+        raise TypeError('cannot marshal %s objects' % type(value).__name__)
+
+
+def _unpack(data, offset):
+    '''
+    read the tagged value at the given offset of the given buffer, and
+    produce it and the offset following it
+    '''
+    tag = data[offset:offset+1]
+    offset += 1
+    if tag == b'N':
+        return (None, offset)
+    if tag == b'T':
+        return (True, offset)
+    if tag == b'F':
+        return (False, offset)
+    if tag == b'i':
+        return (_INT.unpack_from(data, offset)[0], offset + _INT.size)
+    if tag == b'd':
+        return (_FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size)
+    if tag == b'p':
+        ((name, args), offset) = _unpack(data, offset)
+        return (predicate(name, args), offset)
+
+    (length,) = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    if tag == b'I':
+        return (int(bytes(data[offset:offset+length])), offset + length)
+    if tag == b'b':
+        return (bytes(data[offset:offset+length]), offset + length)
+    if tag == b's':
+        return (str(data[offset:offset+length], 'utf-8', 'surrogatepass'), offset + length)
+    if tag in (b't', b'l'):
+        values = []
+        for _ in range(length):
+            (value, offset) = _unpack(data, offset)
+            values.append(value)
+        return (tuple(values) if tag == b't' else values, offset)
+    raise ValueError('unknown tag %r' % tag)
+
+
+def _frame(rid, code, value):
+    '''
+    produce the frame of the given request id, opcode or status and value
+    '''
+    out = bytearray(_FRAME.size)
+    _pack(value, out)
+    _FRAME.pack_into(out, 0, len(out) - _FRAME.size, rid, code)
+    return out
+
+
+class MemSpaceBinaryClient(object):
+    '''
+    The tuple spaces binary protocol client.
+    '''
+
+    def __init__(self, server, port):
+        '''
+        constructor - connect to the given server and port.
+        '''
+        self._sock = socket.create_connection((server, port))
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rb')
+        self._next = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, value, traceback):
+        self.close()
+
+    def close(self):
+        '''
+        close the connection to the server
+        '''
+        self._file.close()
+        self._sock.close()
+
+    def put(self, tpl, ttl=None):
+        '''
+        put the given tuple into the tuple space. if ttl is given, the tuple
+        expires after that many seconds, unless taken before.
+        '''
+        return self._call('put', tpl, ttl)
+
+    def put_many(self, tpls, ttl=None):
+        '''
+        put all tuples of the given iterable into the tuple space, in a
+        single request, expiring after ttl seconds if given.
+        '''
+        return self._call('put_many', list(tpls), ttl)
+
+    def get(self, tpl):
+        '''
+        take the queried tuple from the tuple space and return it.
+        '''
+        return self._call('get', tpl)
+
+    def take_many(self, tpl, n):
+        '''
+        take up to n queried tuples from the tuple space and return them,
+        oldest first.
+        '''
+        return self._call('take_many', tpl, n)
+
+    def take_all(self, tpl):
+        '''
+        take all queried tuples from the tuple space and return them, oldest
+        first.
+        '''
+        return self._call('take_all', tpl)
+
+    def read(self, tpl):
+        '''
+        seek the given tuple in the tuple space and return it.
+        '''
+        return self._call('read', tpl)
+
+    def scan(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce the tuples matching the given template, without taking them,
+        fetching them in pages of up to count tuples, starting at the given
+        cursor of scan_page, or at the start.
+        '''
+        while True:
+            (tpls, cursor) = self.scan_page(tpl, cursor, count)
+            yield from tpls
+            if cursor is None:
+                return
+
+    def scan_page(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce up to count tuples matching the given template, without
+        taking them, from the given cursor, or from the start, and the cursor
+        to continue from, or None if there are no more.
+        '''
+        return tuple(self._call('scan_page', tpl, cursor, count))
+
+    def pipeline(self, calls):
+        '''
+        send all of the given (method, args) calls at once, without waiting
+        for the responses in between, and return their results in order. if
+        any call failed, the first failure is raised once all responses are
+        in.
+        '''
+        rids = []
+        frames = []
+        for (name, args) in calls:
+            rids.append(self._next)
+            frames.append(_frame(self._next, OPS.index(name), tuple(args)))
+            self._next = (self._next + 1) & 0xffffffff
+        self._sock.sendall(b''.join(frames))
+
+        responses = [self._receive(rid) for rid in rids]
+        for (status, value) in responses:
+            if status != STATUS_OK:
+                raise Fault(status, value)
+        return [value for (_, value) in responses]
+
+    def _call(self, name, *args):
+        '''
+        invoke the given api method on the server and return its result
+        '''
+        return self.pipeline([(name, args)])[0]
+
+    def _receive(self, rid):
+        '''
+        read the response to the given request id and produce its status
+        and value
+        '''
+        header = self._file.read(_FRAME.size)
+        if len(header) < _FRAME.size:
+            raise ConnectionError('connection closed by server')
+        (length, response_rid, status) = _FRAME.unpack(header)
+        payload = self._file.read(length)
+        if len(payload) < length:
+            raise ConnectionError('connection closed by server')
+        if response_rid != rid:
+            raise ConnectionError('response %d out of order, expected %d' % (response_rid, rid))
+
+        return (status, _unpack(payload, 0)[0])
+
+
+class MemSpaceBinaryServer(object):
+    '''
+    The tuple spaces binary protocol server.
+    '''
+
+    def __init__(self, server, port, api=None):
+        '''
+        constructor - start listening on the given server and port.
+        '''
+        self._sock = socket.create_server((server, port))
+        self._api = api if api is not None else MemSpaceApi()
+
+    def server_close(self):
+        '''
+        stop listening for client connections
+        '''
+        self._sock.close()
+
+    def serve_forever(self):
+        '''
+        handle client connections until interrupted
+        '''
+        asyncio.run(self._serve_forever())
+
+    async def _serve_forever(self):
+        '''
+        accept client connections and serve them concurrently
+        '''
+        server = await asyncio.start_server(self._serve, sock=self._sock)
+        async with server:
+            await server.serve_forever()
+
+    async def _serve(self, reader, writer):
+        '''
+        handle the requests of a client connection. all complete requests
+        that have arrived are handled together, and their responses are sent
+        in one write.
+        '''
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        buf = bytearray()
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                buf += data
+
+                responses = []
+                offset = 0
+                while len(buf) - offset >= _FRAME.size:
+                    (length, rid, op) = _FRAME.unpack_from(buf, offset)
+                    if length > MAX_FRAME:
+                        LOG.warning('binary server: frame of %d bytes exceeds limit', length)
+                        return
+                    start = offset + _FRAME.size
+                    if len(buf) - start < length:
+                        break
+                    responses.append(self._dispatch(rid, op, bytes(buf[start:start+length])))
+                    offset = start + length
+                del buf[:offset]
+
+                if responses:
+                    writer.writelines(responses)
+                    await writer.drain()
+        except ConnectionError:
+            LOG.info('binary server: connection lost')
+        finally:
+            writer.close()
+
+    def _dispatch(self, rid, op, payload):
+        '''
+        invoke the api method of the given opcode with the packed arguments,
+        and produce the response frame
+        '''
+        try:
+            if op >= len(OPS):
+                raise ValueError('unknown opcode %d' % op)
+            (args, _) = _unpack(payload, 0)
+            return _frame(rid, STATUS_OK, getattr(self._api, OPS[op])(*args))
+        except Exception as e:
+            LOG.warning('binary server: request %d failed', rid, exc_info=True)
+            return _frame(rid, STATUS_ERROR, '%s: %s' % (type(e).__name__, e))
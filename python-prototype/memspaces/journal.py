@@ -0,0 +1,247 @@
+ ##############################################################################
+ #    memspaces - tuple spaces in shared memory                               #
+ #    Copyright (C) 2017  Andreas Grapentin                                   #
+ #                                                                            #
+ #    This program is free software: you can redistribute it and/or modify    #
+ #    it under the terms of the GNU General Public License as published by    #
+ #    the Free Software Foundation, either version 3 of the License, or       #
+ #    (at your option) any later version.                                     #
+ #                                                                            #
+ #    This program is distributed in the hope that it will be useful,         #
+ #    but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+ #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+ #    GNU General Public License for more details.                            #
+ #                                                                            #
+ #    You should have received a copy of the GNU General Public License       #
+ #    along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+ ##############################################################################
+
+'''
+This module implements the durability of the spaces of the servers.
+
+the changes to a space are appended to a log as entries: puts of lists of
+tuples, with their deadline if they expire, takes of a number of tuples
+matching a template, and expiries of the tuples whose deadline passed by a
+given time. since the store is deterministic, replaying the entries in order
+restores its content. once the log has grown larger than the space, the space
+is written to a snapshot, which is a log of puts of its content, and a new log
+is started.
+
+both files start with a generation number. a log only applies to the snapshot
+of its generation, so that a crash between writing a snapshot and starting
+its log never replays entries twice. every entry is framed with its length
+and checksum, and a torn entry at the end of the log is discarded.
+
+appending an entry does not wait for the disk. callers wait for their entries
+to be on disk with commit, and callers waiting together share one write and
+fsync, the first of them writing the entries of all others.
+'''
+
+import os
+import zlib
+import struct
+import pickle
+import logging
+import itertools
+import threading
+
+LOG = logging.getLogger()
+
+# start a new snapshot once the log exceeds both this and the last snapshot
+SNAPSHOT_BYTES = 16 * 1024 * 1024
+# at most as many tuples per put entry of a snapshot
+SNAPSHOT_CHUNK = 1024
+
+# entry frame: payload length, crc32 of the payload
+_FRAME = struct.Struct('!II')
+
+
+def _frame(entry):
+    '''
+    produce the framed representation of the given entry
+    '''
+    data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+    return _FRAME.pack(len(data), zlib.crc32(data)) + data
+
+
+def puts(items):
+    '''
+    produce the put entries restoring the given pairs of tuple and deadline
+    or None, in order, with at most SNAPSHOT_CHUNK tuples each
+    '''
+    for (deadline, group) in itertools.groupby(items, lambda item: item[1]):
+        tpls = (tpl for (tpl, _) in group)
+        for chunk in iter(lambda: list(itertools.islice(tpls, SNAPSHOT_CHUNK)), []):
+            yield ('put', chunk) if deadline is None else ('put', chunk, deadline)
+
+
+def _entries(path):
+    '''
+    produce the entries of the file at the given path, and the offset
+    following the last complete one, as pairs. a torn or corrupted tail ends
+    the entries.
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while len(data) - offset >= _FRAME.size:
+        (length, crc) = _FRAME.unpack_from(data, offset)
+        start = offset + _FRAME.size
+        payload = data[start:start+length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            LOG.warning('journal %s: discarding torn tail at %d', path, offset)
+            return
+        offset = start + length
+        yield (pickle.loads(payload), offset)
+
+
+def _replace(path, entries, sync):
+    '''
+    atomically replace the file at the given path with one holding the given
+    entries, and produce its size
+    '''
+    tmp = path + '.tmp'
+    size = 0
+    with open(tmp, 'wb') as f:
+        for entry in entries:
+            data = _frame(entry)
+            f.write(data)
+            size += len(data)
+        f.flush()
+        if sync:
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return size
+
+
+class Journal(object):
+    '''
+    this class implements the snapshot and append log of a space.
+    '''
+
+    def __init__(self, path, sync=True, snapshot_bytes=SNAPSHOT_BYTES):
+        '''
+        constructor - keep the journal in the files of the given path with the
+        suffixes .snapshot and .log. unless sync is set, committed entries are
+        handed to the system, but not waited for to reach the disk.
+        '''
+        self._path = path
+        self._sync = sync
+        self._snapshot_bytes = snapshot_bytes
+
+        self._file = None
+        self._generation = 0
+        self._snapshot_size = 0
+        self._log_size = 0
+
+        # guards the buffer of appended entries not yet written
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._appended = 0
+        # held while writing, by the one committer writing for all others
+        self._commit_lock = threading.Lock()
+        self._committed = 0
+
+    def load(self, apply):
+        '''
+        pass all entries of the snapshot and of its log to the given function,
+        in order, and open the log for appending
+        '''
+        snapshot = self._path + '.snapshot'
+        log = self._path + '.log'
+
+        if os.path.exists(snapshot):
+            entries = _entries(snapshot)
+            first = next(entries, None)
+            if first is not None:
+                ((_, self._generation), self._snapshot_size) = first
+            for (entry, self._snapshot_size) in entries:
+                apply(entry)
+
+        if os.path.exists(log):
+            entries = _entries(log)
+            first = next(entries, None)
+            if first is not None and first[0] == ('log', self._generation):
+                self._log_size = first[1]
+                for (entry, self._log_size) in entries:
+                    apply(entry)
+            elif first is not None:
+                LOG.warning('journal %s: skipping the log of an older snapshot', self._path)
+
+        if self._log_size:
+            self._file = open(log, 'r+b')
+            self._file.truncate(self._log_size)
+            self._file.seek(self._log_size)
+        else:
+            self._log_size = _replace(log, [('log', self._generation)], self._sync)
+            self._file = open(log, 'ab')
+        LOG.info('journal %s: loaded generation %d, %d bytes of log',
+                 self._path, self._generation, self._log_size)
+
+    def append(self, entry):
+        '''
+        append the given entry to the log, in the order of the changes to the
+        space, and produce the ticket to commit it with
+        '''
+        data = _frame(entry)
+        with self._lock:
+            self._buffer += data
+            self._appended += 1
+            return self._appended
+
+    def commit(self, ticket):
+        '''
+        wait until the entry of the given ticket, and all before it, are
+        written to the log
+        '''
+        with self._commit_lock:
+            if self._committed >= ticket:
+                return
+            with self._lock:
+                (data, self._buffer) = (self._buffer, bytearray())
+                appended = self._appended
+            self._file.write(data)
+            self._file.flush()
+            if self._sync:
+                os.fsync(self._file.fileno())
+            self._log_size += len(data)
+            self._committed = appended
+
+    def due(self):
+        '''
+        check if the log has grown large enough to start a new snapshot
+        '''
+        return self._log_size > max(self._snapshot_bytes, self._snapshot_size)
+
+    def snapshot(self, items):
+        '''
+        replace the snapshot with one of the given pairs of tuple and deadline
+        or None, which must be the whole content of the space, including all
+        changes appended so far, and start a new log.
+        '''
+        with self._commit_lock:
+            generation = self._generation + 1
+            self._snapshot_size = _replace(
+                self._path + '.snapshot',
+                itertools.chain([('snapshot', generation)], puts(items)),
+                self._sync)
+            self._generation = generation
+
+            self._file.close()
+            log = self._path + '.log'
+            self._log_size = _replace(log, [('log', generation)], self._sync)
+            self._file = open(log, 'ab')
+            with self._lock:
+                self._buffer = bytearray()
+                self._committed = self._appended
+        LOG.info('journal %s: snapshot generation %d, %d bytes',
+                 self._path, generation, self._snapshot_size)
+
+    def close(self):
+        '''
+        write the entries appended so far, and close the log
+        '''
+        with self._lock:
+            appended = self._appended
+        self.commit(appended)
+        self._file.close()
@@ -0,0 +1,210 @@
+ ##############################################################################
+ #    memspaces - tuple spaces in shared memory                               #
+ #    Copyright (C) 2017  Andreas Grapentin                                   #
+ #                                                                            #
+ #    This program is free software: you can redistribute it and/or modify    #
+ #    it under the terms of the GNU General Public License as published by    #
+ #    the Free Software Foundation, either version 3 of the License, or       #
+ #    (at your option) any later version.                                     #
+ #                                                                            #
+ #    This program is distributed in the hope that it will be useful,         #
+ #    but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+ #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+ #    GNU General Public License for more details.                            #
+ #                                                                            #
+ #    You should have received a copy of the GNU General Public License       #
+ #    along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+ ##############################################################################
+
+'''
+This module implements read-only replicas of the spaces of a server.
+
+a replica server hosts a copy of every space it is asked about, which follows
+the space on the primary server: a thread per space polls the change stream
+of the space every poll seconds, and applies the changes in order, the same
+way a journal is replayed. the first poll, and every poll of a replica that
+fell too far behind, restarts the copy from the whole content of the space.
+
+a poll returns all changes the primary made before it answered, so once it is
+applied, the copy holds all changes made before the poll was sent. a replica
+only answers reads while that was at most max_lag seconds ago, and refuses
+them otherwise, which is the staleness bound the clients rely on. expiries
+are changes of the primary as well, and a tuple expires on a replica within
+the same bound.
+'''
+
+import time
+import logging
+import threading
+import http.client
+from xmlrpc.client import Fault
+from .xmlrpc import MemSpaceApi, MemSpaceClient, MemSpaceServer, SCAN_COUNT
+from .store import TupleStore
+from . import templates
+
+LOG = logging.getLogger()
+
+# the pause between the polls of the change stream of a space, in seconds
+POLL = 0.05
+# the longest time since the last poll applied that a replica answers reads,
+# in seconds
+MAX_LAG = 1.0
+
+
+class MemSpaceReplicaApi(MemSpaceApi):
+    '''
+    this class implements the read-only tuple space api of a replica.
+    '''
+
+    def __init__(self, primary, poll=POLL, max_lag=MAX_LAG):
+        '''
+        constructor - follow the space of the given client of the primary
+        server, polling it every poll seconds, and answer reads while the
+        last poll applied was sent at most max_lag seconds before.
+        '''
+        super(MemSpaceReplicaApi, self).__init__()
+        self._primary = primary
+        self._poll = poll
+        self._max_lag = max_lag
+        # the position in the change stream of the primary, and the time the
+        # poll that got there was sent
+        self._since = None
+        self._synced = None
+        self._stopped = threading.Event()
+        self._follower = threading.Thread(target=self._follow, daemon=True)
+        self._follower.start()
+
+    def put(self, tpl, ttl=None):
+        '''
+        refuse the change, which only the primary may make
+        '''
+        self._refuse()
+
+    def put_many(self, tpls, ttl=None):
+        '''
+        refuse the change, which only the primary may make
+        '''
+        self._refuse()
+
+    def get(self, tpl):
+        '''
+        refuse the change, which only the primary may make
+        '''
+        self._refuse()
+
+    def take_many(self, tpl, n):
+        '''
+        refuse the change, which only the primary may make
+        '''
+        self._refuse()
+
+    def take_all(self, tpl):
+        '''
+        refuse the change, which only the primary may make
+        '''
+        self._refuse()
+
+    def read(self, tpl):
+        '''
+        seek the given tuple in the copy of the tuple space and return it.
+        '''
+        self._check_lag()
+        return super(MemSpaceReplicaApi, self).read(tpl)
+
+    def scan_page(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce up to count tuples matching the given template from the copy
+        of the tuple space, and the cursor to continue from, see
+        MemSpaceApi.scan_page. the cursors of a replica are not those of the
+        primary, and a reset of the copy makes them start over.
+        '''
+        self._check_lag()
+        return super(MemSpaceReplicaApi, self).scan_page(tpl, cursor, count)
+
+    def changes(self, since=None):
+        '''
+        refuse to stream changes: replicas follow the primary only.
+        '''
+        raise ValueError('replicas do not stream changes')
+
+    def close(self):
+        '''
+        stop following the primary
+        '''
+        self._stopped.set()
+        self._follower.join()
+
+    def _follow(self):
+        '''
+        poll the change stream of the primary and apply the changes, until
+        stopped
+        '''
+        while not self._stopped.is_set():
+            sent = time.monotonic()
+            try:
+                (since, entries) = self._primary.changes(self._since)
+            except (Fault, OSError, http.client.HTTPException) as e:
+                LOG.warning('replica: polling the primary failed: %s', e)
+            else:
+                with self._lock:
+                    for entry in entries:
+                        self._apply(entry)
+                    (self._since, self._synced) = (since, sent)
+            self._stopped.wait(self._poll)
+
+    def _apply(self, entry):
+        '''
+        apply the given change of the primary to the copy of the tuple space
+        '''
+        if entry[0] == 'reset':
+            LOG.info('replica: copying the whole space')
+            self._tuples = TupleStore()
+        elif entry[0] == 'take':
+            super(MemSpaceReplicaApi, self)._apply(('take', templates.load(entry[1]), entry[2]))
+        else:
+            super(MemSpaceReplicaApi, self)._apply(entry)
+
+    def _expire(self):
+        '''
+        leave expiring to the primary, whose expiries arrive as changes
+        '''
+
+    def _check_lag(self):
+        '''
+        refuse to answer if the last poll applied is too old
+        '''
+        synced = self._synced
+        if synced is None or time.monotonic() - synced > self._max_lag:
+            raise ValueError('replica is more than %g seconds behind' % self._max_lag)
+
+    def _refuse(self):
+        '''
+        raise the error of a change sent to a replica
+        '''
+        raise ValueError('replicas are read-only, change the primary instead')
+
+
+class MemSpaceReplicaServer(MemSpaceServer):
+    '''
+    The read-only replica of a tuple spaces server.
+
+    every space asked about follows the space of that name on the primary
+    server at the given url, which must keep its spaces in its own memory.
+    '''
+
+    def __init__(self, server, port, primary, *args, poll=POLL, max_lag=MAX_LAG, **kwargs):
+        '''
+        constructor - start listening on the given server and port, following
+        the primary at the given url.
+        '''
+        super(MemSpaceReplicaServer, self).__init__(server, port, *args, **kwargs)
+        self._primary = primary
+        self._poll = poll
+        self._max_lag = max_lag
+
+    def _space_api(self, name):
+        '''
+        produce the api of the new copy of the space of the given name
+        '''
+        return MemSpaceReplicaApi(
+            MemSpaceClient(self._primary, space=name), self._poll, self._max_lag)
@@ -0,0 +1,236 @@
+ ##############################################################################
+ #    memspaces - tuple spaces in shared memory                               #
+ #    Copyright (C) 2017  Andreas Grapentin                                   #
+ #                                                                            #
+ #    This program is free software: you can redistribute it and/or modify    #
+ #    it under the terms of the GNU General Public License as published by    #
+ #    the Free Software Foundation, either version 3 of the License, or       #
+ #    (at your option) any later version.                                     #
+ #                                                                            #
+ #    This program is distributed in the hope that it will be useful,         #
+ #    but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+ #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+ #    GNU General Public License for more details.                            #
+ #                                                                            #
+ #    You should have received a copy of the GNU General Public License       #
+ #    along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+ ##############################################################################
+
+'''
+This module implements a client of a tuple space sharded over several servers.
+
+every tuple lives on exactly one shard, chosen by the hash of its key field,
+so that a template with the key field bound is sent to a single shard. a
+template with the key field free, or bound by a predicate, is sent to all
+shards at once, and only a set of values narrows the shards to theirs. tuples
+without the key field, all of one arity, live on the first shard, and tuples
+whose key field has no canonical representation, e.g. a list, are spread over
+the shards in turn.
+
+a take sent to all shards must still take at most one tuple. it reads a match
+on every shard at once, and then takes a tuple equal to one of the matches
+from its shard, retrying if another client took it first. tuples are only
+ordered within a shard, so the oldest match is only ever the oldest of its
+shard.
+
+a scan walks the shards in turn, and its cursor is the index of the shard it
+is at and the cursor of the scan of that shard.
+'''
+
+import zlib
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .shmem import _key, SCAN_COUNT
+from .templates import Predicate, OneOf
+
+LOG = logging.getLogger()
+
+
+def _pin(tpl, t):
+    '''
+    produce the template matching only tuples equal to the given match of the
+    given template, in the fields the template leaves free
+    '''
+    return tuple(x if y is None else y for (x, y) in zip(tpl, t))
+
+
+class ShardedMemSpaceClient(object):
+    '''
+    The client of a tuple space sharded over the servers of the given clients.
+    '''
+
+    def __init__(self, clients, key=0):
+        '''
+        constructor - shard the space over the given clients, one per server,
+        by the field at index key. the clients must be safe to use from
+        several threads at once, e.g. MemSpaceClient. every client of the
+        space has to be given the same servers in the same order.
+        '''
+        if not clients:
+            raise ValueError('a sharded space needs at least one shard')
+        self._clients = list(clients)
+        self._key = key
+        self._pool = ThreadPoolExecutor(len(self._clients))
+        # spreads tuples with unkeyed key fields, and rotates fanned out takes
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, value, traceback):
+        self.close()
+
+    def close(self):
+        '''
+        stop the threads talking to the shards
+        '''
+        self._pool.shutdown()
+
+    def space(self, name):
+        '''
+        produce a client of the space of the given name, sharded over the same
+        servers
+        '''
+        return ShardedMemSpaceClient([c.space(name) for c in self._clients], self._key)
+
+    def put(self, tpl, ttl=None):
+        '''
+        put the given tuple into the tuple space, on its shard, expiring after
+        ttl seconds if given.
+        '''
+        self._clients[self._shard(tpl)].put(tpl, ttl)
+
+    def put_many(self, tpls, ttl=None):
+        '''
+        put all tuples of the given iterable into the tuple space, in a single
+        request to every shard involved, expiring after ttl seconds if given.
+        '''
+        batches = {}
+        for tpl in tpls:
+            batches.setdefault(self._shard(tpl), []).append(tpl)
+        self._map(lambda shard: self._clients[shard].put_many(batches[shard], ttl), batches)
+
+    def get(self, tpl):
+        '''
+        take the queried tuple from the tuple space and return it.
+        '''
+        shards = self._shards(tpl)
+        if len(shards) == 1:
+            return self._clients[shards[0]].get(tpl)
+
+        while True:
+            matches = self._map(lambda shard: self._clients[shard].read(tpl), shards)
+            candidates = [(s, t) for (s, t) in zip(shards, matches) if t is not None]
+            if not candidates:
+                return None
+            for (shard, t) in candidates:
+                res = self._clients[shard].get(_pin(tpl, t))
+                if res is not None:
+                    return res
+            LOG.info('sharded space: matches taken concurrently, retrying')
+
+    def take_many(self, tpl, n):
+        '''
+        take up to n queried tuples from the tuple space and return them.
+        shards are asked in turn, for as many tuples as are still missing.
+        '''
+        shards = self._shards(tpl)
+        with self._lock:
+            turn = next(self._turn) % len(shards)
+        res = []
+        for shard in shards[turn:] + shards[:turn]:
+            if len(res) >= n:
+                break
+            res.extend(self._clients[shard].take_many(tpl, n - len(res)))
+        return res
+
+    def take_all(self, tpl):
+        '''
+        take all queried tuples from the tuple space and return them, oldest
+        first within every shard.
+        '''
+        shards = self._shards(tpl)
+        return [t for res in self._map(lambda shard: self._clients[shard].take_all(tpl), shards)
+                for t in res]
+
+    def read(self, tpl):
+        '''
+        seek the given tuple in the tuple space and return it.
+        '''
+        shards = self._shards(tpl)
+        matches = self._map(lambda shard: self._clients[shard].read(tpl), shards)
+        return next((t for t in matches if t is not None), None)
+
+    def scan(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce the tuples matching the given template, without taking them,
+        fetching them in pages of up to count tuples, starting at the given
+        cursor of scan_page, or at the start.
+        '''
+        while True:
+            (tpls, cursor) = self.scan_page(tpl, cursor, count)
+            yield from tpls
+            if cursor is None:
+                return
+
+    def scan_page(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce up to count tuples matching the given template, without
+        taking them, from the given cursor, or from the start, and the cursor
+        to continue from, or None if there are no more. the shards are
+        scanned one after the other.
+        '''
+        shards = self._shards(tpl)
+        (turn, inner) = (0, None)
+        if cursor is not None:
+            (turn, inner) = cursor.split('/', 1)
+            (turn, inner) = (int(turn), inner or None)
+        (tpls, inner) = self._clients[shards[turn]].scan_page(tpl, inner, count)
+        if inner is None:
+            turn += 1
+            if turn == len(shards):
+                return (tpls, None)
+        return (tpls, '%d/%s' % (turn, inner or ''))
+
+    def _shard(self, tpl):
+        '''
+        produce the shard of the given tuple
+        '''
+        if len(tpl) <= self._key:
+            return 0
+        key = _key(tpl[self._key])
+        if key is None:
+            with self._lock:
+                return next(self._turn) % len(self._clients)
+        return zlib.crc32(key) % len(self._clients)
+
+    def _shards(self, tpl):
+        '''
+        produce the shards that may hold tuples matching the given template,
+        in order
+        '''
+        if len(tpl) <= self._key:
+            return [0]
+        x = tpl[self._key]
+        if isinstance(x, OneOf):
+            keys = [_key(v) for v in x.values]
+            if None not in keys:
+                return sorted({zlib.crc32(k) % len(self._clients) for k in keys})
+        elif x is not None and not isinstance(x, Predicate):
+            key = _key(x)
+            if key is not None:
+                return [zlib.crc32(key) % len(self._clients)]
+        return list(range(len(self._clients)))
+
+    def _map(self, func, shards):
+        '''
+        apply the given function to the given shards at once, and produce the
+        results in order
+        '''
+        shards = list(shards)
+        if len(shards) == 1:
+            return [func(shards[0])]
+        return list(self._pool.map(func, shards))
@@ -20,40 +20,586 @@
 MemSpace implementation based on shared memory
 '''
 
+import os
 import mmap
+import fcntl
+import array
 import time
+import zlib
+import numbers
 import logging
 import struct
 import pickle
+import itertools
+import threading
+from contextlib import contextmanager
 import posix_ipc
-from posix_ipc import SharedMemory, Semaphore, ExistentialError, O_CREX
+from posix_ipc import SharedMemory, Semaphore, ExistentialError, O_CREAT, O_CREX
+from .templates import Predicate, Typed, Prefix
 
 LOG = logging.getLogger()
 
 PAGESIZE = 4 * 1024
 
-MEMSPACE_VERSION = 1
+MEMSPACE_VERSION = 13
 SHMEM_SIZE = PAGESIZE * 100
-MEMSPACE_VERSION = 1
-DATA_START = PAGESIZE
 
-FLAG_INVALID = 0x01
+INDEX_BUCKETS = 4096
+INDEX_START = PAGESIZE
+DATA_START = INDEX_START + INDEX_BUCKETS * 24
 
+WAIT_SLOTS = 32
+WAIT_POLL = 0.01
+
+# seconds to wait for the creator of a space to initialize it
+INIT_TIMEOUT = 10
+
+LOCK_STRIPES = 16
+# seconds between checks for a dead holder while waiting for a lock
+LOCK_POLL = 0.1
+ARENA_SIZE = 64 * 1024
+# records published per lock hold by put_many
+BATCH_SIZE = 256
+
+# tuples put with a time to live are linked into the index chain of a slot of
+# a timer wheel, by the tick of their deadline. every tick of this many
+# seconds, the first participant to notice reclaims the expired tuples of the
+# slots of the ticks that have passed.
+WHEEL_SLOTS = 64
+WHEEL_TICK = 1.0
+
+# tuples per page of a scan, and blocks walked per page at most, which bounds
+# the time a scan holds the space lock
+SCAN_COUNT = 256
+SCAN_BLOCKS = 4096
+
+# fields of bytes or arrays of at least this many bytes are large: they are
+# kept out of line, each in shared memory of its own, see Blob, and records
+# only refer to them
+BLOB_SIZE = 64 * 1024
+
+BLOCK_ALIGN = 16
+MIN_BLOCK = 48
+FREE_CLASSES = 24
+
+FLAG_FREE = 0x01
+FLAG_COMMITTED = 0x02
+FLAG_ARENA = 0x04
+
+OFFSET_MOVES = 0x08
 OFFSET_VERSION = 0x10
+OFFSET_SWEPT = 0x18
 OFFSET_END = 0x20
+OFFSET_SIZE = 0x28
+OFFSET_WAITING = 0x30
+OFFSET_GENERATION = 0x34
+OFFSET_MAX_SIZE = 0x38
+OFFSET_FREE = 0x40
+OFFSET_WAITERS = 0x100
+OFFSET_OWNERS = 0x300
+OFFSET_MOVE = 0x380
+OFFSET_RESHAPES = 0x3c0
+OFFSET_STATS = 0x400
+
+# offsets of the flags byte, of the expiry byte, of the number of large
+# fields and of the owning pid within a block header
+RECORD_FLAGS = 9
+RECORD_EXPIRES = 10
+RECORD_BLOBS = 11
+RECORD_OWNER = 12
+
+# phases of a record move of the compaction
+MOVE_NONE = 0
+MOVE_STARTED = 1
+MOVE_COPIED = 2
+
+# hot path counters. there is one block of them per lock stripe, and one for
+# the space lock, each only ever updated with its lock held. the totals are
+# the sums over all blocks.
+STAT_LOOKUPS = 0
+STAT_SCANNED = 1
+STAT_CONTENDED = 2
+STAT_WAIT_NS = 3
+STAT_ENCODE_NS = 4
+STAT_DECODE_NS = 5
+STAT_PUTS = 6
+STAT_TAKES = 7
+STAT_LIVE = 8
+STAT_EXPIRED = 9
+STAT_FIELDS = 10
+STAT_NAMES = ('lookups', 'scanned', 'lock_contended', 'lock_wait_ns',
+              'encode_ns', 'decode_ns', 'puts', 'takes', 'live_records', 'expired')
+
+# field types of the tuple encoding. values of any other type, and of
+# subclasses of these, are pickled field by field.
+FIELD_NONE = 0
+FIELD_BOOL = 1
+FIELD_INT = 2
+FIELD_FLOAT = 3
+FIELD_BYTES = 4
+FIELD_STR = 5
+FIELD_ARRAY = 6
+FIELD_PICKLE = 7
+FIELD_BLOB = 8
+
+# block header: block size, payload length, number of fields, flags, and at
+# RECORD_OWNER the pid of the participant that last reserved, wrote or took
+# the block. a record block is followed by one index node per field plus one
+# for the arity chain, and, if the expiry byte is set, one for its timer wheel
+# slot and its deadline, and then by the encoded payload. the large fields
+# byte is set once the payload refers to large fields. a free block is
+# followed by its free list links instead. the unused rest of a participant's
+# arena is a block of its own. the last four bytes of every block repeat its
+# size, so that the preceding block can be found from any block.
+_RECORD = struct.Struct('IIBB6x')
+_HEADER = struct.Struct('IIBB2xI')
+# free list links: next free block, previous free block
+_FREE = struct.Struct('QQ')
+# index node: next node, previous node, record offset, key hash
+_NODE = struct.Struct('QQQI4x')
+# index bucket: first node, last node, chain length
+_BUCKET = struct.Struct('QQI4x')
+# deadline of an expiring record, in seconds since the epoch
+_DEADLINE = struct.Struct('d')
+# waiter slot: owning pid, hash of the index chain the waiter is interested
+# in, hash of the arity chain of the template
+_WAITER = struct.Struct('III')
+# payload field directory entry: field type, array typecode, offset of the
+# field data from the start of the payload, length of the field data. the
+# directory holds one entry per field, and is followed by the field data.
+_FIELD = struct.Struct('BB2xII')
+# reference of a large field: its size in bytes, and whether it is kept in a
+# file rather than in shared memory, followed by the name of either
+_BLOB = struct.Struct('QB')
+_BOOL = struct.Struct('?')
+_INT = struct.Struct('q')
+_FLOAT = struct.Struct('d')
+_OFFSET = struct.Struct('Q')
+_SIZE = struct.Struct('I')
+_COUNTER = struct.Struct('q')
+# record move in progress: phase, number of index nodes pointed to the target
+# so far, source, target, record size, size of the target block, offset of the
+# block released behind the moved record
+_MOVE = struct.Struct('QQQQQQQ')
+
+_NUMERIC = (FIELD_BOOL, FIELD_INT, FIELD_FLOAT)
+_PLAIN = (FIELD_NONE, FIELD_BOOL, FIELD_INT, FIELD_FLOAT, FIELD_BYTES, FIELD_STR)
+# the exact type of the values of every field type but pickled ones
+_KIND_TYPES = {
+    FIELD_NONE: type(None),
+    FIELD_BOOL: bool,
+    FIELD_INT: int,
+    FIELD_FLOAT: float,
+    FIELD_BYTES: bytes,
+    FIELD_STR: str,
+    FIELD_ARRAY: array.array,
+}
+
+# a free block must hold its header, its free list links and its footer, and
+# the index must fit below the data area.
+assert MIN_BLOCK >= _RECORD.size + _FREE.size + _SIZE.size and not MIN_BLOCK % BLOCK_ALIGN
+assert DATA_START >= INDEX_START + INDEX_BUCKETS * _BUCKET.size
+assert OFFSET_OWNERS >= OFFSET_WAITERS + WAIT_SLOTS * _WAITER.size
+assert OFFSET_MOVE >= OFFSET_OWNERS + (LOCK_STRIPES + 1) * _SIZE.size
+assert OFFSET_RESHAPES >= OFFSET_MOVE + _MOVE.size
+assert OFFSET_STATS >= OFFSET_RESHAPES + _OFFSET.size
+assert _HEADER.size == _RECORD.size and _HEADER.size == RECORD_OWNER + _SIZE.size
+assert INDEX_START >= OFFSET_STATS + (LOCK_STRIPES + 1) * STAT_FIELDS * _COUNTER.size
+
+
+def _key(value):
+    '''
+    produce a canonical byte representation of a tuple field, such that fields
+    that compare equal produce the same key in every participating process, or
+    None if the field has no such representation.
+    '''
+    if isinstance(value, numbers.Complex) and not isinstance(value, numbers.Real):
+        if value.imag:
+            return b'c' + repr(complex(value)).encode()
+        value = value.real
+    if isinstance(value, numbers.Integral):
+        return b'i%d' % value
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if value.is_integer():
+            return b'i%d' % value
+        return b'f' + repr(value).encode()
+    if isinstance(value, str):
+        return b's' + value.encode('utf-8', 'surrogatepass')
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return b'b' + bytes(value)
+    if isinstance(value, tuple):
+        keys = [_key(x) for x in value]
+        if None in keys:
+            return None
+        return b't%d:' % len(keys) + b''.join(b'%d:%s' % (len(k), k) for k in keys)
+    # anything else, e.g. a dict or a set, may compare equal to values that
+    # pickle differently, and is not indexed by value.
+    return None
+
+
+def _arity_hash(fields):
+    '''
+    produce the index hash of the chain of all tuples of the given arity
+    '''
+    return zlib.crc32(b'a%d' % fields)
+
+
+def _field_hash(fields, index, value):
+    '''
+    produce the index hash of the chain of all tuples of the given arity that
+    hold the given value at the given position, or None if the value is not
+    indexed.
+    '''
+    key = _key(value)
+    if key is None:
+        return None
+    return zlib.crc32(b'f%d:%d:' % (fields, index) + key)
+
+
+def _unindexed_hash(fields, index):
+    '''
+    produce the index hash of the chain of all tuples of the given arity that
+    hold a value without canonical key at the given position
+    '''
+    return zlib.crc32(b'u%d:%d' % (fields, index))
+
+
+def _expiry_hash(slot):
+    '''
+    produce the index hash of the chain of the given timer wheel slot
+    '''
+    return zlib.crc32(b'e%d' % slot)
+
+
+def _stripe_name(name, stripe):
+    '''
+    produce the name of the semaphore of the given index lock stripe
+    '''
+    return '%s.stripe%d' % (name, stripe)
+
+
+def _stripe(hsh):
+    '''
+    produce the lock stripe guarding the index bucket of the given hash
+    '''
+    return (hsh % INDEX_BUCKETS) % LOCK_STRIPES
+
+
+def _waiter_name(name, slot):
+    '''
+    produce the name of the semaphore of the given waiter slot
+    '''
+    return '%s.wait%d' % (name, slot)
+
+
+def _alive(pid):
+    '''
+    check if the process of the given pid is still around
+    '''
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _size_class(size):
+    '''
+    produce the free list class of blocks of the given size
+    '''
+    return min(size.bit_length() - MIN_BLOCK.bit_length(), FREE_CLASSES - 1)
+
+
+def _encode(value):
+    '''
+    produce the field type, the array typecode and the raw bytes of the given
+    tuple field
+    '''
+    kind = type(value)
+    if value is None:
+        return (FIELD_NONE, 0, b'')
+    if kind is bool:
+        return (FIELD_BOOL, 0, _BOOL.pack(value))
+    if kind is int and -2**63 <= value < 2**63:
+        return (FIELD_INT, 0, _INT.pack(value))
+    if kind is float:
+        return (FIELD_FLOAT, 0, _FLOAT.pack(value))
+    if kind is bytes:
+        return (FIELD_BYTES, 0, value)
+    if kind is str:
+        return (FIELD_STR, 0, value.encode('utf-8', 'surrogatepass'))
+    if kind is array.array:
+        return (FIELD_ARRAY, ord(value.typecode), value.tobytes())
+    return (FIELD_PICKLE, 0, pickle.dumps(value))
+
+
+def _decode(view, start, kind, code, length):
+    '''
+    materialize the field of the given type and typecode whose raw bytes are
+    at the given offset of the given buffer
+    '''
+    if kind == FIELD_NONE:
+        return None
+    if kind == FIELD_BOOL:
+        return _BOOL.unpack_from(view, start)[0]
+    if kind == FIELD_INT:
+        return _INT.unpack_from(view, start)[0]
+    if kind == FIELD_FLOAT:
+        return _FLOAT.unpack_from(view, start)[0]
+    if kind == FIELD_BYTES:
+        return bytes(view[start:start+length])
+    if kind == FIELD_STR:
+        return str(view[start:start+length], 'utf-8', 'surrogatepass')
+    if kind == FIELD_ARRAY:
+        value = array.array(chr(code))
+        value.frombytes(view[start:start+length])
+        return value
+    if kind == FIELD_BLOB:
+        return Blob(*_blob_ref(view, start, length), typecode=chr(code) if code else None)
+    return pickle.loads(view[start:start+length])
+
+
+def _blob_ref(view, start, length):
+    '''
+    produce the name, the durability and the size of the large field whose
+    reference of the given length is at the given offset of the given buffer
+    '''
+    (size, durable) = _BLOB.unpack_from(view, start)
+    return (str(view[start+_BLOB.size:start+length], 'utf-8'), bool(durable), size)
+
+
+def _unlink_blob(name, durable):
+    '''
+    destroy the memory of the large field of the given name, unless that
+    happened before. its mappings stay valid until they are closed.
+    '''
+    try:
+        if durable:
+            os.unlink(name)
+        else:
+            posix_ipc.unlink_shared_memory(name)
+    except (ExistentialError, FileNotFoundError):
+        pass
+
+
+def _compile(tpl):
+    '''
+    produce the position, field type, raw bytes and value of every bound
+    field of the given template, for matching against encoded records. the
+    field type of predicates is None, and the raw bytes of prefixes are those
+    of the prefix.
+    '''
+    compiled = []
+    for i, x in enumerate(tpl):
+        if x is None:
+            continue
+        if isinstance(x, Prefix):
+            (_, _, raw) = _encode(x.prefix)
+            compiled.append((i, None, raw, x))
+            continue
+        if isinstance(x, Predicate):
+            compiled.append((i, None, None, x))
+            continue
+        if type(x) in (bool, int, float, bytes, str):
+            (kind, _, raw) = _encode(x)
+        else:
+            (kind, raw) = (FIELD_PICKLE, None)
+        compiled.append((i, kind, raw, x))
+    return compiled
+
+
+def _field_matches(view, payload, entry, kind, raw, value):
+    '''
+    check if the encoded field of the given directory entry equals the given
+    template field, comparing raw bytes in place where the encoding allows.
+    '''
+    (field_kind, code, offset, length) = entry
+    start = payload + offset
+    if kind is None:
+        return _predicate_matches(view, start, field_kind, code, length, raw, value)
+    if field_kind == kind and kind in (FIELD_BOOL, FIELD_INT, FIELD_BYTES, FIELD_STR):
+        return length == len(raw) and view[start:start+length] == raw
+    if field_kind in _NUMERIC and kind in _NUMERIC:
+        return value == _decode(view, start, field_kind, code, length)
+    if field_kind in _PLAIN and kind in _PLAIN:
+        # distinct kinds of plain values never compare equal
+        return False
+    if field_kind == FIELD_BLOB and not isinstance(value, (bytes, array.array, Blob)):
+        return False
+    return value == _decode(view, start, field_kind, code, length)
+
+
+def _record_matches(view, start, fields, compiled, now):
+    '''
+    check if the record at the given offset, of the given number of fields,
+    matches the given compiled template, and has not expired by the given
+    time
+    '''
+    expires = view[start + RECORD_EXPIRES]
+    payload = start + _RECORD.size + (fields + 1 + expires) * _NODE.size
+    if expires:
+        if _DEADLINE.unpack_from(view, payload)[0] <= now:
+            return False
+        payload += _DEADLINE.size
+    return all(_field_matches(view, payload, _FIELD.unpack_from(view, payload + i * _FIELD.size),
+                              kind, raw, x)
+               for (i, kind, raw, x) in compiled)
+
+
+def _predicate_matches(view, start, kind, code, length, raw, pred):
+    '''
+    check if the encoded field of the given type at the given offset
+    satisfies the given predicate. type wildcards and prefixes are checked in
+    place, everything else on the decoded field.
+    '''
+    if kind == FIELD_BLOB:
+        # large fields are not loaded for predicates but type wildcards
+        return isinstance(pred, Typed) and (array.array if code else bytes) in pred.types
+    if isinstance(pred, Typed) and kind != FIELD_PICKLE:
+        return _KIND_TYPES[kind] in pred.types
+    if isinstance(pred, Prefix) and kind in _PLAIN:
+        if kind != (FIELD_STR if isinstance(pred.prefix, str) else FIELD_BYTES):
+            return False
+        return length >= len(raw) and view[start:start+len(raw)] == raw
+    return pred.matches(_decode(view, start, kind, code, length))
+
+
+class _FileMemory(object):
+    '''
+    a file in place of the shared memory of a durable space, with the
+    interface of posix_ipc.SharedMemory
+    '''
+
+    def __init__(self, path, flags=0, size=0):
+        '''
+        constructor - open the file of the given path, creating it with the
+        given size if flags is O_CREX
+        '''
+        try:
+            if flags == O_CREX:
+                self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+                os.ftruncate(self.fd, size)
+            else:
+                self.fd = os.open(path, os.O_RDWR)
+        except (FileExistsError, FileNotFoundError) as e:
+            raise ExistentialError(str(e))
+        self.size = os.fstat(self.fd).st_size
+
+    def close_fd(self):
+        '''
+        close the file descriptor. the mapping of the file stays valid.
+        '''
+        os.close(self.fd)
+
+
+class Blob(object):
+    '''
+    a large tuple field, kept out of line in shared memory of its own, or in a
+    file of its own next to the file of a durable space. view is a memoryview
+    of its bytes in place, which are never copied unless asked for by value.
+    typecode is that of the array the field holds, or None for bytes.
+
+    blobs of tuples loaded from a space are read-only. once a tuple is taken,
+    its blobs are gone from the space, and their memory is released as soon
+    as every participant that loaded them released them, explicitly or by
+    dropping them.
+    '''
+
+    def __init__(self, name, durable, size, typecode=None, create=False):
+        '''
+        constructor - map the shared memory of the given name, or the file of
+        the given path if durable, of the given size in bytes. if create is
+        set, it is created, and writable.
+        '''
+        memory = (_FileMemory(name, O_CREX if create else 0, size) if durable else
+                  SharedMemory(name, flags=O_CREX if create else 0, size=size if create else 0))
+        try:
+            prot = mmap.PROT_READ | (mmap.PROT_WRITE if create else 0)
+            self._mmap = mmap.mmap(memory.fd, size, prot=prot)
+        finally:
+            memory.close_fd()
+        self.view = memoryview(self._mmap)
+        self.typecode = typecode
+        self._ref = (name, durable, size)
+        # a blob made by MemSpace.blob is put by reference once, any other
+        # blob is copied
+        self._fresh = create
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, value, traceback):
+        self.release()
+
+    def __len__(self):
+        return self._ref[2]
+
+    def __eq__(self, other):
+        if isinstance(other, Blob):
+            return self.typecode == other.typecode and self.view == other.view
+        if isinstance(other, (bytes, array.array)):
+            return self.value() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Blob(%r, %d bytes)' % (self._ref[0], self._ref[2])
+
+    def value(self):
+        '''
+        produce a copy of the field, as bytes or as an array
+        '''
+        if self.typecode is None:
+            return bytes(self.view)
+        value = array.array(self.typecode)
+        value.frombytes(self.view)
+        return value
+
+    def release(self):
+        '''
+        unmap the field. views of it taken from view must be released first.
+        '''
+        self.view.release()
+        self._mmap.close()
+
 
 class MemSpace(object):
     '''
     this class implements a memspace shmem participart
     '''
-    def __init__(self, name='MemSpace'):
+    def __init__(self, name='MemSpace', max_size=None, create=True, path=None):
         '''
-        constructor - connect to the shmem
+        constructor - connect to the shmem, creating it unless create is
+        unset. a space grows on demand up to max_size bytes, or for as long
+        as the system has memory to back it, if max_size is None. the limit is
+        set by the participant that creates the shmem; it is only checked
+        against when connecting.
+
+        if path is given, the space is durable: it is kept in the file of that
+        path instead of in shared memory, and outlives the system. name still
+        names its semaphores. the first participant to connect to the file
+        when its semaphores are gone, as after a reboot, recovers the space.
         '''
         self._name = name
+        self._path = path
+        self._max_size = max_size
+        self._create_missing = create
 
         self._mmap = None
         self._lock = None
+        self._stripes = []
+        self._waits = {}
+        # the unused rest of this participant's arena, as a pair of offsets
+        self._arena = None
+        self._arena_lock = threading.Lock()
+        # the generation of the mapping is not known until the first remap
+        self._generation = None
+        # encoding time not yet added to the counters in shmem
+        self._encode_ns = 0
 
         self._open()
 
@@ -74,158 +620,1488 @@ class MemSpace(object):
         '''
         produce the position of the tuple after the last
         '''
-        return struct.unpack_from('I', self._mmap, OFFSET_END)[0]
+        return _OFFSET.unpack_from(self._mmap, OFFSET_END)[0]
 
     @end.setter
     def end(self, value):
         '''
         set the new end position
         '''
-        struct.pack_into('I', self._mmap, OFFSET_END, value)
+        _OFFSET.pack_into(self._mmap, OFFSET_END, value)
 
-    def put(self, tpl):
+    @property
+    def size(self):
+        '''
+        produce the current size of the space
+        '''
+        return _OFFSET.unpack_from(self._mmap, OFFSET_SIZE)[0]
+
+    def put(self, tpl, ttl=None):
         '''
-        put the given tuple into the tuple space.
+        put the given tuple into the tuple space. if ttl is given, the tuple
+        expires after that many seconds, unless taken before.
         '''
         LOG.info('memspace %s: put: %s', self._name, tpl)
+        self._expire()
 
-        data = pickle.dumps(tpl)
-        LOG.debug('  data: %s', data)
+        record = self._write(tpl, self._deadline(ttl))
 
-        self._lock.acquire()
-        LOG.debug('  lock acquired')
+        LOG.debug('  publishing record')
+        self._publish([record])
+        self._notify([record])
 
-        end = self.end
-        LOG.debug('  space end: %#010x', end)
+    def put_many(self, tpls, ttl=None):
+        '''
+        put all tuples of the given iterable into the tuple space. records are
+        published in batches, taking the index locks once per batch. if ttl is
+        given, the tuples expire after that many seconds, unless taken before.
+        '''
+        LOG.info('memspace %s: put_many', self._name)
+        self._expire()
 
-        LOG.debug('  packing tuple metadata to offset')
-        struct.pack_into('IBB', self._mmap, end, len(data), len(tpl), 0)
+        deadline = self._deadline(ttl)
+        tpls = iter(tpls)
+        while True:
+            records = [self._write(tpl, deadline) for tpl in itertools.islice(tpls, BATCH_SIZE)]
+            if not records:
+                break
+            LOG.debug('  publishing %d records', len(records))
+            self._publish(records)
+            self._notify(records)
 
-        LOG.debug('  writing tuple payload')
-        self._mmap[end+6:end+6+len(data)] = data
+    def blob(self, size, typecode=None):
+        '''
+        produce a new writable large field of the given size in bytes, to be
+        filled in place through its view, and put by reference, without
+        copying it, as a field of a tuple. typecode is that of the array it
+        holds, or None for bytes. once put, it must not change anymore.
+        '''
+        if size <= 0:
+            raise ValueError('a blob must not be empty')
+        return Blob(*self._blob_name(), size, typecode, create=True)
 
-        LOG.debug('  updating END symbol')
-        self.end = end + len(data) + 6
+    def _blob_name(self):
+        '''
+        produce a new name for the memory of a large field, and whether it is
+        a file
+        '''
+        token = os.urandom(8).hex()
+        if self._path is not None:
+            return ('%s.blob.%s' % (self._path, token), True)
+        return ('%s.blob.%s' % (self._name, token), False)
 
-        self._lock.release()
-        LOG.debug('  lock released')
+    def _deadline(self, ttl):
+        '''
+        produce the deadline of a tuple put now with the given time to live,
+        or None if it does not expire
+        '''
+        if ttl is None:
+            return None
+        return time.time() + ttl
+
+    def _write(self, tpl, deadline=None):
+        '''
+        encode the given tuple into a new uncommitted record, expiring at the
+        given deadline if any, and produce its offset, its index hashes, and
+        whether it has unindexed fields. large fields are copied to blobs of
+        their own.
+        '''
+        before = time.perf_counter_ns()
+        blobs = []
+        encoded = [self._encode(x, blobs) for x in tpl]
+        self._encode_ns += time.perf_counter_ns() - before
+        length = len(encoded) * _FIELD.size + sum(len(raw) for (_, _, raw) in encoded)
+
+        fields = len(tpl)
+        hashes = [_arity_hash(fields)]
+        unindexed = False
+        for i, x in enumerate(tpl):
+            # large fields are not hashed, and compared only once loaded
+            hsh = None if encoded[i][0] == FIELD_BLOB else _field_hash(fields, i, x)
+            if hsh is None:
+                hsh = _unindexed_hash(fields, i)
+                unindexed = True
+            hashes.append(hsh)
+        if deadline is not None:
+            hashes.append(_expiry_hash(int(deadline // WHEEL_TICK) % WHEEL_SLOTS))
+        payload = _RECORD.size + len(hashes) * _NODE.size
+        if deadline is not None:
+            payload += _DEADLINE.size
+        size = -(-(payload + length + _SIZE.size) // BLOCK_ALIGN) * BLOCK_ALIGN
+
+        (start, size) = self._reserve(size)
+
+        _HEADER.pack_into(self._mmap, start, size, length, fields, 0, os.getpid())
+        if deadline is not None:
+            self._mmap[start + RECORD_EXPIRES] = 1
+            _DEADLINE.pack_into(self._mmap, start + payload - _DEADLINE.size, deadline)
+        payload += start
+        offset = fields * _FIELD.size
+        for i, (kind, code, raw) in enumerate(encoded):
+            _FIELD.pack_into(self._mmap, payload + i * _FIELD.size, kind, code, offset, len(raw))
+            self._mmap[payload+offset:payload+offset+len(raw)] = raw
+            offset += len(raw)
+
+        large = sum(kind == FIELD_BLOB for (kind, _, _) in encoded)
+        if large:
+            # the references go first, so that a record left behind by a
+            # crash releases whatever blobs were made
+            self._mmap[start + RECORD_BLOBS] = large
+            try:
+                for (name, durable, nbytes, source) in blobs:
+                    with Blob(name, durable, nbytes, create=True) as blob:
+                        blob.view[:] = source
+            except:
+                with self._locked():
+                    self._drop(start)
+                    self._free(start)
+                raise
+
+        return (start, hashes, unindexed)
+
+    def _encode(self, value, blobs):
+        '''
+        produce the field type, the array typecode and the raw bytes of the
+        given tuple field. a large field is encoded as its reference, and its
+        name, durability, size and content are added to the given list of
+        blobs to be made, unless it is a blob put by reference.
+        '''
+        kind = type(value)
+        if kind is Blob:
+            (code, source) = (ord(value.typecode) if value.typecode else 0, value.view)
+        elif kind is bytes and len(value) >= BLOB_SIZE:
+            (code, source) = (0, value)
+        elif kind is array.array and len(value) * value.itemsize >= BLOB_SIZE:
+            (code, source) = (ord(value.typecode), memoryview(value).cast('B'))
+        else:
+            return _encode(value)
+
+        if kind is Blob and value._fresh:
+            value._fresh = False
+            (name, durable, size) = value._ref
+        else:
+            (name, durable) = self._blob_name()
+            size = len(source)
+            blobs.append((name, durable, size, source))
+        return (FIELD_BLOB, code, _BLOB.pack(size, durable) + name.encode('utf-8'))
+
+    def _drop(self, start):
+        '''
+        destroy the large fields of the record at the given offset, if any.
+        this must be called with the record taken or left behind, and with
+        the space lock held.
+        '''
+        if not self._mmap[start + RECORD_BLOBS]:
+            return
+        (_, _, fields, _) = _RECORD.unpack_from(self._mmap, start)
+        (payload, _) = self._payload(start)
+        for i in range(fields):
+            (kind, _, offset, length) = _FIELD.unpack_from(self._mmap, payload + i * _FIELD.size)
+            if kind == FIELD_BLOB:
+                (name, durable, _) = _blob_ref(self._mmap, payload + offset, length)
+                _unlink_blob(name, durable)
+
+    def _notify(self, records):
+        '''
+        wake the waiters interested in any of the given published records
+        '''
+        if not _SIZE.unpack_from(self._mmap, OFFSET_WAITING)[0]:
+            return
+        LOG.debug('  waking waiters')
+        chains = {hsh for (_, hashes, _) in records for hsh in hashes}
+        arities = {hashes[0] for (_, hashes, unindexed) in records if unindexed}
+        self._wake(chains, arities)
+
+    def _reserve(self, size):
+        '''
+        reserve an uncommitted block of at least the given size and produce
+        its offset and actual size. small blocks are carved from the arena of
+        this participant without taking the space lock, which is only needed
+        to refill the arena, and for large blocks.
+        '''
+        small = size <= ARENA_SIZE // 4
+        while True:
+            if small:
+                with self._arena_lock:
+                    block = self._carve(size)
+                if block is not None:
+                    return block
+
+            need = ARENA_SIZE if small else size
+            with self._locked():
+                LOG.debug('  space lock acquired')
+                if small:
+                    with self._arena_lock:
+                        self._retire()
+                        arena = self._alloc(ARENA_SIZE, FLAG_ARENA)
+                        if arena is not None:
+                            LOG.debug('  new arena: %#010x', arena[0])
+                            self._arena = (arena[0], arena[0] + arena[1])
+                            continue
+                else:
+                    block = self._alloc(size, 0)
+                    if block is not None:
+                        return block
+
+            # compact one step at a time, giving up the locks in between,
+            # until the block fits. grow only once nothing can be moved.
+            LOG.debug('  out of space, compacting')
+            with self._exclusive():
+                if (not self._compact_step() and not self._reap()
+                        and not self._grow(self.end + need)):
+                    raise MemoryError('memspace %s: out of space' % self._name)
+
+    def _carve(self, size):
+        '''
+        cut a block of at least the given size from the front of the arena of
+        this participant and produce its offset and size, or None if the
+        arena is too small. this must be called with the arena lock held.
+        '''
+        if self._arena is None:
+            return None
+        (start, end) = self._arena
+        rest = end - start - size
+        if rest < 0:
+            return None
+        if rest < MIN_BLOCK:
+            (size, rest) = (size + rest, 0)
+
+        # others may walk the blocks concurrently, under the space lock. the
+        # new rest of the arena is in place before the old one is cut short,
+        # so they see either, but never a free block.
+        if rest:
+            _HEADER.pack_into(self._mmap, start + size, rest, 0, 0, FLAG_ARENA, os.getpid())
+            _SIZE.pack_into(self._mmap, end - _SIZE.size, rest)
+        _HEADER.pack_into(self._mmap, start, size, 0, 0, 0, os.getpid())
+        _SIZE.pack_into(self._mmap, start + size - _SIZE.size, size)
+
+        self._arena = (start + size, end) if rest else None
+        return (start, size)
+
+    def _retire(self):
+        '''
+        give the unused rest of the arena of this participant back to the
+        space. this must be called with the space lock and the arena lock
+        held.
+        '''
+        if self._arena is not None:
+            LOG.debug('  retiring arena rest: %#010x', self._arena[0])
+            self._free(self._arena[0])
+            self._arena = None
+
+    def _publish(self, records):
+        '''
+        link the given written records into their index chains and mark them
+        committed, under the lock stripes of the chains.
+        '''
+        stripes = {_stripe(hsh) for (_, hashes, _) in records for hsh in hashes}
+        with self._striped(stripes):
+            for (start, hashes, _) in records:
+                for i, hsh in enumerate(hashes):
+                    self._link(start + _RECORD.size + i * _NODE.size, start, hsh)
+                self._mmap[start + RECORD_FLAGS] = FLAG_COMMITTED
 
-    def get(self, tpl):
+            block = min(stripes)
+            self._bump(block, STAT_PUTS, len(records))
+            self._bump(block, STAT_LIVE, len(records))
+            self._bump(block, STAT_ENCODE_NS, self._encode_ns)
+            self._encode_ns = 0
+
+    def get(self, tpl, block=False, timeout=None):
         '''
-        take the queried tuple from the tuple space and return it.
+        take the queried tuple from the tuple space and return it. if block is
+        set, wait up to timeout seconds, or forever if timeout is None, for a
+        matching tuple to be put.
         '''
         LOG.info('memspace %s: get: %s', self._name, tpl)
+        return self._wait(tpl, self._take, block, timeout)
 
-        start = DATA_START
-        while start < self.end:
-            LOG.info('  offset: %#010x', start)
+    def read(self, tpl, block=False, timeout=None):
+        '''
+        seek the given tuple in the tuple space and return it. block and
+        timeout behave as for get.
+        '''
+        LOG.info('memspace %s: read: %s', self._name, tpl)
+        return self._wait(tpl, self._read, block, timeout)
 
-            (length, fields, flags) = struct.unpack_from('IBB', self._mmap, start)
-            LOG.debug('    length: %#010x, fields: %d, flags: %s', length, fields, '{0:b}'.format(flags))
-            if fields != len(tpl):
-                LOG.info('    skip: length mismatch.')
-                start += 6 + length
-                continue
-            if flags & FLAG_INVALID:
-                LOG.info('     skip: tuple invalidated.')
-                start += 6 + length
-                continue
+    def take_many(self, tpl, n):
+        '''
+        take up to n tuples matching the given template from the tuple space
+        and return them, oldest first. the index locks are taken once for the
+        whole batch.
+        '''
+        LOG.info('memspace %s: take_many %d: %s', self._name, n, tpl)
+        return self._take_many(tpl, n)
+
+    def take_all(self, tpl):
+        '''
+        take all tuples matching the given template from the tuple space and
+        return them, oldest first.
+        '''
+        LOG.info('memspace %s: take_all: %s', self._name, tpl)
+        return self._take_many(tpl, None)
+
+    def _take(self, tpl):
+        '''
+        take the queried tuple from the tuple space, or produce None.
+        '''
+        res = self._take_many(tpl, 1)
+        return res[0] if res else None
+
+    def _take_many(self, tpl, limit):
+        '''
+        take up to limit queried tuples, or all of them if limit is None, from
+        the tuple space.
+        '''
+        self._expire()
+        hsh = self._chain(tpl)
+        data = self._withdraw(hsh, lambda: self._find(tpl, hsh, limit), STAT_TAKES)
+        if data:
+            LOG.info('  %d real matches :^D', len(data))
+        return data
+
+    def _withdraw(self, hsh, find, stat, load=True):
+        '''
+        retract the records that the given function finds on the index chain
+        of the given hash, count them in the given counter, release their
+        blocks, and produce their tuples, or only their number unless load is
+        set.
+        '''
+        stripes = {_stripe(hsh)}
+        while True:
+            with self._striped(stripes):
+                starts = find()
+                if not starts:
+                    LOG.info('  chain exhausted. no match.')
+                    return [] if load else 0
+
+                # the records have to be unlinked from all their chains. if
+                # their stripes can be had right away, do so. otherwise, walk
+                # again with them taken in order.
+                missing = {_stripe(h) for start in starts for h in self._hashes(start)} - stripes
+                if self._try_stripes(missing):
+                    data = [self._load(start, _stripe(hsh)) for start in starts] if load else None
+                    for start in starts:
+                        self._retract(start)
+                    self._bump(_stripe(hsh), stat, len(starts))
+                    self._bump(_stripe(hsh), STAT_LIVE, -len(starts))
+                    for stripe in missing:
+                        self._release(stripe)
+                    break
+
+            LOG.debug('  stripes contended, walking again')
+            stripes |= missing
+
+        with self._locked():
+            for start in starts:
+                self._drop(start)
+                self._free(start)
+        LOG.debug('  released tuples')
+
+        return data if load else len(starts)
+
+    def _try_stripes(self, stripes):
+        '''
+        take all of the given lock stripes without waiting, or none of them,
+        and produce whether that succeeded
+        '''
+        held = []
+        for stripe in stripes:
+            try:
+                self._stripes[stripe].acquire(0)
+            except posix_ipc.BusyError:
+                for other in held:
+                    self._release(other)
+                return False
+            self._own(stripe, os.getpid())
+            held.append(stripe)
+        return True
 
-            data = self._mmap[start+6:start+6+length]
-            LOG.debug('    data: %s', data)
+    def _retract(self, start):
+        '''
+        mark the record at the given offset uncommitted and taken by this
+        participant, and unlink it from all its index chains. this must be
+        called with the lock stripes of all its chains held.
+        '''
+        # the owner goes first, so that the record is never uncommitted
+        # without the right owner
+        _SIZE.pack_into(self._mmap, start + RECORD_OWNER, os.getpid())
+        self._mmap[start + RECORD_FLAGS] = 0
+        for i in range(self._nodes(start)):
+            self._unlink(start + _RECORD.size + i * _NODE.size)
+
+    def _read(self, tpl):
+        '''
+        seek the queried tuple in the tuple space, or produce None.
+        '''
+        self._expire()
+        hsh = self._chain(tpl)
+        with self._striped([_stripe(hsh)]):
+            starts = self._find(tpl, hsh, 1)
+            if not starts:
+                LOG.info('  chain exhausted. no match.')
+                return None
+            data = self._load(starts[0], _stripe(hsh))
 
-            data = pickle.loads(data)
-            LOG.debug('    unpacked: %s', data)
+        LOG.info('  real match at %#010x :^D', starts[0])
+        return data
 
-            if all(x == y or y is None for (x, y) in zip(data, tpl)):
-                LOG.info('    tentative match :-)')
+    def _wait(self, tpl, func, block, timeout):
+        '''
+        apply the given lookup function to the template until it produces a
+        tuple. between attempts, park on a waiter slot that is woken by puts of
+        tuples that could match the template.
+        '''
+        res = func(tpl)
+        if res is not None or not block:
+            return res
 
-                self._lock.acquire()
-                LOG.debug('    lock acquired')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        slot = self._claim_waiter(tpl)
+        try:
+            while True:
+                res = func(tpl)
+                if res is not None:
+                    return res
 
-                (new_flags,) = struct.unpack_from('B', self._mmap, start + 5)
-                if new_flags & FLAG_INVALID:
-                    LOG.info('    already invalidated... moving on')
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    LOG.info('  wait timed out.')
+                    return None
 
-                    self._lock.release()
-                    LOG.debug('    lock released')
-                    start += 6 + length
+                if slot is None:
+                    time.sleep(WAIT_POLL if remaining is None else min(WAIT_POLL, remaining))
                     continue
 
-                LOG.info('    real match :^D')
+                try:
+                    self._waiter(slot).acquire(remaining)
+                except posix_ipc.BusyError:
+                    pass
+        finally:
+            if slot is not None:
+                self._release_waiter(slot)
+
+    def _waiter(self, slot):
+        '''
+        produce the semaphore of the given waiter slot
+        '''
+        sem = self._waits.get(slot)
+        if sem is None:
+            sem = Semaphore(_waiter_name(self._name, slot), flags=O_CREAT)
+            self._waits[slot] = sem
+        return sem
 
-                struct.pack_into('B', self._mmap, start + 5, new_flags | FLAG_INVALID)
-                LOG.debug('    invalidated tuple')
+    def _claim_waiter(self, tpl):
+        '''
+        register interest in tuples matching the given template in a free
+        waiter slot and produce the slot, or None if all slots are taken.
+        '''
+        fields = len(tpl)
+        arity = _arity_hash(fields)
+        hsh = next((h for h in (_field_hash(fields, i, x) for i, x in enumerate(tpl)
+                                if x is not None) if h is not None), arity)
 
-                self._lock.release()
-                LOG.debug('    lock released')
+        with self._locked():
+            for slot in range(WAIT_SLOTS):
+                offset = OFFSET_WAITERS + slot * _WAITER.size
+                (pid, _, _) = _WAITER.unpack_from(self._mmap, offset)
+                if pid and _alive(pid):
+                    continue
 
-                return data
+                # drain wakeups meant for a previous owner of the slot
+                sem = self._waiter(slot)
+                try:
+                    while True:
+                        sem.acquire(0)
+                except posix_ipc.BusyError:
+                    pass
 
-            start += 6 + length
+                _WAITER.pack_into(self._mmap, offset, os.getpid(), hsh, arity)
+                if not pid:
+                    (waiting,) = _SIZE.unpack_from(self._mmap, OFFSET_WAITING)
+                    _SIZE.pack_into(self._mmap, OFFSET_WAITING, waiting + 1)
+                LOG.debug('  claimed waiter slot %d', slot)
+                return slot
 
-        LOG.info('  tail reached. no match.')
+        LOG.warning('memspace %s: out of waiter slots, polling', self._name)
         return None
 
-    def read(self, tpl):
+    def _release_waiter(self, slot):
         '''
-        seek the given tuple in the tuple space and return it.
+        give up the given waiter slot
         '''
-        LOG.info('memspace %s: read: %s', self._name, tpl)
+        with self._locked():
+            _WAITER.pack_into(self._mmap, OFFSET_WAITERS + slot * _WAITER.size, 0, 0, 0)
+            (waiting,) = _SIZE.unpack_from(self._mmap, OFFSET_WAITING)
+            _SIZE.pack_into(self._mmap, OFFSET_WAITING, waiting - 1)
+        LOG.debug('  released waiter slot %d', slot)
+
+    def _wake(self, chains, arities):
+        '''
+        wake all waiters interested in any of the given index chains of new
+        tuples, and all waiters for any of the given arities, which new tuples
+        with fields that are not indexed by value have.
+        '''
+        for slot in range(WAIT_SLOTS):
+            (pid, hsh, arity) = _WAITER.unpack_from(self._mmap, OFFSET_WAITERS + slot * _WAITER.size)
+            if pid and (hsh in chains or arity in arities):
+                LOG.debug('  waking waiter slot %d', slot)
+                self._waiter(slot).release()
 
-        start = DATA_START
+    def scan(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce the tuples matching the given template, without taking them,
+        in pages of up to count tuples, starting at the given cursor of
+        scan_page, or at the start of the space.
+        '''
         while True:
-            LOG.info('  offset: %#010x', start)
+            (tpls, cursor) = self.scan_page(tpl, cursor, count)
+            yield from tpls
+            if cursor is None:
+                return
 
-            (length, fields, flags) = struct.unpack_from('IBB', self._mmap, start)
-            LOG.debug('    length: %#010x, fields: %d, flags: %s', length, fields, '{0:b}'.format(flags))
-            if fields != len(tpl):
-                LOG.info('    skip: length mismatch.')
-                start += 6 + length
-                continue
-            if flags & FLAG_INVALID:
-                LOG.info('    skip: tuple invalidated.')
-                start += 6 + length
-                continue
+    def scan_page(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce up to count tuples matching the given template, walking the
+        blocks of the space from the given cursor, or from its start, and the
+        cursor to continue from, or None once the end is reached. a page
+        holds fewer tuples if it walked SCAN_BLOCKS blocks first.
+
+        tuples are produced in the order of their positions in the space.
+        every tuple that is in the space during the whole scan is produced,
+        tuples put or taken in the meantime may or may not be. a compaction
+        moves tuples towards the start, so a scan continued after one starts
+        over, and may produce tuples again. once blocks were coalesced, the
+        block of the cursor may be gone, and a scan continued after that walks
+        the blocks from the start up to its offset again.
+        '''
+        LOG.info('memspace %s: scan: %s', self._name, tpl)
+        self._expire()
+        fields = len(tpl)
+        compiled = _compile(tpl)
+        now = time.time()
+        starts = []
+        with self._locked():
+            (reshapes,) = _OFFSET.unpack_from(self._mmap, OFFSET_RESHAPES)
+            (moves,) = _OFFSET.unpack_from(self._mmap, OFFSET_MOVES)
+            block = seek = DATA_START
+            if cursor is not None:
+                (offset, sought, seen_reshapes, seen_moves) = (
+                    int(x, 16) for x in cursor.split(':'))
+                if seen_moves != moves:
+                    LOG.info('  records moved, starting over')
+                elif seen_reshapes == reshapes:
+                    (block, seek) = (offset, sought)
+                else:
+                    LOG.info('  blocks coalesced, seeking %#010x', sought)
+                    seek = sought
+            end = self.end
+            with memoryview(self._mmap) as view:
+                for _ in range(SCAN_BLOCKS):
+                    if block >= end or len(starts) >= count:
+                        break
+                    (size, _, record_fields, flags) = _RECORD.unpack_from(view, block)
+                    if not size:
+                        raise ValueError('MemSpace block at %#010x is corrupted' % block)
+                    if (block >= seek and flags == FLAG_COMMITTED and record_fields == fields
+                            and _record_matches(view, block, fields, compiled, now)):
+                        starts.append(block)
+                    block += size
+            # committed records stay in place while the space lock is held
+            tpls = [self._load(start, LOCK_STRIPES) for start in starts]
+
+        if block >= end:
+            return (tpls, None)
+        return (tpls, '%x:%x:%x:%x' % (block, max(block, seek), reshapes, moves))
+
+    def _expire(self):
+        '''
+        reclaim the expired tuples of the timer wheel slots of the ticks that
+        have passed since the last time, if this participant is the first to
+        notice them.
+        '''
+        now = time.time()
+        tick = int(now // WHEEL_TICK) - 1
+        (swept,) = _OFFSET.unpack_from(self._mmap, OFFSET_SWEPT)
+        if swept >= tick:
+            return
+        with self._locked():
+            (swept,) = _OFFSET.unpack_from(self._mmap, OFFSET_SWEPT)
+            if swept >= tick:
+                return
+            _OFFSET.pack_into(self._mmap, OFFSET_SWEPT, tick)
+
+        # after a full turn of the wheel, every slot has been passed
+        for slot in range(max(swept + 1, tick - WHEEL_SLOTS + 1), tick + 1):
+            hsh = _expiry_hash(slot % WHEEL_SLOTS)
+            if self._count(hsh):
+                self._withdraw(hsh, lambda: self._expired(hsh, now), STAT_EXPIRED, load=False)
+
+    def _expired(self, hsh, now):
+        '''
+        walk the index chain of the given timer wheel hash and produce the
+        offsets of the records that expired by the given time. this must be
+        called with the lock stripe of the chain held.
+        '''
+        starts = []
+        (node, _, _) = _BUCKET.unpack_from(self._mmap, self._bucket(hsh))
+        while node:
+            (node, _, start, node_hsh) = _NODE.unpack_from(self._mmap, node)
+            if node_hsh == hsh and self._payload(start)[1] <= now:
+                starts.append(start)
+        if starts:
+            LOG.info('memspace %s: %d tuples expired', self._name, len(starts))
+        return starts
+
+    def compact(self, steps=None):
+        '''
+        move records from the end of the space into free blocks further down
+        and release the space that becomes free at the end, until nothing is
+        left to move or the given number of steps is done. every step takes
+        the locks on its own, so that other participants can carry on in
+        between. the unused rest of the arena of this participant is given
+        back first, and so are the arenas and unfinished records of
+        participants that are gone.
+        '''
+        LOG.info('memspace %s: compact', self._name)
+
+        with self._locked(), self._arena_lock:
+            self._retire()
+        with self._exclusive():
+            self._reap()
+
+        done = 0
+        while steps is None or done < steps:
+            with self._exclusive():
+                if not self._compact_step():
+                    break
+            done += 1
+
+        LOG.info('  compacted in %d steps, space end: %#010x', done, self.end)
+        return done
+
+    @contextmanager
+    def _locked(self):
+        '''
+        hold the space lock, which guards the allocator and the waiter slots,
+        with the view of the space updated to its current size
+        '''
+        self._acquire(LOCK_STRIPES)
+        try:
+            self._sync()
+            yield
+        finally:
+            self._release(LOCK_STRIPES)
+
+    @contextmanager
+    def _striped(self, stripes):
+        '''
+        hold the given index lock stripes, with the view of the space updated
+        to its current size. stripes are always taken in ascending order.
+        '''
+        held = []
+        try:
+            for stripe in sorted(set(stripes)):
+                self._acquire(stripe)
+                held.append(stripe)
+            self._sync()
+            yield
+        finally:
+            for stripe in reversed(held):
+                self._release(stripe)
+
+    @contextmanager
+    def _exclusive(self):
+        '''
+        hold all index lock stripes and the space lock, as needed to move
+        records around
+        '''
+        with self._striped(range(LOCK_STRIPES)), self._locked():
+            yield
+
+    def _sem(self, block):
+        '''
+        produce the lock of the given counter block: the lock stripe of the
+        same index, or the space lock
+        '''
+        return self._stripes[block] if block < LOCK_STRIPES else self._lock
+
+    def _acquire(self, block):
+        '''
+        acquire the lock of the given counter block, and record this
+        participant as its holder. if it is taken, wait for it, and count the
+        contention and the time waited in the block. if the holder turns out
+        to be dead while waiting, take the lock over from it.
+        '''
+        sem = self._sem(block)
+        try:
+            sem.acquire(0)
+        except posix_ipc.BusyError:
+            before = time.perf_counter_ns()
+            while True:
+                try:
+                    sem.acquire(LOCK_POLL)
+                    break
+                except posix_ipc.BusyError:
+                    if self._take_over(block):
+                        break
+            self._own(block, os.getpid())
+            self._bump(block, STAT_CONTENDED, 1)
+            self._bump(block, STAT_WAIT_NS, time.perf_counter_ns() - before)
+        else:
+            self._own(block, os.getpid())
+
+    def _release(self, block):
+        '''
+        release the lock of the given counter block
+        '''
+        self._own(block, 0)
+        self._sem(block).release()
+
+    def _own(self, block, pid):
+        '''
+        record the given pid as the holder of the lock of the given counter
+        block, which must be held by the calling participant
+        '''
+        _SIZE.pack_into(self._mmap, OFFSET_OWNERS + block * _SIZE.size, pid)
+
+    def _owner(self, block):
+        '''
+        produce the pid of the holder of the lock of the given counter block,
+        or 0. a participant killed right after taking the lock, or right
+        before releasing it, leaves 0 behind while it still holds it.
+        '''
+        return _SIZE.unpack_from(self._mmap, OFFSET_OWNERS + block * _SIZE.size)[0]
+
+    def _take_over(self, block):
+        '''
+        if the holder of the lock of the given counter block is dead, take
+        over all locks it held, repair what it was working on, and give back
+        all of them but the one of the given block. produce whether this
+        participant now holds that lock. participants taking over locks at the
+        same time are serialized with a file lock on the space, which the
+        system releases when its holder dies.
+        '''
+        pid = self._owner(block)
+        if not pid or _alive(pid):
+            return False
+
+        memory = self._memory()
+        try:
+            fcntl.flock(memory.fd, fcntl.LOCK_EX)
+            if self._owner(block) != pid:
+                LOG.debug('  lock %d taken over by someone else', block)
+                return False
+            LOG.warning('memspace %s: process %d died holding locks, repairing', self._name, pid)
+            held = [other for other in range(LOCK_STRIPES + 1) if self._owner(other) == pid]
+            for other in held:
+                self._own(other, os.getpid())
+            self._sync()
+            self._repair(held)
+            for other in held:
+                if other != block:
+                    self._release(other)
+            return True
+        finally:
+            memory.close_fd()
+
+    def _repair(self, held):
+        '''
+        restore the structures guarded by the given locks, which were held by
+        a participant that died: a record move of the compaction is finished
+        or undone, the index chains of the stripes are rebuilt without the
+        records the participant was publishing or taking, and the free lists
+        are rebuilt without its arena and its unfinished records. tuples that
+        were being taken are lost, tuples that were being put never appear.
+        this must be called with the given locks held.
+        '''
+        move = _MOVE.unpack_from(self._mmap, OFFSET_MOVE)
+        self._finish_move(move)
+        for stripe in held:
+            if stripe < LOCK_STRIPES:
+                self._repair_stripe(stripe, move)
+        _MOVE.pack_into(self._mmap, OFFSET_MOVE, MOVE_NONE, 0, 0, 0, 0, 0, 0)
+        if LOCK_STRIPES in held:
+            self._reap()
 
-            data = self._mmap[start+6:start+6+length]
-            LOG.debug('    data: %s', data)
+    def _finish_move(self, move):
+        '''
+        bring the blocks of the given interrupted record move into a
+        consistent state. a record that was copied completely stays at its
+        target, and the rest of its source block is left without owner, to be
+        released by _reap. otherwise, it stays at its source, which is
+        untouched, and the target is left to _reap as it is: a block of the
+        dead participant, or a free block. this must be called with all locks
+        held.
+        '''
+        (phase, _, source, target, size, target_size, rest) = move
+        if phase != MOVE_COPIED:
+            return
+        LOG.warning('  finishing move of %#010x to %#010x', source, target)
+        _SIZE.pack_into(self._mmap, target, target_size)
+        self._mmap[target + RECORD_FLAGS] = FLAG_COMMITTED
+        _SIZE.pack_into(self._mmap, target + target_size - _SIZE.size, target_size)
+        _RECORD.pack_into(self._mmap, rest, source + size - rest, 0, 0, 0)
+
+    def _repair_stripe(self, stripe, move):
+        '''
+        rebuild the index chains of the buckets of the given lock stripe from
+        the nodes reachable from their heads, keeping only the nodes of
+        committed records. the nodes of a record that was copied in an
+        interrupted move, and not yet pointed to its target, are taken from
+        the target. this must be called with the lock stripe held.
+        '''
+        (phase, relinked, source, target, _, _, _) = move
+        # the source may be overwritten by the copy, so that these are the
+        # only offsets within it that may still be reached
+        stale = set()
+        if phase == MOVE_COPIED:
+            stale = {source + _RECORD.size + i * _NODE.size
+                     for i in range(relinked, self._nodes(target))}
+
+        end = self.end
+        for bucket in range(stripe, INDEX_BUCKETS, LOCK_STRIPES):
+            bucket = INDEX_START + bucket * _BUCKET.size
+            (node, _, _) = _BUCKET.unpack_from(self._mmap, bucket)
+            nodes = []
+            seen = set()
+            while node and node not in seen and DATA_START <= node < end:
+                seen.add(node)
+                if node in stale:
+                    node = node - source + target
+                (nxt, _, start, hsh) = _NODE.unpack_from(self._mmap, node)
+                if start == source and phase == MOVE_COPIED:
+                    start = target
+                if DATA_START <= start < end and self._mmap[start + RECORD_FLAGS] == FLAG_COMMITTED:
+                    nodes.append((node, start, hsh))
+                node = nxt
+
+            for i, (node, start, hsh) in enumerate(nodes):
+                nxt = nodes[i + 1][0] if i + 1 < len(nodes) else 0
+                prv = nodes[i - 1][0] if i else 0
+                _NODE.pack_into(self._mmap, node, nxt, prv, start, hsh)
+            if nodes:
+                _BUCKET.pack_into(self._mmap, bucket, nodes[0][0], nodes[-1][0], len(nodes))
+            else:
+                _BUCKET.pack_into(self._mmap, bucket, 0, 0, 0)
+
+    def _reap(self, dead=None):
+        '''
+        rebuild the free lists from the blocks of the space, releasing the
+        arenas and unfinished records of the participants that the given
+        predicate finds dead, and all blocks without owner. by default, those
+        are the participants whose processes are gone. this must be called
+        with the space lock held, and with all locks held if the records of
+        the dead might still be linked. produce whether anything but free
+        blocks was released.
+        '''
+        if dead is None:
+            dead = lambda pid: not _alive(pid)
+        for cls in range(FREE_CLASSES):
+            _OFFSET.pack_into(self._mmap, OFFSET_FREE + cls * _OFFSET.size, 0)
+
+        end = self.end
+        alive = {}
+        reaped = False
+        hole = None
+        block = DATA_START
+        while block < end:
+            (size, _, _, flags) = _RECORD.unpack_from(self._mmap, block)
+            if not size or block + size > end:
+                raise ValueError('MemSpace block at %#010x is corrupted' % block)
+            if flags & FLAG_FREE:
+                keep = False
+            elif flags == FLAG_COMMITTED:
+                keep = True
+            else:
+                (pid,) = _SIZE.unpack_from(self._mmap, block + RECORD_OWNER)
+                if pid not in alive:
+                    alive[pid] = bool(pid) and not dead(pid)
+                keep = alive[pid]
+                reaped |= not keep
+                if not keep:
+                    self._drop(block)
+            if not keep and hole is None:
+                hole = block
+            elif keep and hole is not None:
+                self._list(hole, block - hole)
+                hole = None
+            block += size
+        if hole is not None:
+            self.end = hole
+        return reaped
+    def _bump(self, block, stat, delta):
+        '''
+        add the given delta to a counter of the given block. this must be
+        called with the lock of the block held.
+        '''
+        offset = OFFSET_STATS + (block * STAT_FIELDS + stat) * _COUNTER.size
+        _COUNTER.pack_into(self._mmap, offset, _COUNTER.unpack_from(self._mmap, offset)[0] + delta)
+
+    def stats(self):
+        '''
+        produce a dict of statistics of the space: the totals of the hot path
+        counters, and the state of the blocks, which is gathered walking all
+        of them with the space lock held.
+        '''
+        totals = [0] * STAT_FIELDS
+        for block in range(LOCK_STRIPES + 1):
+            offset = OFFSET_STATS + block * STAT_FIELDS * _COUNTER.size
+            for stat in range(STAT_FIELDS):
+                totals[stat] += _COUNTER.unpack_from(self._mmap, offset + stat * _COUNTER.size)[0]
+        res = dict(zip(STAT_NAMES, totals))
+        res['scanned_per_lookup'] = res['scanned'] / res['lookups'] if res['lookups'] else 0.0
+
+        records = pending = arenas = free = free_blocks = largest = 0
+        with self._locked():
+            (end, size) = (self.end, self.size)
+            block = DATA_START
+            while block < end:
+                (block_size, _, _, flags) = _RECORD.unpack_from(self._mmap, block)
+                if not block_size:
+                    raise ValueError('MemSpace block at %#010x is corrupted' % block)
+                if flags & FLAG_FREE:
+                    free += block_size
+                    free_blocks += 1
+                    largest = max(largest, block_size)
+                elif flags & FLAG_ARENA:
+                    arenas += block_size
+                elif flags & FLAG_COMMITTED:
+                    records += 1
+                else:
+                    # being written, or taken and not yet released
+                    pending += 1
+                block += block_size
+            waiting = _SIZE.unpack_from(self._mmap, OFFSET_WAITING)[0]
+
+        res.update(
+            size=size,
+            end=end,
+            records=records,
+            pending_records=pending,
+            arena_bytes=arenas,
+            free_bytes=free,
+            free_blocks=free_blocks,
+            largest_free=largest,
+            tail_bytes=size - end,
+            # the share of free space below the end that the largest free
+            # block does not cover
+            fragmentation=1 - largest / free if free else 0.0,
+            waiting=waiting,
+        )
+        return res
+
+    def _sync(self):
+        '''
+        map the space again if it was grown by another participant
+        '''
+        if _SIZE.unpack_from(self._mmap, OFFSET_GENERATION)[0] != self._generation:
+            self._remap()
+
+    def _remap(self):
+        '''
+        map the space again after it was grown by another participant
+        '''
+        shmem = self._memory()
+        self._map(shmem.fd, self.size)
+        shmem.close_fd()
+        self._generation = _SIZE.unpack_from(self._mmap, OFFSET_GENERATION)[0]
+        LOG.info('shmem %s: remapped at %#x bytes, generation %d',
+                 self._name, len(self._mmap), self._generation)
+
+    def _map(self, fd, size):
+        '''
+        replace the current mapping of the space with one of the given size
+        '''
+        old = self._mmap
+        self._mmap = mmap.mmap(fd, size)
+        if old is not None:
+            try:
+                old.close()
+            except BufferError:
+                # someone still holds a view into the old mapping. it goes
+                # away with the last reference to it.
+                pass
+
+    def _grow(self, needed):
+        '''
+        grow the space to hold at least the given number of bytes and produce
+        whether that succeeded. this must be called with the space lock held.
+        '''
+        size = len(self._mmap)
+        while size < needed:
+            size *= 2
+
+        (max_size,) = _OFFSET.unpack_from(self._mmap, OFFSET_MAX_SIZE)
+        if max_size:
+            size = min(size, max_size)
+            if size < needed:
+                return False
+
+        LOG.info('shmem %s: growing to %#x bytes', self._name, size)
+        shmem = self._memory()
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                # allocate the backing memory up front, instead of running
+                # into SIGBUS on first touch when the system is out of it
+                os.posix_fallocate(shmem.fd, 0, size)
+            else:
+                os.ftruncate(shmem.fd, size)
+            self._map(shmem.fd, size)
+        except OSError:
+            LOG.warning('shmem %s: growing to %#x bytes failed', self._name, size, exc_info=True)
+            return False
+        finally:
+            shmem.close_fd()
+
+        self._generation += 1
+        _OFFSET.pack_into(self._mmap, OFFSET_SIZE, size)
+        _SIZE.pack_into(self._mmap, OFFSET_GENERATION, self._generation)
+        return True
+
+    def _alloc(self, size, flags):
+        '''
+        reserve a block of at least the given size, marked with the given
+        flags, and produce its offset and actual size, or None if the space is
+        out of room. blocks are reused from the free lists where possible.
+        this must be called with the space lock held.
+        '''
+        block = self._take_free(size)
+        if block is None:
+            if self.end + size > len(self._mmap):
+                return None
+            block = (self.end, size)
+
+        # the header goes first, so that the blocks can be walked whenever
+        # the space lock changes hands
+        (start, size) = block
+        _HEADER.pack_into(self._mmap, start, size, 0, 0, flags, os.getpid())
+        _SIZE.pack_into(self._mmap, start + size - _SIZE.size, size)
+        if start == self.end:
+            self.end += size
+        return block
 
-            data = pickle.loads(data)
-            LOG.debug('    unpacked: %s', data)
+    def _free(self, start):
+        '''
+        release the block at the given offset, coalescing it with free
+        neighbours, and give it back to the end of the space or to the free
+        lists. this must be called with the space lock held.
+        '''
+        (size, _, _, _) = _RECORD.unpack_from(self._mmap, start)
+        end = self.end
+        reshaped = False
+
+        following = start + size
+        if following < end:
+            (following_size, _, _, flags) = _RECORD.unpack_from(self._mmap, following)
+            if flags & FLAG_FREE:
+                self._unlist(following)
+                size += following_size
+                reshaped = True
+
+        if start > DATA_START:
+            (preceding_size,) = _SIZE.unpack_from(self._mmap, start - _SIZE.size)
+            (_, _, _, flags) = _RECORD.unpack_from(self._mmap, start - preceding_size)
+            if flags & FLAG_FREE:
+                start -= preceding_size
+                self._unlist(start)
+                size += preceding_size
+                reshaped = True
+
+        if reshaped or start + size == end:
+            # block boundaries are gone, which scans in progress may point to
+            _OFFSET.pack_into(self._mmap, OFFSET_RESHAPES,
+                              _OFFSET.unpack_from(self._mmap, OFFSET_RESHAPES)[0] + 1)
+
+        if start + size == end:
+            LOG.debug('  trimming space end to %#010x', start)
+            self.end = start
+            return
 
-            if all(x == y or y is None for (x, y) in zip(data, tpl)):
-                LOG.info('    real match :^D')
-                return data
+        self._list(start, size)
 
-            start += 6 + length
+    def _list(self, start, size):
+        '''
+        mark the block at the given offset free and push it to its free list.
+        this must be called with the space lock held.
+        '''
+        _RECORD.pack_into(self._mmap, start, size, 0, 0, FLAG_FREE)
+        _SIZE.pack_into(self._mmap, start + size - _SIZE.size, size)
 
-        LOG.info('  tail reached. no match.')
+        head = OFFSET_FREE + _size_class(size) * _OFFSET.size
+        (first,) = _OFFSET.unpack_from(self._mmap, head)
+        _FREE.pack_into(self._mmap, start + _RECORD.size, first, 0)
+        if first:
+            _OFFSET.pack_into(self._mmap, first + _RECORD.size + _OFFSET.size, start)
+        _OFFSET.pack_into(self._mmap, head, start)
+
+    def _unlist(self, start):
+        '''
+        remove the free block at the given offset from its free list. this
+        must be called with the space lock held.
+        '''
+        (size, _, _, _) = _RECORD.unpack_from(self._mmap, start)
+        (nxt, prv) = _FREE.unpack_from(self._mmap, start + _RECORD.size)
+        if prv:
+            _OFFSET.pack_into(self._mmap, prv + _RECORD.size, nxt)
+        else:
+            _OFFSET.pack_into(self._mmap, OFFSET_FREE + _size_class(size) * _OFFSET.size, nxt)
+        if nxt:
+            _OFFSET.pack_into(self._mmap, nxt + _RECORD.size + _OFFSET.size, prv)
+
+    def _take_free(self, size, below=None):
+        '''
+        take a free block of at least the given size, optionally located below
+        the given offset, off the free lists, and produce its offset and size,
+        or None. excess space is split off and returned to the free lists.
+        this must be called with the space lock held.
+        '''
+        for cls in range(_size_class(size), FREE_CLASSES):
+            (start,) = _OFFSET.unpack_from(self._mmap, OFFSET_FREE + cls * _OFFSET.size)
+            while start:
+                (block_size, _, _, _) = _RECORD.unpack_from(self._mmap, start)
+                if block_size >= size and (below is None or start < below):
+                    self._unlist(start)
+                    if block_size - size >= MIN_BLOCK:
+                        self._list(start + size, block_size - size)
+                        block_size = size
+                    return (start, block_size)
+                (start, _) = _FREE.unpack_from(self._mmap, start + _RECORD.size)
         return None
 
+    def _compact_step(self):
+        '''
+        move the last record of the space into a free block further down and
+        release its old block. if no free block fits it, slide the first record
+        that follows a free block down into it instead, moving the hole
+        towards the end of the space. records that are not committed, like
+        those still being written, and arenas are never moved. produce whether
+        anything was moved. this must be called with all locks held.
+        '''
+        end = self.end
+        if end == DATA_START:
+            return False
+
+        (size,) = _SIZE.unpack_from(self._mmap, end - _SIZE.size)
+        start = end - size
+        block = None
+        if self._movable(start):
+            block = self._take_free(size, below=start)
+        if block is None:
+            hole = self._slidable()
+            if hole is None:
+                return False
+            self._slide(hole)
+            return True
+
+        (target, target_size) = block
+        LOG.debug('  moving record %#010x to %#010x', start, target)
+        # the target is owned by this participant until the record is in it
+        _HEADER.pack_into(self._mmap, target, target_size, 0, 0, 0, os.getpid())
+        _SIZE.pack_into(self._mmap, target + target_size - _SIZE.size, target_size)
+        self._move(start, target, size, target_size, start)
+        return True
+
+    def _movable(self, start):
+        '''
+        check if the block at the given offset is a committed record. this
+        must be called with all locks held.
+        '''
+        return self._mmap[start + RECORD_FLAGS] == FLAG_COMMITTED
+
+    def _slidable(self):
+        '''
+        produce the offset of the lowest free block that is followed by a
+        movable record, or None. this must be called with all locks held.
+        '''
+        lowest = None
+        for cls in range(FREE_CLASSES):
+            (start,) = _OFFSET.unpack_from(self._mmap, OFFSET_FREE + cls * _OFFSET.size)
+            while start:
+                (size, _, _, _) = _RECORD.unpack_from(self._mmap, start)
+                if (lowest is None or start < lowest) and self._movable(start + size):
+                    lowest = start
+                (start, _) = _FREE.unpack_from(self._mmap, start + _RECORD.size)
+        return lowest
+
+    def _slide(self, hole):
+        '''
+        move the record following the given free block down to the start of
+        the block, and release the space behind it. this must be called with
+        all locks held.
+        '''
+        (hole_size, _, _, _) = _RECORD.unpack_from(self._mmap, hole)
+        start = hole + hole_size
+        (size, _, _, _) = _RECORD.unpack_from(self._mmap, start)
+        LOG.debug('  sliding record %#010x to %#010x', start, hole)
+
+        self._unlist(hole)
+        self._move(start, hole, size, size, hole + size)
+
+    def _move(self, source, target, size, target_size, rest):
+        '''
+        copy the record of the given size at source into the block of the
+        given size at target, point its index nodes there, and release the
+        block from rest to the end of the source block. the progress is kept
+        in the header, so that the move can be finished or undone should this
+        participant die. this must be called with all locks held.
+        '''
+        _MOVE.pack_into(self._mmap, OFFSET_MOVE,
+                        MOVE_STARTED, 0, source, target, size, target_size, rest)
+        # makes scans in progress start over
+        _OFFSET.pack_into(self._mmap, OFFSET_MOVES, _OFFSET.unpack_from(self._mmap, OFFSET_MOVES)[0] + 1)
+        self._mmap.move(target, source, size)
+        _OFFSET.pack_into(self._mmap, OFFSET_MOVE, MOVE_COPIED)
+
+        _SIZE.pack_into(self._mmap, target, target_size)
+        _SIZE.pack_into(self._mmap, target + target_size - _SIZE.size, target_size)
+        for i in range(self._nodes(target)):
+            self._relink(source + _RECORD.size + i * _NODE.size, source, target, size)
+            _OFFSET.pack_into(self._mmap, OFFSET_MOVE + _OFFSET.size, i + 1)
+
+        _HEADER.pack_into(self._mmap, rest, source + size - rest, 0, 0, 0, os.getpid())
+        _MOVE.pack_into(self._mmap, OFFSET_MOVE, MOVE_NONE, 0, 0, 0, 0, 0, 0)
+        self._free(rest)
+
+    def _bucket(self, hsh):
+        '''
+        produce the offset of the index bucket of the given hash
+        '''
+        return INDEX_START + (hsh % INDEX_BUCKETS) * _BUCKET.size
+
+    def _count(self, hsh):
+        '''
+        produce the length of the index bucket of the given hash, which is an
+        upper bound of the length of the chain of that hash
+        '''
+        return _BUCKET.unpack_from(self._mmap, self._bucket(hsh))[2]
+
+    def _link(self, node, start, hsh):
+        '''
+        append the given index node of the record at start to its chain. this
+        must be called with the lock stripe of the chain held.
+        '''
+        bucket = self._bucket(hsh)
+        (head, tail, count) = _BUCKET.unpack_from(self._mmap, bucket)
+        _NODE.pack_into(self._mmap, node, 0, tail, start, hsh)
+        if tail:
+            _OFFSET.pack_into(self._mmap, tail, node)
+        else:
+            head = node
+        _BUCKET.pack_into(self._mmap, bucket, head, node, count + 1)
+
+    def _unlink(self, node):
+        '''
+        remove the given index node from its chain. this must be called with
+        the lock stripe of the chain held.
+        '''
+        (nxt, prv, _, hsh) = _NODE.unpack_from(self._mmap, node)
+        bucket = self._bucket(hsh)
+        (head, tail, count) = _BUCKET.unpack_from(self._mmap, bucket)
+        if prv:
+            _OFFSET.pack_into(self._mmap, prv, nxt)
+        else:
+            head = nxt
+        if nxt:
+            _OFFSET.pack_into(self._mmap, nxt + _OFFSET.size, prv)
+        else:
+            tail = prv
+        _BUCKET.pack_into(self._mmap, bucket, head, tail, count - 1)
+
+    def _relink(self, node, start, target, size):
+        '''
+        point the neighbours of the given index node, that was copied along
+        with its record from start to target, to the node's new location.
+        this must be called with all locks held.
+        '''
+        def relocate(offset):
+            if start <= offset < start + size:
+                return offset - start + target
+            return offset
+
+        node = relocate(node)
+        (nxt, prv, _, hsh) = _NODE.unpack_from(self._mmap, node)
+        (nxt, prv) = (relocate(nxt), relocate(prv))
+        _NODE.pack_into(self._mmap, node, nxt, prv, target, hsh)
+
+        bucket = self._bucket(hsh)
+        (head, tail, count) = _BUCKET.unpack_from(self._mmap, bucket)
+        if prv:
+            _OFFSET.pack_into(self._mmap, prv, node)
+        else:
+            head = node
+        if nxt:
+            _OFFSET.pack_into(self._mmap, nxt + _OFFSET.size, node)
+        else:
+            tail = node
+        _BUCKET.pack_into(self._mmap, bucket, head, tail, count)
+
+    def _chain(self, tpl):
+        '''
+        produce the hash of the shortest index chain covering the given
+        template
+        '''
+        fields = len(tpl)
+        hashes = []
+        for i, x in enumerate(tpl):
+            if x is None:
+                continue
+            # a value chain only covers a position if no tuple of this arity
+            # holds an unindexed value there
+            hsh = _field_hash(fields, i, x)
+            if hsh is not None and not self._holds(_unindexed_hash(fields, i)):
+                hashes.append(hsh)
+        hashes.append(_arity_hash(fields))
+        return min(hashes, key=self._count)
+
+    def _holds(self, hsh):
+        '''
+        check if the index chain of the given hash is not empty. the bucket
+        count alone is not enough, since other chains may share the bucket.
+        '''
+        if not self._count(hsh):
+            return False
+        with self._striped([_stripe(hsh)]):
+            (node, _, _) = _BUCKET.unpack_from(self._mmap, self._bucket(hsh))
+            while node:
+                (node, _, _, node_hsh) = _NODE.unpack_from(self._mmap, node)
+                if node_hsh == hsh:
+                    return True
+        return False
+
+    def _hashes(self, start):
+        '''
+        produce the hashes of the index chains of the record at the given
+        offset. this must be called with a lock stripe of one of its chains
+        held.
+        '''
+        return [_NODE.unpack_from(self._mmap, start + _RECORD.size + i * _NODE.size)[3]
+                for i in range(self._nodes(start))]
+
+    def _nodes(self, start):
+        '''
+        produce the number of index nodes of the record at the given offset
+        '''
+        (_, _, fields, _) = _RECORD.unpack_from(self._mmap, start)
+        return fields + 1 + self._mmap[start + RECORD_EXPIRES]
+
+    def _payload(self, start):
+        '''
+        produce the offset of the payload of the record at the given offset,
+        and its deadline, or None if it does not expire
+        '''
+        expires = self._mmap[start + RECORD_EXPIRES]
+        payload = start + _RECORD.size + self._nodes(start) * _NODE.size
+        if not expires:
+            return (payload, None)
+        return (payload + _DEADLINE.size, _DEADLINE.unpack_from(self._mmap, payload)[0])
+
+    def _load(self, start, block):
+        '''
+        materialize the tuple of the record at the given offset, and count the
+        time taken in the given counter block. this must be called with the
+        lock of the block held.
+        '''
+        before = time.perf_counter_ns()
+        (_, _, fields, _) = _RECORD.unpack_from(self._mmap, start)
+        (payload, _) = self._payload(start)
+        with memoryview(self._mmap) as view:
+            data = []
+            for i in range(fields):
+                (kind, code, offset, length) = _FIELD.unpack_from(view, payload + i * _FIELD.size)
+                data.append(_decode(view, payload + offset, kind, code, length))
+        self._bump(block, STAT_DECODE_NS, time.perf_counter_ns() - before)
+        return tuple(data)
+
+    def _find(self, tpl, hsh, limit):
+        '''
+        walk the index chain of the given hash and produce the offsets of up
+        to limit tuples matching the given template, or of all of them if
+        limit is None. records are matched in place, without materializing
+        them, and expired records are passed over until they are reclaimed.
+        this must be called with the lock stripe of the chain held.
+        '''
+        fields = len(tpl)
+        compiled = _compile(tpl)
+        now = time.time()
+        starts = []
+        scanned = 0
+        with memoryview(self._mmap) as view:
+            (node, _, _) = _BUCKET.unpack_from(view, self._bucket(hsh))
+            while node and len(starts) != limit:
+                (nxt, _, start, node_hsh) = _NODE.unpack_from(view, node)
+                node = nxt
+                scanned += 1
+                if node_hsh != hsh:
+                    continue
+
+                (_, _, record_fields, _) = _RECORD.unpack_from(view, start)
+                if record_fields == fields and _record_matches(view, start, fields, compiled, now):
+                    starts.append(start)
+
+        self._bump(_stripe(hsh), STAT_LOOKUPS, 1)
+        self._bump(_stripe(hsh), STAT_SCANNED, scanned)
+        return starts
+
     def close(self):
         '''
         close the connection to the shmem
         '''
+        with self._locked(), self._arena_lock:
+            self._retire()
         self._mmap.close()
         self._lock.close()
+        for sem in self._stripes:
+            sem.close()
+        self._stripes = []
+        for sem in self._waits.values():
+            sem.close()
+        self._waits.clear()
+
+    def sync(self):
+        '''
+        wait for all changes to a durable space so far, of all participants,
+        to be written to its file
+        '''
+        self._mmap.flush()
 
     def unlink(self):
         '''
-        close and destroy the shm and semaphore
+        close and destroy the shm, or the file of a durable space, the large
+        fields of its tuples, and the semaphores
         '''
+        with self._locked():
+            block = DATA_START
+            while block < self.end:
+                (size, _, _, flags) = _RECORD.unpack_from(self._mmap, block)
+                if not flags & FLAG_FREE:
+                    self._drop(block)
+                block += size
         self.close()
-        posix_ipc.unlink_shared_memory(self._name)
+        if self._path is not None:
+            os.unlink(self._path)
+        else:
+            posix_ipc.unlink_shared_memory(self._name)
         posix_ipc.unlink_semaphore(self._name)
+        for stripe in range(LOCK_STRIPES):
+            posix_ipc.unlink_semaphore(_stripe_name(self._name, stripe))
+        for slot in range(WAIT_SLOTS):
+            try:
+                posix_ipc.unlink_semaphore(_waiter_name(self._name, slot))
+            except ExistentialError:
+                pass
 
     def _open(self):
         '''
         connect to the shmem of the given name. this initializes the shmem, if
-        it does not exist, on exactly one client
+        it does not exist, on exactly one client. the others wait for it on
+        the space lock, which the creator holds until it is done.
         '''
         try:
             self._connect()
         except ExistentialError:
+            if not self._create_missing:
+                raise
             LOG.warning('shmem %s: connect failed, need to create', self._name)
             try:
                 self._create()
@@ -233,51 +2109,174 @@ class MemSpace(object):
                 LOG.warning('shmem %s: create failed, someone was faster', self._name)
                 self._connect()
 
-        # wait for space to be initialized
-        tries = 0
-        while self._mmap[:8] != b'memspace':
-            time.sleep(1)
-            tries += 1
-            if tries >= 10:
-                raise ValueError('MemSpace wait timed out - corrupted?')
         if self._mmap[OFFSET_VERSION] != MEMSPACE_VERSION:
             raise ValueError('MemSpace version mismatch')
+        (max_size,) = _OFFSET.unpack_from(self._mmap, OFFSET_MAX_SIZE)
+        if self._max_size is not None and self._max_size != max_size:
+            LOG.warning('shmem %s: exists with max_size %d, ignoring max_size %d',
+                        self._name, max_size, self._max_size)
 
     def _connect(self):
         '''
         attempt to connect to the shared memory
         '''
         LOG.info('shmem %s: attempting connect', self._name)
-        shmem = SharedMemory(self._name)
-        self._mmap = mmap.mmap(shmem.fd, shmem.size)
-        shmem.close_fd()
-        self._lock = Semaphore(self._name)
+        try:
+            self._lock = Semaphore(self._name)
+        except ExistentialError:
+            # the semaphores of a durable space are gone after a reboot, but
+            # its file is still there
+            if self._path is None:
+                raise
+            self._attach()
+            if self._mmap[:8] != b'memspace':
+                raise
+            try:
+                self._restart()
+                return
+            except ExistentialError:
+                LOG.warning('shmem %s: restart failed, someone was faster', self._name)
+                self._lock = Semaphore(self._name)
+
+        try:
+            self._attach()
+        except ExistentialError:
+            # the space lock is created first, so the shmem is about to be
+            self._await()
+            self._attach()
+        # the creator writes the magic number last, and a participant
+        # restarting a durable space recreates its stripes
+        if self._mmap[:8] != b'memspace' or self._path is not None:
+            self._await()
+        self._stripes = [Semaphore(_stripe_name(self._name, stripe))
+                         for stripe in range(LOCK_STRIPES)]
         LOG.info('shmem %s: connect succeeded', self._name)
 
+    def _attach(self):
+        '''
+        map the shared memory, or the file of a durable space
+        '''
+        shmem = self._memory()
+        self._map(shmem.fd, shmem.size)
+        shmem.close_fd()
+
+    def _await(self):
+        '''
+        wait for the participant creating or restarting the space to be done
+        with it, which it is once it releases the space lock
+        '''
+        LOG.info('shmem %s: waiting for initialization', self._name)
+        try:
+            self._lock.acquire(INIT_TIMEOUT)
+        except posix_ipc.BusyError:
+            raise ValueError('MemSpace wait timed out - corrupted?')
+        self._lock.release()
+
     def _create(self):
         '''
-        attempt to create and initialize the shared memory
+        attempt to create and initialize the shared memory. the space lock
+        goes first, and is held until the space is initialized, so that
+        others can wait for that on it.
         '''
+        LOG.info('shmem %s: attempting create semaphores', self._name)
+        self._lock = Semaphore(self._name, flags=O_CREX)
         LOG.info('shmem %s: attempting create shmem', self._name)
-        shmem = SharedMemory(self._name, size=SHMEM_SIZE, flags=O_CREX)
+        try:
+            shmem = self._memory(O_CREX, SHMEM_SIZE)
+        except ExistentialError:
+            self._lock.unlink()
+            raise
         LOG.info('shmem %s: attempting create mmap', self._name)
-        self._mmap = mmap.mmap(shmem.fd, shmem.size)
+        self._map(shmem.fd, shmem.size)
         shmem.close_fd()
-        LOG.info('shmem %s: attempting create semaphore', self._name)
+        LOG.info('shmem %s: attempting create stripes', self._name)
         # TODO: posix_ipc does not support unnamed semaphores yet...
-        #       using a named semaphore for now.
-        self._lock = Semaphore(self._name, flags=O_CREX)
-        LOG.info('shmem %s: create succeeded', self._name)
-
+        #       using named semaphores for now. nobody connects before the
+        #       space lock is released, so stale stripes can be replaced.
         try:
+            for stripe in range(LOCK_STRIPES):
+                name = _stripe_name(self._name, stripe)
+                try:
+                    posix_ipc.unlink_semaphore(name)
+                except ExistentialError:
+                    pass
+                self._stripes.append(Semaphore(name, flags=O_CREX, initial_value=1))
+            LOG.info('shmem %s: create succeeded', self._name)
             self._initialize()
             self._lock.release()
         except:
             LOG.exception('shmem %s: initialize failed; attempting unlink', self._name)
-            shmem.unlink()
+            if self._path is not None:
+                os.unlink(self._path)
+            else:
+                shmem.unlink()
             self._lock.unlink()
             raise
 
+    def _memory(self, flags=0, size=0):
+        '''
+        open the shared memory of the space, or the file of a durable space
+        '''
+        if self._path is not None:
+            return _FileMemory(self._path, flags, size)
+        return SharedMemory(self._name, flags=flags, size=size)
+
+    def _restart(self):
+        '''
+        take over a durable space whose semaphores are gone: create them, and
+        recover the space with the space lock held
+        '''
+        LOG.info('shmem %s: attempting restart', self._name)
+        self._lock = Semaphore(self._name, flags=O_CREX)
+        try:
+            for stripe in range(LOCK_STRIPES):
+                name = _stripe_name(self._name, stripe)
+                try:
+                    posix_ipc.unlink_semaphore(name)
+                except ExistentialError:
+                    pass
+                self._stripes.append(Semaphore(name, flags=O_CREX, initial_value=1))
+            if self._mmap[OFFSET_VERSION] == MEMSPACE_VERSION:
+                self._recover()
+            self._lock.release()
+        except:
+            LOG.exception('shmem %s: restart failed; attempting unlink', self._name)
+            self._lock.unlink()
+            raise
+        LOG.info('shmem %s: restart succeeded', self._name)
+
+    def _recover(self):
+        '''
+        rebuild the free lists, the index and the counters of the space from
+        its blocks, dropping records that were not committed and the arenas
+        of the participants that are gone. the recovered tuples keep their
+        order where they are in the order of their positions in the space.
+        this must be called with the space lock held, and with no other
+        participant connected.
+        '''
+        LOG.warning('shmem %s: recovering', self._name)
+        _OFFSET.pack_into(self._mmap, OFFSET_SIZE, len(self._mmap))
+        self._finish_move(_MOVE.unpack_from(self._mmap, OFFSET_MOVE))
+        _SIZE.pack_into(self._mmap, OFFSET_WAITING, 0)
+        self._mmap[OFFSET_FREE:DATA_START] = bytes(DATA_START - OFFSET_FREE)
+
+        end = self.end
+        records = 0
+        block = DATA_START
+        while block < end:
+            (size, _, _, flags) = _RECORD.unpack_from(self._mmap, block)
+            if not size or block + size > end:
+                raise ValueError('MemSpace block at %#010x is corrupted' % block)
+            if flags == FLAG_COMMITTED:
+                for i, hsh in enumerate(self._hashes(block)):
+                    self._link(block + _RECORD.size + i * _NODE.size, block, hsh)
+                records += 1
+            block += size
+        self._reap(lambda pid: True)
+
+        self._bump(LOCK_STRIPES, STAT_LIVE, records)
+        LOG.warning('shmem %s: recovered %d records', self._name, records)
+
     def _initialize(self):
         '''
         prepare the shmem control structures
@@ -287,6 +2286,9 @@ class MemSpace(object):
         self._mmap[OFFSET_VERSION] = MEMSPACE_VERSION
         LOG.info('  writing initial tail offset')
         self.end = DATA_START
+        LOG.info('  writing size limits')
+        _OFFSET.pack_into(self._mmap, OFFSET_SIZE, len(self._mmap))
+        _OFFSET.pack_into(self._mmap, OFFSET_MAX_SIZE, self._max_size or 0)
         LOG.info('  writing magic number')
         self._mmap[:8] = b'memspace'
         LOG.info('shmem %s: initialize succeeded', self._name)
@@ -0,0 +1,81 @@
+ ##############################################################################
+ #    memspaces - tuple spaces in shared memory                               #
+ #    Copyright (C) 2017  Andreas Grapentin                                   #
+ #                                                                            #
+ #    This program is free software: you can redistribute it and/or modify    #
+ #    it under the terms of the GNU General Public License as published by    #
+ #    the Free Software Foundation, either version 3 of the License, or       #
+ #    (at your option) any later version.                                     #
+ #                                                                            #
+ #    This program is distributed in the hope that it will be useful,         #
+ #    but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+ #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+ #    GNU General Public License for more details.                            #
+ #                                                                            #
+ #    You should have received a copy of the GNU General Public License       #
+ #    along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+ ##############################################################################
+
+'''
+this module is a command line tool that attaches to a named shmem space and
+prints its statistics.
+'''
+
+import sys
+import json
+import time
+import argparse
+from posix_ipc import ExistentialError
+from memspaces import MemSpace
+
+
+def _format(stats):
+    '''
+    produce a human readable listing of the given statistics
+    '''
+    lines = []
+    for (key, value) in sorted(stats.items()):
+        if key.endswith('_ns'):
+            (key, value) = (key[:-3] + '_ms', '%.3f' % (value / 1e6))
+        elif isinstance(value, float):
+            value = '%.3f' % value
+        lines.append('%-20s %s' % (key + ':', value))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    '''
+    entry point - invoked when run from the command line.
+    '''
+    parser = argparse.ArgumentParser(description='memspaces shmem statistics')
+    parser.add_argument(
+        'name', action='store',
+        help='the name of the shmem space to attach to')
+    parser.add_argument(
+        '--json', action='store_true',
+        help='print the statistics as a json object')
+    parser.add_argument(
+        '--interval', action='store', default=None, type=float,
+        help='print the statistics every this many seconds, until interrupted')
+
+    args = parser.parse_args(argv)
+    try:
+        space = MemSpace(args.name, create=False)
+    except ExistentialError:
+        parser.exit(1, 'memspace %s does not exist\n' % args.name)
+
+    with space:
+        while True:
+            stats = space.stats()
+            if args.json:
+                sys.stdout.write(json.dumps(stats, sort_keys=True) + '\n')
+            else:
+                sys.stdout.write(_format(stats) + '\n\n')
+            sys.stdout.flush()
+            if args.interval is None:
+                break
+            time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
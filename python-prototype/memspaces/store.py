@@ -0,0 +1,286 @@
+ ##############################################################################
+ #    memspaces - tuple spaces in shared memory                               #
+ #    Copyright (C) 2017  Andreas Grapentin                                   #
+ #                                                                            #
+ #    This program is free software: you can redistribute it and/or modify    #
+ #    it under the terms of the GNU General Public License as published by    #
+ #    the Free Software Foundation, either version 3 of the License, or       #
+ #    (at your option) any later version.                                     #
+ #                                                                            #
+ #    This program is distributed in the hope that it will be useful,         #
+ #    but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+ #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+ #    GNU General Public License for more details.                            #
+ #                                                                            #
+ #    You should have received a copy of the GNU General Public License       #
+ #    along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+ ##############################################################################
+
+'''
+This module implements an indexed in-memory tuple store for the servers.
+
+tuples are partitioned by arity. every partition keeps its tuples in insertion
+order, keyed by a sequence number, and indexes every position by value. a
+lookup walks the smallest index bucket of the bound positions of the template,
+so that the oldest match is found without scanning unrelated tuples, and a
+tuple is removed in constant time. predicate fields in templates are
+evaluated on the candidates, and sets of values use the union of their index
+buckets.
+
+tuples may have a deadline, kept in a min-heap, so that the expired tuples
+are found without looking at any others.
+
+a scan walks the sequence numbers of a partition in order, resuming after the
+last one it walked, which is found by bisection.
+'''
+
+import heapq
+import bisect
+import itertools
+from .templates import Predicate, OneOf
+
+
+# marks the key of a list, which never equals a tuple of the same items
+_LIST = object()
+
+# tuples looked at per page of a scan at most
+SCAN_STEPS = 4096
+
+
+def _key(value):
+    '''
+    produce a hashable key of a tuple field, such that fields that compare
+    equal produce equal keys, or None if the field has no such key.
+    '''
+    if isinstance(value, (list, tuple)):
+        keys = tuple(_key(x) for x in value)
+        if any(k is None for k in keys):
+            return None
+        return (_LIST, keys) if isinstance(value, list) else keys
+    try:
+        hash(value)
+    except TypeError:
+        return None
+    return value
+
+
+def _matches(tpl, t):
+    '''
+    check if the given tuple matches the given template
+    '''
+    return len(tpl) == len(t) and all(
+        x is None or (x.matches(y) if isinstance(x, Predicate) else x == y)
+        for (x, y) in zip(tpl, t))
+
+
+class _Partition(object):
+    '''
+    the tuples of one arity, with per position value indexes
+    '''
+
+    def __init__(self, arity):
+        '''
+        constructor - prepare empty indexes
+        '''
+        self.records = {}
+        # per position: key -> ordered set of sequence numbers
+        self.index = [{} for _ in range(arity)]
+        # per position: ordered set of sequence numbers of tuples without key
+        self.unindexed = [{} for _ in range(arity)]
+        # all sequence numbers in order, including those of removed tuples
+        # until they make up half of them
+        self.order = []
+        self.removed = 0
+
+    def add(self, seq, tpl):
+        '''
+        store the given tuple under the given sequence number
+        '''
+        self.records[seq] = tpl
+        self.order.append(seq)
+        for i, x in enumerate(tpl):
+            key = _key(x)
+            if key is None:
+                self.unindexed[i][seq] = None
+            else:
+                self.index[i].setdefault(key, {})[seq] = None
+
+    def remove(self, seq):
+        '''
+        remove the tuple of the given sequence number and produce it
+        '''
+        tpl = self.records.pop(seq)
+        for i, x in enumerate(tpl):
+            key = _key(x)
+            if key is None:
+                del self.unindexed[i][seq]
+                continue
+            bucket = self.index[i][key]
+            del bucket[seq]
+            if not bucket:
+                del self.index[i][key]
+        self.removed += 1
+        if self.removed * 2 > len(self.order):
+            self.order = list(self.records)
+            self.removed = 0
+        return tpl
+
+    def candidates(self, tpl):
+        '''
+        produce the sequence numbers of the tuples that may match the given
+        template, oldest first
+        '''
+        best = self.records
+        for i, x in enumerate(tpl):
+            # a value index only covers a position if no tuple holds a value
+            # without key there
+            if x is None or self.unindexed[i]:
+                continue
+            if isinstance(x, OneOf):
+                keys = [_key(v) for v in x.values]
+                if None in keys:
+                    continue
+                buckets = [b for b in (self.index[i].get(k) for k in keys) if b is not None]
+                if sum(len(b) for b in buckets) < len(best):
+                    # sequence numbers grow, so sorting restores the order
+                    best = sorted(set().union(*buckets))
+                continue
+            if isinstance(x, Predicate):
+                continue
+            key = _key(x)
+            if key is None:
+                continue
+            bucket = self.index[i].get(key)
+            if bucket is None:
+                return ()
+            if len(bucket) < len(best):
+                best = bucket
+        return best
+
+    def find(self, tpl, limit):
+        '''
+        produce the sequence numbers of up to limit tuples matching the given
+        template, or of all of them if limit is None, oldest first
+        '''
+        matches = (seq for seq in self.candidates(tpl) if _matches(tpl, self.records[seq]))
+        return list(itertools.islice(matches, limit))
+
+    def scan(self, tpl, after, limit):
+        '''
+        produce up to limit tuples matching the given template, looking at
+        the tuples put after the given sequence number in order, and the
+        sequence number of the last tuple looked at, or None if there are no
+        more.
+        '''
+        res = []
+        start = i = bisect.bisect_right(self.order, after)
+        end = min(len(self.order), i + SCAN_STEPS)
+        while i < end and len(res) < limit:
+            t = self.records.get(self.order[i])
+            if t is not None and _matches(tpl, t):
+                res.append(t)
+            i += 1
+        if i >= len(self.order):
+            return (res, None)
+        return (res, self.order[i - 1] if i > start else after)
+
+
+class TupleStore(object):
+    '''
+    this class implements an indexed tuple store.
+    '''
+
+    def __init__(self):
+        '''
+        constructor - prepare the empty store
+        '''
+        self._partitions = {}
+        self._seq = itertools.count()
+        # the deadlines of the tuples that have one, by sequence number, and
+        # a heap of (deadline, sequence number, arity). taken tuples are left
+        # in the heap until their deadline.
+        self._deadlines = {}
+        self._expiry = []
+
+    def __len__(self):
+        return sum(len(part.records) for part in self._partitions.values())
+
+    def __iter__(self):
+        '''
+        produce all tuples of the store, oldest first within every arity
+        '''
+        for part in list(self._partitions.values()):
+            yield from list(part.records.values())
+
+    def items(self):
+        '''
+        produce all tuples of the store and their deadlines, or None for those
+        without, oldest first within every arity
+        '''
+        for part in list(self._partitions.values()):
+            for (seq, tpl) in list(part.records.items()):
+                yield (tpl, self._deadlines.get(seq))
+
+    def put(self, tpl, deadline=None):
+        '''
+        put the given tuple into the store, to expire at the given deadline,
+        if any.
+        '''
+        part = self._partitions.get(len(tpl))
+        if part is None:
+            part = self._partitions[len(tpl)] = _Partition(len(tpl))
+        seq = next(self._seq)
+        part.add(seq, tpl)
+        if deadline is not None:
+            self._deadlines[seq] = deadline
+            heapq.heappush(self._expiry, (deadline, seq, len(tpl)))
+
+    def take(self, tpl, limit=1):
+        '''
+        remove up to limit tuples matching the given template from the store,
+        or all of them if limit is None, and produce them, oldest first.
+        '''
+        part = self._partitions.get(len(tpl))
+        if part is None:
+            return []
+        seqs = part.find(tpl, limit)
+        if self._deadlines:
+            for seq in seqs:
+                self._deadlines.pop(seq, None)
+        return [part.remove(seq) for seq in seqs]
+
+    def scan(self, tpl, after=-1, limit=None):
+        '''
+        produce up to limit tuples matching the given template, or all of
+        them if limit is None, put after the given sequence number, oldest
+        first, and the sequence number to continue after, or None if there
+        are no more. fewer tuples are produced if SCAN_STEPS tuples were
+        looked at first.
+        '''
+        part = self._partitions.get(len(tpl))
+        if part is None:
+            return ([], None)
+        return part.scan(tpl, after, len(part.records) if limit is None else limit)
+
+    def expire(self, now):
+        '''
+        remove the tuples whose deadline is not after the given time from the
+        store, and produce their number.
+        '''
+        expired = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            (_, seq, arity) = heapq.heappop(self._expiry)
+            if self._deadlines.pop(seq, None) is not None:
+                self._partitions[arity].remove(seq)
+                expired += 1
+        return expired
+
+    def read(self, tpl, limit=1):
+        '''
+        produce up to limit tuples matching the given template, or all of them
+        if limit is None, oldest first.
+        '''
+        part = self._partitions.get(len(tpl))
+        if part is None:
+            return []
+        return [part.records[seq] for seq in part.find(tpl, limit)]
@@ -0,0 +1,178 @@
+ ##############################################################################
+ #    memspaces - tuple spaces in shared memory                               #
+ #    Copyright (C) 2017  Andreas Grapentin                                   #
+ #                                                                            #
+ #    This program is free software: you can redistribute it and/or modify    #
+ #    it under the terms of the GNU General Public License as published by    #
+ #    the Free Software Foundation, either version 3 of the License, or       #
+ #    (at your option) any later version.                                     #
+ #                                                                            #
+ #    This program is distributed in the hope that it will be useful,         #
+ #    but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+ #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+ #    GNU General Public License for more details.                            #
+ #                                                                            #
+ #    You should have received a copy of the GNU General Public License       #
+ #    along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+ ##############################################################################
+
+'''
+This module implements predicate template fields.
+
+besides None, which matches anything, and plain values, which match equal
+values, a template field may be a predicate: a type wildcard, a range, a
+prefix or a set of values. the backends evaluate predicates where the tuples
+are, so that only matching tuples are ever handed out.
+
+over xml-rpc, which has no notion of them, predicates travel as structs with
+a single key, the predicate name prefixed with '$', mapping to the list of
+their arguments, e.g. {'$prefix': ['job:']}.
+'''
+
+# the types a type wildcard may name
+TYPES = {
+    'NoneType': type(None),
+    'bool': bool,
+    'int': int,
+    'float': float,
+    'str': str,
+    'bytes': bytes,
+    'list': list,
+    'tuple': tuple,
+    'dict': dict,
+}
+
+
+class Predicate(object):
+    '''
+    base class of predicate template fields
+    '''
+    name = None
+
+    def __init__(self, *args):
+        '''
+        constructor - keep the arguments, which are all that travels
+        '''
+        self.args = args
+
+    def matches(self, value):
+        '''
+        check if the given tuple field satisfies the predicate
+        '''
+        raise NotImplementedError()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.args == other.args
+
+    def __hash__(self):
+        return hash((self.name, self.args))
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(repr(x) for x in self.args))
+
+
+class Typed(Predicate):
+    '''
+    matches fields of exactly one of the given types, given as types or as
+    names from TYPES
+    '''
+    name = 'type'
+
+    def __init__(self, *types):
+        names = tuple(t if isinstance(t, str) else t.__name__ for t in types)
+        for name in names:
+            if name not in TYPES:
+                raise ValueError('unsupported type in template: %s' % name)
+        super(Typed, self).__init__(*names)
+        self.types = tuple(TYPES[name] for name in names)
+
+    def matches(self, value):
+        return type(value) in self.types
+
+
+class Range(Predicate):
+    '''
+    matches fields with low <= field < high. either bound may be None, for
+    no bound. fields that do not compare to the bounds do not match.
+    '''
+    name = 'range'
+
+    def __init__(self, low=None, high=None):
+        super(Range, self).__init__(low, high)
+        (self.low, self.high) = (low, high)
+
+    def matches(self, value):
+        if value is None:
+            return False
+        try:
+            return ((self.low is None or self.low <= value) and
+                    (self.high is None or value < self.high))
+        except TypeError:
+            return False
+
+
+class Prefix(Predicate):
+    '''
+    matches str or bytes fields starting with the given prefix of the same
+    type
+    '''
+    name = 'prefix'
+
+    def __init__(self, prefix):
+        if not isinstance(prefix, (str, bytes)):
+            raise ValueError('prefix must be str or bytes')
+        super(Prefix, self).__init__(prefix)
+        self.prefix = prefix
+
+    def matches(self, value):
+        return isinstance(value, type(self.prefix)) and value.startswith(self.prefix)
+
+
+class OneOf(Predicate):
+    '''
+    matches fields equal to any of the given values
+    '''
+    name = 'in'
+
+    def __init__(self, *values):
+        super(OneOf, self).__init__(*values)
+        self.values = values
+
+    def matches(self, value):
+        return any(x == value for x in self.values)
+
+
+PREDICATES = {cls.name: cls for cls in (Typed, Range, Prefix, OneOf)}
+
+
+def predicate(name, args):
+    '''
+    produce the predicate of the given name and arguments
+    '''
+    cls = PREDICATES.get(name)
+    if cls is None:
+        raise ValueError('unknown template predicate: %s' % name)
+    return cls(*args)
+
+
+def dump(tpl):
+    '''
+    replace the predicates in the given template by their xml-rpc struct form
+    '''
+    return [{'$' + x.name: list(x.args)} if isinstance(x, Predicate) else x for x in tpl]
+
+
+def load(tpl):
+    '''
+    replace the predicates in xml-rpc struct form in the given template by
+    predicates. a struct with a single key starting with '$' is never taken
+    for a plain value.
+    '''
+    res = []
+    for x in tpl:
+        if isinstance(x, dict) and len(x) == 1:
+            (key, args), = x.items()
+            if isinstance(key, str) and key.startswith('$'):
+                x = predicate(key[1:], args)
+        res.append(x)
+    return res
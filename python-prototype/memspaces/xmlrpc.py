@@ -18,10 +18,61 @@
 
 '''
 This module implements a simple client and server component for tuple spaces.
+
+a server hosts any number of named spaces, each with its own storage and lock.
+a method name of the form 'name.method' addresses the space of that name, a
+plain method name the default space, whose name is empty. spaces come into
+existence when first addressed.
+
+a server may keep its spaces in shared memory instead of its own memory, so
+that processes on the same host share them through MemSpace directly while
+remote clients reach the same tuples over the network.
+
+a server may keep its spaces durably in a directory: spaces in its own memory
+in the journal files of the space, and spaces in shared memory in files mapped
+in place of the shared memory.
+
+clients are safe to share between threads. they keep a pool of persistent
+connections, which a server with more than one worker keeps open between
+requests, and send batches of calls in a single request as system.multicall.
+
+a space in the memory of a server streams its changes to the replicas
+following it, once the first of them asks, in the order of the journal. a
+client given replicas sends its reads to them, see MemSpaceClient.
 '''
 
-from xmlrpc.client import ServerProxy
-from xmlrpc.server import SimpleXMLRPCServer
+import os
+import time
+import logging
+import itertools
+import collections
+import socket
+import selectors
+import threading
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.client import ServerProxy, Transport, MultiCall, Fault
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+from .store import TupleStore
+from .journal import Journal, puts
+from .shmem import MemSpace, Blob
+from . import templates
+
+LOG = logging.getLogger()
+# the methods of the tuple space api
+API_METHODS = ('put', 'put_many', 'get', 'take_many', 'take_all', 'read', 'scan_page',
+               'changes')
+
+# tuples per page of a scan
+SCAN_COUNT = 256
+
+# the number of idle connections a client keeps open per server
+POOL_SIZE = 8
+
+# changes kept for the replicas of a space. a replica further behind restarts
+# from the whole content of the space.
+CHANGES_KEPT = 4096
 
 
 class MemSpaceApi(object):
@@ -29,48 +80,458 @@ class MemSpaceApi(object):
     this class implements the tuple space api on the server side.
     '''
 
-    def __init__(self):
+    def __init__(self, journal=None):
         '''
-        constructor - prepare the tuple storage
+        constructor - prepare the tuple storage. if a journal is given, the
+        tuples are restored from it, and every change is committed to it
+        before the call returns.
         '''
-        self._tuples = []
+        self._tuples = TupleStore()
+        self._lock = threading.Lock()
+        self._journal = journal
+        # the position in the change stream, and the changes kept for the
+        # replicas, once the first of them asked for them, in a stream of
+        # its own, which a restarted server starts anew
+        self._position = 0
+        self._changes = None
+        self._stream = None
+        if journal is not None:
+            journal.load(self._apply)
 
-    def put(self, tpl):
+    def put(self, tpl, ttl=None):
         '''
-        put the given tuple into the tuple space.
+        put the given tuple into the tuple space. if ttl is given, the tuple
+        expires after that many seconds, unless taken before.
         '''
-        self._tuples.append(tpl)
+        self.put_many([tpl], ttl)
+
+    def put_many(self, tpls, ttl=None):
+        '''
+        put all of the given tuples into the tuple space. if ttl is given, the
+        tuples expire after that many seconds, unless taken before.
+        '''
+        tpls = list(tpls)
+        deadline = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._expire()
+            for tpl in tpls:
+                self._tuples.put(tpl, deadline)
+            ticket = self._log(('put', tpls) if deadline is None else ('put', tpls, deadline))
+        self._commit(ticket)
 
     def get(self, tpl):
         '''
         take the queried tuple from the tuple space and return it.
         '''
-        for i, t in enumerate(self._tuples):
-            if len(tpl) == len(t) and all(x == y or x is None for (x, y) in zip(tpl, t)):
-                res = self._tuples[i]
-                del self._tuples[i]
-                return res
-        return None
+        res = self._take(tpl, 1)
+        return res[0] if res else None
+
+    def take_many(self, tpl, n):
+        '''
+        take up to n queried tuples from the tuple space and return them,
+        oldest first.
+        '''
+        return self._take(tpl, max(n, 0))
+
+    def take_all(self, tpl):
+        '''
+        take all queried tuples from the tuple space and return them, oldest
+        first.
+        '''
+        return self._take(tpl, None)
 
     def read(self, tpl):
         '''
         seek the given tuple in the tuple space and return it.
         '''
-        for i, t in enumerate(self._tuples):
-            if len(tpl) == len(t) and all(x == y or x is None for (x, y) in zip(tpl, t)):
-                return self._tuples[i]
-        return None
+        tpl = templates.load(tpl)
+        with self._lock:
+            self._expire()
+            res = self._tuples.read(tpl)
+        return res[0] if res else None
+
+    def scan_page(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce up to count tuples matching the given template, without
+        taking them, oldest first from the given cursor, or from the start,
+        and the cursor to continue from, or None if there are no more.
+        '''
+        tpl = templates.load(tpl)
+        after = -1 if cursor is None else int(cursor)
+        with self._lock:
+            self._expire()
+            (res, last) = self._tuples.scan(tpl, after, max(count, 0))
+        # cursors are strings, since xml-rpc integers are only 32 bits wide
+        return [res, None if last is None else str(last)]
+
+    def changes(self, since=None):
+        '''
+        produce the position of the change stream of the space, and the
+        changes since the given position, in the form of journal entries. if
+        no position is given, or the changes since it are no longer kept, or
+        it is one of another stream, the changes are a reset followed by puts
+        of the whole content of the space.
+        '''
+        with self._lock:
+            self._expire()
+            if self._changes is None:
+                self._stream = os.urandom(8).hex()
+                LOG.info('space: streaming changes as %s', self._stream)
+                self._changes = collections.deque(maxlen=CHANGES_KEPT)
+            (stream, _, seen) = (since or '').partition(':')
+            behind = self._position - int(seen) if stream == self._stream else -1
+            if not 0 <= behind <= len(self._changes):
+                entries = [('reset',)] + list(puts(self._tuples.items()))
+            else:
+                entries = list(itertools.islice(self._changes, len(self._changes) - behind, None))
+            position = '%s:%d' % (self._stream, self._position)
+        # templates of takes travel like those of calls
+        return [position, [('take', templates.dump(e[1]), e[2]) if e[0] == 'take' else e
+                           for e in entries]]
+
+    def close(self):
+        '''
+        release the resources of the space: write the remaining changes to
+        the journal, if any.
+        '''
+        if self._journal is not None:
+            self._journal.close()
+
+    def _take(self, tpl, limit):
+        '''
+        take up to limit queried tuples, or all of them if limit is None.
+        '''
+        tpl = templates.load(tpl)
+        with self._lock:
+            self._expire()
+            res = self._tuples.take(tpl, limit)
+            # the store is deterministic, so taking as many again on replay
+            # takes the same tuples
+            ticket = self._log(('take', tpl, len(res))) if res else None
+        self._commit(ticket)
+        return res
+
+    def _apply(self, entry):
+        '''
+        apply the given journal entry to the tuple storage
+        '''
+        if entry[0] == 'put':
+            deadline = entry[2] if len(entry) > 2 else None
+            for tpl in entry[1]:
+                self._tuples.put(tpl, deadline)
+        elif entry[0] == 'expire':
+            self._tuples.expire(entry[1])
+        else:
+            (_, tpl, limit) = entry
+            self._tuples.take(tpl, limit)
+
+    def _expire(self):
+        '''
+        remove the expired tuples. the time goes to the journal, so that
+        replay expires the same tuples before the same changes. this must be
+        called with the lock held.
+        '''
+        now = time.time()
+        if self._tuples.expire(now):
+            self._log(('expire', now))
+
+    def _log(self, entry):
+        '''
+        append the given change to the journal, if any, and to the changes
+        kept for the replicas, and produce the ticket to commit it with. this
+        must be called with the lock held, so that both see the changes in
+        order.
+        '''
+        self._position += 1
+        if self._changes is not None:
+            self._changes.append(entry)
+        if self._journal is None:
+            return None
+        return self._journal.append(entry)
+
+    def _commit(self, ticket):
+        '''
+        wait for the change of the given ticket to be committed to the
+        journal, and start a new snapshot if the journal is due one.
+        '''
+        if ticket is None:
+            return
+        self._journal.commit(ticket)
+        if self._journal.due():
+            with self._lock:
+                if self._journal.due():
+                    self._journal.snapshot(self._tuples.items())
+
+
+def _copied(tpl):
+    '''
+    produce the given tuple of a shared memory space, or None, with its large
+    fields copied and released, since blobs cannot travel
+    '''
+    if tpl is None or not any(isinstance(x, Blob) for x in tpl):
+        return tpl
+    res = []
+    for x in tpl:
+        if isinstance(x, Blob):
+            with x:
+                x = x.value()
+        res.append(x)
+    return tuple(res)
+
+
+def shmem_name(shmem, name):
+    '''
+    produce the name of the shared memory of the space of the given name, on
+    a server keeping its spaces in the given shared memory
+    '''
+    return '%s-%s' % (shmem, name) if name else shmem
+
+
+def space_path(path, name):
+    '''
+    produce the path of the files of the space of the given name, on a server
+    keeping its spaces in the given directory
+    '''
+    return os.path.join(path, 'space-' + urllib.parse.quote(name, safe=''))
+
+
+class MemSpaceShmemApi(object):
+    '''
+    this class implements the tuple space api on a shared memory space.
+    '''
+
+    def __init__(self, name, path=None):
+        '''
+        constructor - connect to the shared memory space of the given name,
+        creating it if needed, backed by the file of the given path, if any
+        '''
+        self._space = MemSpace(name, path=path)
+
+    def put(self, tpl, ttl=None):
+        '''
+        put the given tuple into the tuple space, expiring after ttl seconds
+        if given.
+        '''
+        self._space.put(tpl, ttl)
+
+    def put_many(self, tpls, ttl=None):
+        '''
+        put all given tuples into the tuple space, expiring after ttl seconds
+        if given.
+        '''
+        self._space.put_many(tpls, ttl)
+
+    def get(self, tpl):
+        '''
+        take the queried tuple from the tuple space and return it.
+        '''
+        return _copied(self._space.get(templates.load(tpl)))
+
+    def take_many(self, tpl, n):
+        '''
+        take up to n queried tuples from the tuple space and return them,
+        oldest first.
+        '''
+        return [_copied(t) for t in self._space.take_many(templates.load(tpl), max(n, 0))]
+
+    def take_all(self, tpl):
+        '''
+        take all queried tuples from the tuple space and return them, oldest
+        first.
+        '''
+        return [_copied(t) for t in self._space.take_all(templates.load(tpl))]
+
+    def read(self, tpl):
+        '''
+        seek the given tuple in the tuple space and return it.
+        '''
+        return _copied(self._space.read(templates.load(tpl)))
+
+    def scan_page(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce up to count tuples matching the given template, without
+        taking them, from the given cursor, or from the start, and the cursor
+        to continue from, or None if there are no more.
+        '''
+        (tpls, cursor) = self._space.scan_page(templates.load(tpl), cursor, max(count, 0))
+        return [[_copied(t) for t in tpls], cursor]
+
+    def changes(self, since=None):
+        '''
+        refuse to stream changes: processes share a space in shared memory
+        directly.
+        '''
+        raise ValueError('spaces in shared memory have no replicas')
+
+    def close(self):
+        '''
+        disconnect from the shared memory space. it stays in place for the
+        other participants.
+        '''
+        self._space.close()
+
+
+def space_api(name, shmem=None, path=None):
+    '''
+    produce the api of the space of the given name, kept in the given shared
+    memory and durably in the given directory, if any
+    '''
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+    if shmem is not None:
+        return MemSpaceShmemApi(
+            shmem_name(shmem, name), path=None if path is None else space_path(path, name))
+    return MemSpaceApi(None if path is None else Journal(space_path(path, name)))
+
+
+class MemSpaceRegistry(object):
+    '''
+    this class hosts the named tuple spaces on the server side.
+    '''
+
+    def __init__(self, factory=None):
+        '''
+        constructor - prepare the empty registry. the given factory produces
+        the api of a new space from its name; by default, spaces are kept in
+        the memory of the server.
+        '''
+        self._factory = factory if factory is not None else (lambda name: MemSpaceApi())
+        self._spaces = {}
+        self._lock = threading.Lock()
+
+    def space(self, name):
+        '''
+        produce the api of the space of the given name, creating it if needed
+        '''
+        with self._lock:
+            api = self._spaces.get(name)
+            if api is None:
+                api = self._spaces[name] = self._factory(name)
+            return api
+
+    def spaces(self):
+        '''
+        produce the names of all spaces
+        '''
+        with self._lock:
+            return sorted(self._spaces)
+
+    def close(self):
+        '''
+        release the resources of all spaces
+        '''
+        with self._lock:
+            for api in self._spaces.values():
+                api.close()
+            self._spaces.clear()
+
+    def _dispatch(self, method, params):
+        '''
+        invoke the given method on the space it addresses
+        '''
+        if method == 'spaces':
+            return self.spaces()
+        (name, _, method) = method.rpartition('.')
+        if method not in API_METHODS:
+            raise Exception('method "%s" is not supported' % method)
+        return getattr(self.space(name), method)(*params)
+
+
+class _PooledTransport(Transport):
+    '''
+    an http transport that may be used by many threads at once. every request
+    goes over a connection of its own, taken from a pool of idle persistent
+    connections or newly opened, and returned to the pool once the response
+    is read.
+    '''
+
+    def __init__(self, pool_size=POOL_SIZE, **kwargs):
+        '''
+        constructor - keep up to pool_size idle connections open
+        '''
+        super(_PooledTransport, self).__init__(**kwargs)
+        self._pool_size = pool_size
+        # guards the idle connections, as pairs of host and connection
+        self._lock = threading.Lock()
+        self._idle = []
+        # the connection of the request in progress on each thread
+        self._local = threading.local()
+
+    def single_request(self, host, handler, request_body, verbose=False):
+        '''
+        send the given request over a connection of the pool, and hand the
+        connection back once the response is read
+        '''
+        try:
+            return super(_PooledTransport, self).single_request(host, handler, request_body, verbose)
+        finally:
+            connection = self._local.__dict__.pop('connection', None)
+            if connection is not None:
+                with self._lock:
+                    if len(self._idle) < self._pool_size:
+                        self._idle.append((host, connection))
+                        connection = None
+                if connection is not None:
+                    connection.close()
+
+    def make_connection(self, host):
+        '''
+        produce a connection to the given host for the request of the calling
+        thread, idle or new
+        '''
+        with self._lock:
+            for (i, (idle_host, connection)) in enumerate(self._idle):
+                if idle_host == host:
+                    del self._idle[i]
+                    break
+            else:
+                (chost, self._extra_headers, _) = self.get_host_info(host)
+                connection = http.client.HTTPConnection(chost)
+        self._local.connection = connection
+        return connection
+
+    def close(self):
+        '''
+        close the connection of the failed request of the calling thread, or,
+        outside of a request, all idle connections. the idle connections are
+        dropped in either case, since they most likely failed as well.
+        '''
+        connection = self._local.__dict__.pop('connection', None)
+        if connection is not None:
+            connection.close()
+        with self._lock:
+            (idle, self._idle) = (self._idle, [])
+        for (_, connection) in idle:
+            connection.close()
 
 
 class MemSpaceClient(ServerProxy):
     '''
     The tuple spaces client.
+
+    a client given the urls of replicas of the server, see
+    MemSpaceReplicaServer, sends every read to one of them in turn, and all
+    other calls to the server. a read from a replica sees all changes that
+    were done on the server more than max_lag seconds of that replica before,
+    but not necessarily the latest ones, not even those of the same client. a
+    replica further behind, or out of reach, leaves the read to the server.
     '''
 
-    def __init__(self, server, *args, **kwargs):
+    def __init__(self, server, *args, space='', pool_size=POOL_SIZE, replicas=(), **kwargs):
         '''
-        constructor - connect to the given server.
+        constructor - connect to the space of the given name on the given
+        server, or to its default space, and to the given replicas of the
+        server. unless another transport is given, http connections are
+        pooled, keeping up to pool_size idle connections open, and shared with
+        the clients of other spaces produced by space.
         '''
+        if not args and 'transport' not in kwargs and urllib.parse.urlsplit(server).scheme == 'http':
+            kwargs['transport'] = _PooledTransport(pool_size, use_builtin_types=True)
+        self._space = space
+        self._proxy_args = (server, args, kwargs)
+        self._replicas = [MemSpaceClient(url, space=space, pool_size=pool_size) for url in replicas]
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
         super(MemSpaceClient, self).__init__(
             server,
             allow_none=True,
@@ -78,16 +539,166 @@ class MemSpaceClient(ServerProxy):
             *args, **kwargs
         )
 
+    def space(self, name):
+        '''
+        produce a client of the space of the given name on the same server
+        '''
+        (server, args, kwargs) = self._proxy_args
+        client = MemSpaceClient(server, *args, space=name, **kwargs)
+        client._replicas = [replica.space(name) for replica in self._replicas]
+        return client
+
+    def put(self, tpl, ttl=None):
+        '''
+        put the given tuple into the tuple space. if ttl is given, the tuple
+        expires after that many seconds, unless taken before.
+        '''
+        return self._remote('put')(tpl, ttl)
+
+    def put_many(self, tpls, ttl=None):
+        '''
+        put all tuples of the given iterable into the tuple space, in a
+        single request, expiring after ttl seconds if given.
+        '''
+        return self._remote('put_many')(list(tpls), ttl)
+
+    def get(self, tpl):
+        '''
+        take the queried tuple from the tuple space and return it.
+        '''
+        return self._remote('get')(templates.dump(tpl))
+
+    def take_many(self, tpl, n):
+        '''
+        take up to n queried tuples from the tuple space and return them,
+        oldest first.
+        '''
+        return self._remote('take_many')(templates.dump(tpl), n)
+
+    def take_all(self, tpl):
+        '''
+        take all queried tuples from the tuple space and return them, oldest
+        first.
+        '''
+        return self._remote('take_all')(templates.dump(tpl))
+
+    def read(self, tpl):
+        '''
+        seek the given tuple in the tuple space and return it, on a replica if
+        there are any.
+        '''
+        if self._replicas:
+            with self._lock:
+                replica = self._replicas[next(self._turn) % len(self._replicas)]
+            try:
+                return replica.read(tpl)
+            except (Fault, OSError, http.client.HTTPException) as e:
+                LOG.info('client: replica read failed, reading from the server: %s', e)
+        return self._remote('read')(templates.dump(tpl))
+
+    def changes(self, since=None):
+        '''
+        produce the position of the change stream of the space, and the
+        changes since the given position of it, see MemSpaceApi.changes.
+        '''
+        return tuple(self._remote('changes')(since))
+
+    def scan(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce the tuples matching the given template, without taking them,
+        fetching them in pages of up to count tuples, starting at the given
+        cursor of scan_page, or at the start.
+        '''
+        while True:
+            (tpls, cursor) = self.scan_page(tpl, cursor, count)
+            yield from tpls
+            if cursor is None:
+                return
+
+    def scan_page(self, tpl, cursor=None, count=SCAN_COUNT):
+        '''
+        produce up to count tuples matching the given template, without
+        taking them, from the given cursor, or from the start, and the cursor
+        to continue from, or None if there are no more.
+        '''
+        return tuple(self._remote('scan_page')(templates.dump(tpl), cursor, count))
+
+    def pipeline(self, calls):
+        '''
+        send all of the given (method, args) calls in a single request, and
+        return their results in order. if any call failed, the first failure
+        is raised.
+        '''
+        multi = MultiCall(self)
+        for (name, args) in calls:
+            if name not in API_METHODS:
+                raise ValueError('unknown method: %s' % name)
+            args = list(args)
+            if name == 'put_many':
+                args[0] = list(args[0])
+            elif name != 'put':
+                args[0] = templates.dump(args[0])
+            getattr(multi, self._method(name))(*args)
+        return list(multi())
+
+    def _remote(self, name):
+        '''
+        produce the remote method of the given name, on the space of this
+        client
+        '''
+        return super(MemSpaceClient, self).__getattr__(self._method(name))
+
+    def _method(self, name):
+        '''
+        produce the remote name of the given method, on the space of this
+        client
+        '''
+        if self._space:
+            return '%s.%s' % (self._space, name)
+        return name
+
+
+class _PersistentRequestHandler(SimpleXMLRPCRequestHandler):
+    '''
+    handles a persistent http/1.1 connection one request at a time. in
+    between, the server parks the connection until its next request arrives,
+    so that idle connections do not hold workers.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def handle(self):
+        self.handle_one_request()
+
+    def finish(self):
+        if self.close_connection:
+            super(_PersistentRequestHandler, self).finish()
+
 
 class MemSpaceServer(SimpleXMLRPCServer):
     '''
     The tuple spaces server.
+
+    with more than one worker, requests are handled concurrently by a pool of
+    that many threads, and calls on different spaces do not wait for each
+    other. connections are then kept open between requests, and parked on a
+    selector while idle.
+
+    if shmem is given, the spaces are kept in shared memory: the default
+    space in the shared memory of that name, and every other space in the
+    one named by shmem_name.
+
+    if path is given, the spaces are kept durably in the files named by
+    space_path in that directory.
     '''
 
-    def __init__(self, server, port, *args, **kwargs):
+    def __init__(self, server, port, *args, workers=1, shmem=None, path=None, **kwargs):
         '''
         constructor - start listening on the given server and port.
         '''
+        self._pool = None
+        if workers > 1:
+            self._pool = ThreadPoolExecutor(workers)
+            kwargs.setdefault('requestHandler', _PersistentRequestHandler)
         super(MemSpaceServer, self).__init__(
             (server, port),
             allow_none=True,
@@ -95,4 +706,128 @@ class MemSpaceServer(SimpleXMLRPCServer):
             logRequests=False,
             *args, **kwargs
         )
-        self.register_instance(MemSpaceApi())
+        self._shmem = shmem
+        self._path = path
+        self._registry = MemSpaceRegistry(self._space_api)
+        self.register_instance(self._registry)
+        self.register_multicall_functions()
+
+        # the selector of the parked connections, and the thread watching it,
+        # are set up by the first connection parked, in the serving process
+        self._selector = None
+        self._selector_lock = threading.Lock()
+        self._closing = False
+
+    def _space_api(self, name):
+        '''
+        produce the api of the new space of the given name
+        '''
+        return space_api(name, self._shmem, self._path)
+
+    def process_request(self, request, client_address):
+        '''
+        handle the given request, on a worker thread if there is a pool
+        '''
+        if self._pool is None:
+            return super(MemSpaceServer, self).process_request(request, client_address)
+        self._pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        '''
+        handle the first request of the given connection on a worker thread
+        '''
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        self._park(handler)
+
+    def _serve(self, handler):
+        '''
+        handle the next request of the connection of the given handler on a
+        worker thread
+        '''
+        try:
+            handler.handle_one_request()
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            handler.close_connection = True
+        self._park(handler)
+
+    def _park(self, handler):
+        '''
+        close the connection of the given handler if it is done, handle its
+        next request right away if it has already arrived, or wait for it on
+        the selector otherwise
+        '''
+        if not handler.close_connection:
+            sock = handler.request
+            sock.setblocking(False)
+            try:
+                pending = handler.rfile.peek(1)
+            except OSError:
+                handler.close_connection = True
+            finally:
+                sock.settimeout(handler.timeout)
+
+        if not handler.close_connection and pending:
+            self._pool.submit(self._serve, handler)
+            return
+
+        if not handler.close_connection:
+            with self._selector_lock:
+                if not self._closing:
+                    if self._selector is None:
+                        self._start_watcher()
+                    self._selector.register(handler.request, selectors.EVENT_READ, handler)
+                    return
+            handler.close_connection = True
+
+        handler.finish()
+        self.shutdown_request(handler.request)
+
+    def _start_watcher(self):
+        '''
+        set up the selector of the parked connections, and start the thread
+        handing them to the workers once their next request arrives
+        '''
+        self._selector = selectors.DefaultSelector()
+        self._wakeup = socket.socketpair()
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+
+        def watch():
+            while True:
+                for (key, _) in self._selector.select():
+                    if key.data is None:
+                        return
+                    self._selector.unregister(key.fileobj)
+                    self._pool.submit(self._serve, key.data)
+
+        self._watcher = threading.Thread(target=watch, daemon=True)
+        self._watcher.start()
+
+    def server_close(self):
+        '''
+        stop listening, wait for the requests in progress, and close the
+        parked connections
+        '''
+        super(MemSpaceServer, self).server_close()
+        if self._pool is not None:
+            with self._selector_lock:
+                self._closing = True
+            if self._selector is not None:
+                self._wakeup[1].send(b'x')
+                self._watcher.join()
+            self._pool.shutdown()
+            if self._selector is not None:
+                for key in list(self._selector.get_map().values()):
+                    if key.data is not None:
+                        key.data.close_connection = True
+                        key.data.finish()
+                        self.shutdown_request(key.fileobj)
+                self._selector.close()
+                for sock in self._wakeup:
+                    sock.close()
+        self._registry.close()
@@ -0,0 +1,19 @@
+import json
+import pytest
+from memspaces import bench
+
+
+@pytest.mark.parametrize('backend', bench.BACKENDS)
+@pytest.mark.parametrize('op', bench.OPERATIONS)
+def test_run(backend, op, tmpdir):
+    output = str(tmpdir.join('results.json'))
+    bench.main(['--backends', backend, '--ops', op, '--procs', '1,2', '--count', '20',
+                '--occupancy', '50', '--sizes', '8', '--selectivity', '0.5',
+                '--name', 'MemSpaceTest', '--port', '10002', '--output', output])
+    with open(output) as f:
+        results = [json.loads(line) for line in f]
+    assert [1, 2] == [res['procs'] for res in results]
+    for res in results:
+        assert (backend, op) == (res['backend'], res['op'])
+        assert res['ops_per_sec'] > 0
+        assert res['p50_us'] <= res['p99_us']
@@ -0,0 +1,30 @@
+from multiprocessing import Process
+import pytest
+import memspaces
+
+
+@pytest.fixture(scope='module')
+def hostname():
+    return 'localhost'
+
+
+@pytest.fixture(scope='module')
+def port():
+    return 10001
+
+
+@pytest.fixture(scope='module')
+def server(request, hostname, port):
+    srv = memspaces.MemSpaceBinaryServer(hostname, port)
+    p = Process(target=srv.serve_forever)
+    p.start()
+    yield srv
+    p.terminate()
+    p.join()
+    srv.server_close()
+
+
+@pytest.fixture
+def memspace(server, hostname, port):
+    with memspaces.MemSpaceBinaryClient(hostname, port) as client:
+        yield client
@@ -0,0 +1,50 @@
+import asyncio
+from xmlrpc.client import Fault
+import pytest
+import memspaces
+
+
+def test_simple(server, hostname, port):
+    async def run():
+        async with memspaces.AsyncMemSpaceClient(hostname, port) as client:
+            await client.put(('async', 'world'))
+            await client.put_many([('async', 1), ('async', 2)])
+            assert ('async', 'world') == await client.read(('async', 'world'))
+            assert ('async', 'world') == await client.get(('async', 'world'))
+            assert [('async', 1)] == await client.take_many(('async', None), 1)
+            assert [('async', 2)] == await client.take_all(('async', None))
+            assert await client.get(('async', None)) is None
+    asyncio.run(run())
+
+
+def test_concurrent(server, hostname, port):
+    async def run():
+        async with memspaces.AsyncMemSpaceClient(hostname, port) as client:
+            await asyncio.gather(*(client.put(('conc', i)) for i in range(100)))
+            res = await asyncio.gather(*(client.get(('conc', None)) for _ in range(100)))
+            assert sorted(t[1] for t in res) == list(range(100))
+    asyncio.run(run())
+
+
+def test_pipeline(server, hostname, port):
+    async def run():
+        async with memspaces.AsyncMemSpaceClient(hostname, port) as client:
+            res = await client.pipeline([('put', (('pipe', 1),)), ('get', (('pipe', None),))])
+            assert [None, ('pipe', 1)] == res
+            with pytest.raises(Fault):
+                await client.pipeline([('take_many', (('pipe', None), 'x'))])
+            # the connection survives failed requests
+            assert await client.read(('pipe', None)) is None
+    asyncio.run(run())
+
+
+def test_blocking_get(server, hostname, port):
+    async def run():
+        async with memspaces.AsyncMemSpaceClient(hostname, port) as waiting, \
+                memspaces.AsyncMemSpaceClient(hostname, port) as putting:
+            waiter = asyncio.ensure_future(waiting.get(('later', None), block=True, timeout=10))
+            await asyncio.sleep(0.1)
+            await putting.put(('later', 1))
+            assert ('later', 1) == await waiter
+            assert await waiting.get(('later', None), block=True, timeout=0.1) is None
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+import time
+from threading import Thread
+from xmlrpc.client import Fault
+import pytest
+import memspaces
+
+
+def test_simple(memspace):
+    memspace.put(('hello', 'world'))
+    assert ('hello', 'world') == memspace.get((None, None))
+
+
+def test_types(memspace):
+    tpl = (None, True, False, -1, 2**70, 0.5, b'\x00', 'ünï', (1, [2, (3,)]))
+    memspace.put(tpl)
+    assert tpl == memspace.get(tuple(None for _ in tpl))
+
+
+def test_front_to_back(memspace):
+    for i in range(100):
+        memspace.put((i, 'test %d' % i))
+    for i in range(100):
+        assert (i, 'test %d' % i) == memspace.get((i, None))
+
+
+def test_read(memspace):
+    memspace.put(('read', 1))
+    assert ('read', 1) == memspace.read(('read', None))
+    assert ('read', 1) == memspace.get(('read', None))
+    assert memspace.read(('read', None)) is None
+
+
+def test_batch(memspace):
+    memspace.put_many((i % 2, i) for i in range(100))
+    assert [(1, i) for i in range(1, 20, 2)] == memspace.take_many((1, None), 10)
+    assert [(0, i) for i in range(0, 100, 2)] == memspace.take_all((0, None))
+    assert 40 == len(memspace.take_all((None, None)))
+
+
+def test_pipeline(memspace):
+    calls = [('put', [('pipe', i)]) for i in range(1000)]
+    calls += [('get', [('pipe', i)]) for i in range(1000)]
+    res = memspace.pipeline(calls)
+    assert [None] * 1000 + [('pipe', i) for i in range(1000)] == res
+
+
+def test_error(memspace):
+    with pytest.raises(Fault):
+        memspace.pipeline([('put', [('x',)]), ('take_many', [('x',), 'many'])])
+    with pytest.raises(TypeError):
+        memspace.put(({'a': 1},))
+    assert ('x',) == memspace.get(('x',))
+
+
+def test_concurrent_clients(memspace, hostname, port):
+    def work(n):
+        with memspaces.MemSpaceBinaryClient(hostname, port) as client:
+            client.put_many(('conc', n, i) for i in range(200))
+            assert [('conc', n, i) for i in range(200)] == client.take_all(('conc', n, None))
+
+    threads = [Thread(target=work, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert memspace.read(('conc', None, None)) is None
+
+
+def test_predicates(memspace):
+    from memspaces import Typed, Range, Prefix, OneOf
+    memspace.put_many([('job:1', 1), ('job:2', 2.5), ('task:1', 3)])
+    assert ('job:2', 2.5) == memspace.get((Prefix('job:'), Typed(float)))
+    assert [('job:1', 1)] == memspace.take_all((None, Range(0, 2)))
+    assert ('task:1', 3) == memspace.get((OneOf('task:1', 'task:2'), None))
+
+
+def test_ttl(memspace):
+    memspace.put(('ttl', 1), 0.1)
+    memspace.put_many([('ttl', 2)], 60)
+    time.sleep(0.15)
+    assert ('ttl', 2) == memspace.get(('ttl', None))
+    assert memspace.get(('ttl', None)) is None
+
+
+def test_scan(memspace):
+    memspace.put_many([('scan', i) for i in range(10)])
+    (tpls, cursor) = memspace.scan_page(('scan', None), count=4)
+    assert [('scan', i) for i in range(4)] == tpls
+    assert [('scan', i) for i in range(4, 10)] == list(memspace.scan(('scan', None), cursor, 4))
+    assert 10 == len(memspace.take_all(('scan', None)))
@@ -13,3 +13,10 @@ def memspace(shmem_name):
     space = memspaces.MemSpace(shmem_name)
     yield space
     space.unlink()
+
+
+@pytest.fixture
+def bounded_memspace(shmem_name):
+    space = memspaces.MemSpace(shmem_name, max_size=memspaces.shmem.SHMEM_SIZE)
+    yield space
+    space.unlink()
@@ -0,0 +1,101 @@
+
+import random
+import memspaces
+
+
+def test_reuse(memspace):
+    for i in range(10000):
+        memspace.put((i, 'test %d' % i))
+        assert (i, 'test %d' % i) == tuple(memspace.get((i, None)))
+    memspace.compact()
+    assert memspace.end == memspaces.shmem.DATA_START
+
+
+def test_queue(memspace):
+    for i in range(10):
+        memspace.put((i, 'test %d' % i))
+    end = memspace.end
+    for i in range(10, 10000):
+        memspace.put((i, 'test %d' % i))
+        assert (i - 10, 'test %d' % (i - 10)) == tuple(memspace.get((None, None)))
+    assert memspace.end <= end + 2 * memspaces.shmem.ARENA_SIZE
+
+
+def test_shuffled_reuse(memspace):
+    live = set()
+    for i in range(5000):
+        if live and random.random() < 0.5:
+            j = random.choice(sorted(live))
+            assert (j, 'x' * (j % 100)) == tuple(memspace.get((j, None)))
+            live.remove(j)
+        else:
+            memspace.put((i, 'x' * (i % 100)))
+            live.add(i)
+    for j in live:
+        assert (j, 'x' * (j % 100)) == tuple(memspace.get((j, None)))
+    memspace.compact()
+    assert memspace.end == memspaces.shmem.DATA_START
+
+
+def test_compact(memspace):
+    for i in range(100):
+        memspace.put((i, 'test %d' % i))
+    for i in range(0, 100, 2):
+        assert (i, 'test %d' % i) == tuple(memspace.get((i, None)))
+    end = memspace.end
+    assert memspace.compact() > 0
+    assert memspace.end < end
+    for i in random.sample(range(1, 100, 2), 50):
+        assert (i, 'test %d' % i) == tuple(memspace.read((i, None)))
+        assert (i, 'test %d' % i) == tuple(memspace.read((None, 'test %d' % i)))
+    for i in range(1, 100, 2):
+        assert (i, 'test %d' % i) == tuple(memspace.get((None, None)))
+    memspace.compact()
+    assert memspace.end == memspaces.shmem.DATA_START
+
+
+def test_full(bounded_memspace):
+    try:
+        while True:
+            bounded_memspace.put(('x' * 1000,))
+    except MemoryError:
+        pass
+    assert bounded_memspace.size == memspaces.shmem.SHMEM_SIZE
+    while bounded_memspace.get((None,)) is not None:
+        pass
+    bounded_memspace.compact()
+    assert bounded_memspace.end == memspaces.shmem.DATA_START
+
+
+def test_compact_slide(memspace):
+    for i in range(200):
+        memspace.put((i, 'test %d' % i))
+    memspace.put(('big', 'x' * 2000))
+    for i in range(0, 200, 2):
+        assert (i, 'test %d' % i) == tuple(memspace.get((i, None)))
+    end = memspace.end
+    assert memspace.compact() > 0
+    assert memspace._slidable() is None
+    assert memspace.end < end
+    assert ('big', 'x' * 2000) == tuple(memspace.read(('big', None)))
+    for i in random.sample(range(1, 200, 2), 100):
+        assert (i, 'test %d' % i) == tuple(memspace.get((None, 'test %d' % i)))
+    assert ('big', 'x' * 2000) == tuple(memspace.get((None, None)))
+    memspace.compact()
+    assert memspace.end == memspaces.shmem.DATA_START
+
+
+def test_full_fragmented(bounded_memspace):
+    i = 0
+    try:
+        while True:
+            bounded_memspace.put((i, 'x' * 100))
+            i += 1
+    except MemoryError:
+        pass
+    for j in range(0, i, 2):
+        assert (j, 'x' * 100) == tuple(bounded_memspace.get((j, None)))
+    bounded_memspace.put(('big', 'x' * 10000))
+    for j in range(1, i, 2):
+        assert (j, 'x' * 100) == tuple(bounded_memspace.get((j, None)))
+    assert ('big', 'x' * 10000) == tuple(bounded_memspace.get(('big', None)))
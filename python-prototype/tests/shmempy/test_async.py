@@ -0,0 +1,88 @@
+import time
+import asyncio
+from multiprocessing import Process
+import pytest
+import memspaces
+
+
+def put_later(name, tpls, delay):
+    time.sleep(delay)
+    with memspaces.MemSpace(name) as space:
+        space.put_many(tpls)
+
+
+@pytest.fixture
+def async_memspace(memspace, shmem_name):
+    space = memspaces.AsyncMemSpace(shmem_name)
+    yield space
+    space.close()
+
+
+def test_simple(async_memspace):
+    async def run():
+        await async_memspace.put(('hello', 'world'))
+        await async_memspace.put_many([(1, 2), (1, 3)])
+        assert ('hello', 'world') == tuple(await async_memspace.read(('hello', None)))
+        assert ('hello', 'world') == tuple(await async_memspace.get(('hello', None)))
+        assert await async_memspace.get(('hello', None)) is None
+        assert [(1, 2)] == [tuple(t) for t in await async_memspace.take_many((1, None), 1)]
+        assert [(1, 3)] == [tuple(t) for t in await async_memspace.take_all((1, None))]
+    asyncio.run(run())
+
+
+def test_timeout(async_memspace):
+    async def run():
+        before = time.monotonic()
+        assert await async_memspace.get(('hello', None), block=True, timeout=0.2) is None
+        assert time.monotonic() - before >= 0.2
+    asyncio.run(run())
+
+
+def test_many_waiters(async_memspace, shmem_name):
+    n = 200
+
+    async def run():
+        p = Process(target=put_later, args=(shmem_name, [('job', i) for i in range(n)], 0.2))
+        p.start()
+        # far more waiting coroutines than waiter slots in the space
+        res = await asyncio.wait_for(asyncio.gather(
+            *(async_memspace.get(('job', None), block=True) for _ in range(n))), 10)
+        p.join()
+        return res
+
+    res = asyncio.run(run())
+    assert sorted(t[1] for t in res) == list(range(n))
+    # the watcher leaves once no coroutine is waiting any more
+    for watcher in list(async_memspace._watchers.values()):
+        watcher.join(1)
+    assert async_memspace._watchers == {}
+
+
+def test_loop_not_blocked(async_memspace, shmem_name):
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def run():
+        ticker = asyncio.ensure_future(tick())
+        p = Process(target=put_later, args=(shmem_name, [(1, 2, 3)], 0.3))
+        p.start()
+        res = await async_memspace.read((None, None, 3), block=True, timeout=10)
+        p.join()
+        ticker.cancel()
+        return res
+
+    assert (1, 2, 3) == tuple(asyncio.run(run()))
+    assert len(ticks) > 10
+
+
+def test_given_up_take_put_back(async_memspace, memspace):
+    async def run():
+        future = asyncio.get_running_loop().create_future()
+        future.cancel()
+        async_memspace._resolve(future, async_memspace._space._take, ('late', 1))
+    asyncio.run(run())
+    assert ('late', 1) == tuple(memspace.read(('late', None)))
@@ -0,0 +1,53 @@
+import time
+from multiprocessing import Process, Queue
+import memspaces
+from memspaces.shmem import MemSpace
+
+
+def _slow_create(name):
+    initialize = MemSpace._initialize
+
+    def slow(self):
+        time.sleep(0.5)
+        initialize(self)
+    MemSpace._initialize = slow
+    MemSpace(name).close()
+
+
+def _attach(name, queue):
+    before = time.monotonic()
+    space = MemSpace(name)
+    space.put(('attached',))
+    space.close()
+    queue.put(time.monotonic() - before)
+
+
+def test_concurrent_attach(shmem_name):
+    queue = Queue()
+    ps = [Process(target=_attach, args=(shmem_name, queue)) for _ in range(8)]
+    for p in ps:
+        p.start()
+    times = [queue.get() for _ in ps]
+    for p in ps:
+        p.join()
+    space = MemSpace(shmem_name)
+    try:
+        assert len(space.take_all(('attached',))) == 8
+        assert max(times) < 0.5
+    finally:
+        space.unlink()
+
+
+def test_attach_during_create(shmem_name):
+    creator = Process(target=_slow_create, args=(shmem_name,))
+    creator.start()
+    time.sleep(0.2)
+    before = time.monotonic()
+    space = MemSpace(shmem_name)
+    try:
+        # woken by the creator, not by polling
+        assert time.monotonic() - before < 0.6
+        assert space.read((None,)) is None
+    finally:
+        creator.join()
+        space.unlink()
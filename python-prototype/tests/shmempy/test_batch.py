@@ -0,0 +1,33 @@
+from multiprocessing import Process, Queue
+import memspaces
+
+
+def take_blocking(name, queue):
+    with memspaces.MemSpace(name) as space:
+        queue.put(space.get(('late', None), block=True, timeout=30))
+
+
+def test_put_many(memspace):
+    memspace.put_many((i, 'test %d' % i) for i in range(2000))
+    for i in range(2000):
+        assert (i, 'test %d' % i) == memspace.get((i, None))
+    assert memspace.get((None, None)) is None
+
+
+def test_take_many(memspace):
+    memspace.put_many([(i % 2, i) for i in range(100)])
+    assert [(1, i) for i in range(1, 20, 2)] == memspace.take_many((1, None), 10)
+    assert [(0, i) for i in range(0, 100, 2)] == memspace.take_all((0, None))
+    assert [(1, i) for i in range(21, 100, 2)] == memspace.take_all((None, None))
+    assert [] == memspace.take_all((None, None))
+    memspace.compact()
+    assert memspace.end == memspaces.shmem.DATA_START
+
+
+def test_put_many_wakes(memspace, shmem_name):
+    queue = Queue()
+    p = Process(target=take_blocking, args=(shmem_name, queue))
+    p.start()
+    memspace.put_many([('early', i) for i in range(10)] + [('late', 1)])
+    assert ('late', 1) == queue.get(timeout=30)
+    p.join()
@@ -0,0 +1,80 @@
+import os
+import time
+import array
+from multiprocessing import Process
+import memspaces
+from memspaces.shmem import BLOB_SIZE
+
+
+def _blobs(name):
+    return [f for f in os.listdir('/dev/shm') if f.startswith(name + '.blob.')]
+
+
+def test_large_fields(memspace, shmem_name):
+    data = os.urandom(BLOB_SIZE)
+    values = array.array('d', range(BLOB_SIZE))
+    memspace.put(('big', data, values))
+    memspace.put(('small', b'x'))
+    assert 2 == len(_blobs(shmem_name))
+    # large fields stay out of the record
+    assert memspace.stats()['end'] - memspaces.shmem.DATA_START == memspaces.shmem.ARENA_SIZE
+
+    (_, blob, arr) = memspace.read(('big', data, None))
+    assert isinstance(blob, memspaces.Blob)
+    assert blob.view.readonly
+    assert data == blob
+    assert values == arr.value()
+    assert 3.0 == arr.view.cast(arr.typecode)[3]
+    assert memspace.read(('big', b'other', None)) is None
+    assert memspace.read(('big', memspaces.Typed(bytes), memspaces.Typed(bytes))) is None
+
+    (_, blob, arr) = memspace.get(('big', None, None))
+    assert _blobs(shmem_name) == []
+    # the mapping outlives the taken field
+    assert data == bytes(blob.view)
+    blob.release()
+    arr.release()
+    assert (b'x',) == tuple(memspace.get(('small', None)))[1:]
+
+
+def test_put_by_reference(memspace, shmem_name):
+    blob = memspace.blob(BLOB_SIZE)
+    blob.view[:4] = b'head'
+    memspace.put(('ref', blob))
+    memspace.put(('copy', blob))
+    blob.release()
+    assert 2 == len(_blobs(shmem_name))
+    (_, taken) = memspace.get(('ref', None))
+    with taken:
+        assert b'head' == bytes(taken.view[:4])
+    assert 1 == len(_blobs(shmem_name))
+
+
+def test_expired_and_unlinked(shmem_name, monkeypatch):
+    monkeypatch.setattr(memspaces.shmem, 'WHEEL_TICK', 0.05)
+    space = memspaces.MemSpace(shmem_name)
+    try:
+        space.put(('gone', bytes(BLOB_SIZE)), ttl=0.05)
+        space.put(('kept', bytes(BLOB_SIZE)))
+        time.sleep(0.2)
+        assert space.read(('gone', None)) is None
+        assert 1 == len(_blobs(shmem_name))
+    finally:
+        space.unlink()
+    assert _blobs(shmem_name) == []
+
+
+def _crash(name):
+    space = memspaces.MemSpace(name)
+    # an uncommitted record, as left by a crash during put
+    space._write(('half', bytes(BLOB_SIZE)))
+    os._exit(0)
+
+
+def test_reap_crashed_put(memspace, shmem_name):
+    p = Process(target=_crash, args=(shmem_name,))
+    p.start()
+    p.join()
+    assert 1 == len(_blobs(shmem_name))
+    memspace.compact()
+    assert _blobs(shmem_name) == []
@@ -0,0 +1,73 @@
+
+import time
+from multiprocessing import Process
+import memspaces
+
+
+def put_later(name, tpl, delay):
+    time.sleep(delay)
+    with memspaces.MemSpace(name) as space:
+        space.put(tpl)
+
+
+def test_nonblocking(memspace):
+    assert memspace.get(('hello', None)) is None
+    assert memspace.read(('hello', None)) is None
+
+
+def test_timeout(memspace):
+    before = time.monotonic()
+    assert memspace.get(('hello', None), block=True, timeout=0.2) is None
+    assert time.monotonic() - before >= 0.2
+
+
+def test_blocking_get(memspace, shmem_name):
+    p = Process(target=put_later, args=(shmem_name, ('hello', 'world'), 0.2))
+    p.start()
+    assert ('hello', 'world') == tuple(memspace.get(('hello', None), block=True, timeout=10))
+    p.join()
+    assert memspace.read(('hello', None)) is None
+
+
+def test_blocking_read(memspace, shmem_name):
+    p = Process(target=put_later, args=(shmem_name, (1, 2, 3), 0.2))
+    p.start()
+    assert (1, 2, 3) == tuple(memspace.read((None, None, 3), block=True))
+    p.join()
+    assert (1, 2, 3) == tuple(memspace.get((1, None, None)))
+
+
+def test_unrelated_put(memspace, shmem_name):
+    p = Process(target=put_later, args=(shmem_name, ('other', 'world'), 0.1))
+    p.start()
+    assert memspace.get(('hello', None), block=True, timeout=0.5) is None
+    p.join()
+    assert ('other', 'world') == tuple(memspace.get((None, None)))
+
+
+def test_targeted_wakeup(memspace):
+    slot = memspace._claim_waiter(('hello', None))
+    sem = memspace._waiter(slot)
+    try:
+        memspace.put(('other', 'world'))
+        memspace.put(('hello',))
+        memspace.put(('hello', 'world', '!'))
+        assert sem.value == 0
+        memspace.put(('hello', 'world'))
+        assert sem.value == 1
+        memspace.put(({'not': 'indexed'}, 'world'))
+        assert sem.value == 2
+    finally:
+        memspace._release_waiter(slot)
+
+
+def test_wildcard_wakeup(memspace):
+    slot = memspace._claim_waiter((None, None))
+    sem = memspace._waiter(slot)
+    try:
+        memspace.put(('hello',))
+        assert sem.value == 0
+        memspace.put(('hello', 'world'))
+        assert sem.value == 1
+    finally:
+        memspace._release_waiter(slot)
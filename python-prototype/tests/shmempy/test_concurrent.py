@@ -0,0 +1,59 @@
+from multiprocessing import Process, Queue
+from threading import Thread
+import memspaces
+
+
+def produce(name, producer, count):
+    with memspaces.MemSpace(name) as space:
+        for i in range(count):
+            space.put((producer, i, 'x' * (i % 50)))
+
+
+def consume(name, producer, count, queue):
+    with memspaces.MemSpace(name) as space:
+        queue.put([tuple(space.get((producer, None, None), block=True, timeout=30))
+                   for _ in range(count)])
+
+
+def test_put_without_space_lock(memspace, shmem_name):
+    with memspaces.MemSpace(shmem_name) as other:
+        other.put(('first',))
+        memspace._lock.acquire()
+        try:
+            t = Thread(target=other.put, args=(('second',),))
+            t.start()
+            t.join(timeout=5)
+            assert not t.is_alive()
+            assert ('second',) == tuple(other.read(('second',)))
+        finally:
+            memspace._lock.release()
+        t.join()
+
+
+def test_concurrent_producers(memspace, shmem_name):
+    procs = [Process(target=produce, args=(shmem_name, p, 500)) for p in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    for p in range(4):
+        for i in range(500):
+            assert (p, i, 'x' * (i % 50)) == tuple(memspace.get((p, i, None)))
+    assert memspace.get((None, None, None)) is None
+
+
+def test_concurrent_producers_consumers(memspace, shmem_name):
+    queue = Queue()
+    procs = [Process(target=consume, args=(shmem_name, p, 300, queue)) for p in range(3)]
+    procs += [Process(target=produce, args=(shmem_name, p, 300)) for p in range(3)]
+    for p in procs:
+        p.start()
+    results = [queue.get(timeout=60) for _ in range(3)]
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    for res in results:
+        (producer, _, _) = res[0]
+        assert [(producer, i, 'x' * (i % 50)) for i in range(300)] == res
+    assert memspace.get((None, None, None)) is None
@@ -0,0 +1,60 @@
+import os
+from multiprocessing import Process
+import posix_ipc
+import pytest
+import memspaces
+from memspaces.shmem import LOCK_STRIPES, _stripe_name
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'space')
+
+
+def _reboot(name):
+    # semaphores do not survive the system, files do
+    posix_ipc.unlink_semaphore(name)
+    for stripe in range(LOCK_STRIPES):
+        posix_ipc.unlink_semaphore(_stripe_name(name, stripe))
+
+
+def _crash(name, path):
+    space = memspaces.MemSpace(name, path=path)
+    space.put(('crashed', 1))
+    # an uncommitted record, as left by a crash during put
+    space._write(('half', 2))
+    os._exit(0)
+
+
+def test_restart(shmem_name, path):
+    space = memspaces.MemSpace(shmem_name, path=path)
+    space.put_many(('x', i) for i in range(100))
+    assert space.take_many(('x', None), 10) == [('x', i) for i in range(10)]
+    space.sync()
+    space.close()
+    _reboot(shmem_name)
+
+    space = memspaces.MemSpace(shmem_name, path=path)
+    try:
+        assert space.take_all(('x', None)) == [('x', i) for i in range(10, 100)]
+        assert space.stats()['live_records'] == 0
+    finally:
+        space.unlink()
+    assert not os.path.exists(path)
+
+
+def test_recover_crash(shmem_name, path):
+    p = Process(target=_crash, args=(shmem_name, path))
+    p.start()
+    p.join()
+    _reboot(shmem_name)
+
+    space = memspaces.MemSpace(shmem_name, path=path)
+    try:
+        stats = space.stats()
+        assert (stats['records'], stats['pending_records'], stats['arena_bytes']) == (1, 0, 0)
+        assert space.get((None, None)) == ('crashed', 1)
+        space.compact()
+        assert space.end == memspaces.shmem.DATA_START
+    finally:
+        space.unlink()
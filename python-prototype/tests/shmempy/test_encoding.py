@@ -0,0 +1,46 @@
+import array
+from decimal import Decimal
+import memspaces
+
+
+def test_roundtrip(memspace):
+    values = [
+        (None, True, False, 0, -1, 2**63 - 1, -2**63, 2**64, 1.5, float('inf')),
+        (b'', b'\x00bytes', '', 'str', 'ünïcödé \ud800', bytearray(b'ba')),
+        (array.array('i', [1, 2, 3]), array.array('d', [0.5]), array.array('b')),
+        ({'a': 1}, [1, 2], (1, (2, 'x')), Decimal('1.1'), 1j, frozenset([1])),
+    ]
+    for tpl in values:
+        memspace.put(tpl)
+    for tpl in values:
+        res = memspace.get(tuple(None for _ in tpl))
+        assert tpl == res
+        assert [type(x) for x in tpl] == [type(x) for x in res]
+
+
+def test_match_in_place(memspace):
+    memspace.put(('a', b'a', 1, 1.0, True))
+    assert memspace.read((b'a', None, None, None, None)) is None
+    assert memspace.read((None, 'a', None, None, None)) is None
+    assert memspace.read(('a', b'ab', None, None, None)) is None
+    assert memspace.read(('a', b'a', 1.0, True, 1)) is not None
+    assert memspace.read(('a', b'a', Decimal(1), 1, 1.0)) is not None
+    assert memspace.read((None, None, 2, None, None)) is None
+
+
+def test_match_arrays(memspace):
+    memspace.put((array.array('i', [1, 2]), 'x'))
+    assert memspace.read((array.array('i', [1]), None)) is None
+    assert memspace.read((array.array('i', [1, 2]), None)) is not None
+    assert memspace.read((array.array('l', [1, 2]), None)) is not None
+
+
+def test_only_winner_materialized(memspace, monkeypatch):
+    memspace.put(('x', [0]))
+    for i in range(1000):
+        memspace.put(('x', i))
+    loads = []
+    load = memspace._load
+    monkeypatch.setattr(memspace, '_load', lambda start, block: loads.append(start) or load(start, block))
+    assert ('x', 999) == memspace.read(('x', 999))
+    assert len(loads) == 1
@@ -0,0 +1,50 @@
+
+from multiprocessing import Process, Queue
+import pytest
+import memspaces
+from memspaces.shmem import SHMEM_SIZE
+
+
+def take_all(name, count, queue):
+    with memspaces.MemSpace(name) as space:
+        queue.put([tuple(space.get((i, None))) for i in reversed(range(count))])
+
+
+def test_grow(memspace):
+    for i in range(1000):
+        memspace.put((i, 'x' * 1000))
+    assert memspace.size > SHMEM_SIZE
+    assert memspace.end > SHMEM_SIZE
+    for i in reversed(range(1000)):
+        assert (i, 'x' * 1000) == tuple(memspace.get((i, None)))
+
+
+def test_grow_remote(memspace, shmem_name):
+    with memspaces.MemSpace(shmem_name) as other:
+        memspace.put((0, 'before'))
+        for i in range(1, 1000):
+            memspace.put((i, 'x' * 1000))
+        assert len(other._mmap) == SHMEM_SIZE
+        assert (999, 'x' * 1000) == tuple(other.read((999, None)))
+        assert len(other._mmap) == memspace.size
+        assert (998, 'x' * 1000) == tuple(other.get((998, None)))
+        assert memspace.read((998, None)) is None
+
+    queue = Queue()
+    p = Process(target=take_all, args=(shmem_name, 998, queue))
+    p.start()
+    res = queue.get(timeout=30)
+    p.join()
+    assert [(i, 'x' * 1000) for i in reversed(range(1, 998))] == res[:-1]
+    assert (0, 'before') == res[-1]
+    assert memspace.get((999, None)) is not None
+
+
+def test_max_size(bounded_memspace, shmem_name):
+    with pytest.raises(MemoryError):
+        for i in range(1000):
+            bounded_memspace.put((i, 'x' * 1000))
+    assert bounded_memspace.size == SHMEM_SIZE
+    with memspaces.MemSpace(shmem_name, max_size=SHMEM_SIZE * 4) as other:
+        with pytest.raises(MemoryError):
+            other.put(('x' * 1000,))
@@ -0,0 +1,71 @@
+
+def test_mixed_arity(memspace):
+    for i in range(100):
+        memspace.put((i,))
+        memspace.put((i, 'test %d' % i))
+        memspace.put((i, 'test %d' % i, i * 2))
+    for i in range(100):
+        assert (i, 'test %d' % i, i * 2) == tuple(memspace.get((i, None, None)))
+        assert (i,) == tuple(memspace.get((i,)))
+        assert (i, 'test %d' % i) == tuple(memspace.get((i, None)))
+    assert memspace.get((None,)) is None
+    assert memspace.get((None, None)) is None
+
+
+def test_second_field(memspace):
+    for i in range(100):
+        memspace.put((i % 10, 'test %d' % i))
+    for i in reversed(range(100)):
+        assert (i % 10, 'test %d' % i) == tuple(memspace.get((None, 'test %d' % i)))
+
+
+def test_numeric_equality(memspace):
+    memspace.put((1, 'int'))
+    memspace.put((2.0, 'float'))
+    assert (1, 'int') == tuple(memspace.read((1.0, None)))
+    assert (1, 'int') == tuple(memspace.read((True, None)))
+    assert (2.0, 'float') == tuple(memspace.get((2, None)))
+
+
+def test_taken_not_found(memspace):
+    memspace.put(('hello', 'world'))
+    memspace.put(('hello', 'world'))
+    assert ('hello', 'world') == tuple(memspace.get(('hello', None)))
+    assert ('hello', 'world') == tuple(memspace.get((None, 'world')))
+    assert memspace.get(('hello', None)) is None
+    assert memspace.read((None, 'world')) is None
+
+
+def test_fifo(memspace):
+    for i in range(10):
+        memspace.put(('job', i))
+    for i in range(10):
+        assert ('job', i) == tuple(memspace.get(('job', None)))
+
+
+def test_equal_but_not_canonical(memspace):
+    from decimal import Decimal
+    memspace.put(((1, 2), 'tuple'))
+    memspace.put(({'a': 1, 'b': 2}, 'dict'))
+    memspace.put((Decimal(3), 'decimal'))
+    memspace.put((4 + 0j, 'complex'))
+    memspace.put((frozenset(['x', 'y', 'z']), 'frozenset'))
+    assert ((1, 2), 'tuple') == tuple(memspace.read(((1.0, 2), None)))
+    assert ({'a': 1, 'b': 2}, 'dict') == tuple(memspace.read(({'b': 2, 'a': 1}, None)))
+    assert (Decimal(3), 'decimal') == tuple(memspace.read((3, None)))
+    assert (4 + 0j, 'complex') == tuple(memspace.read((4, None)))
+    assert (frozenset(['x', 'y', 'z']), 'frozenset') == tuple(memspace.get((frozenset(['z', 'y', 'x']), None)))
+    assert (Decimal(3), 'decimal') == tuple(memspace.get((3.0, 'decimal')))
+    assert memspace.read((3, None)) is None
+
+
+def test_unindexed_bucket_collision(memspace):
+    from memspaces.shmem import INDEX_BUCKETS, _field_hash, _unindexed_hash
+    bucket = _unindexed_hash(2, 1) % INDEX_BUCKETS
+    other = next(j for j in range(10**6) if _field_hash(3, 0, j) % INDEX_BUCKETS == bucket)
+    memspace.put((other, None, None))
+    for i in range(100):
+        memspace.put(('x', i))
+    assert not memspace._holds(_unindexed_hash(2, 1))
+    assert memspace._chain(('x', 50)) == _field_hash(2, 1, 50)
+    assert ('x', 50) == memspace.get(('x', 50))
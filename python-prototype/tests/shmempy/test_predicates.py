@@ -0,0 +1,38 @@
+from memspaces import Typed, Range, Prefix, OneOf
+
+
+def test_typed(memspace):
+    memspace.put_many([('a', 1), ('b', True), ('c', 1.5), ('d', 2**70), ('e', None)])
+    assert [('a', 1), ('d', 2**70)] == memspace.take_all((None, Typed(int)))
+    assert [('b', True), ('c', 1.5)] == memspace.take_all((None, Typed('bool', float)))
+    assert ('e', None) == memspace.get((Typed(str), Typed(type(None))))
+
+
+def test_range(memspace):
+    memspace.put_many((i, 'x') for i in range(200))
+    memspace.put(('str', 'x'))
+    assert [(i, 'x') for i in range(101, 105)] == memspace.take_many((Range(101), 'x'), 4)
+    assert [(i, 'x') for i in range(10)] == memspace.take_all((Range(high=10), None))
+    assert [(10, 'x')] == memspace.take_all((Range(10.0, 10.5), None))
+    assert memspace.read((Range('a', 'z'), None)) == ('str', 'x')
+
+
+def test_prefix(memspace):
+    memspace.put_many([('job:1', 1), (b'job:2', 2), ('jo', 3), ('job:ü', 4), ('task:1', 5)])
+    assert [('job:1', 1), ('job:ü', 4)] == memspace.take_all((Prefix('job:'), None))
+    assert (b'job:2', 2) == memspace.get((Prefix(b'job'), None))
+    assert memspace.get((Prefix('job'), None)) is None
+
+
+def test_one_of(memspace):
+    memspace.put_many((i % 5, i) for i in range(20))
+    assert [(1, 1), (3, 3), (1, 6)] == memspace.take_many((OneOf(1, 3.0), None), 3)
+    assert memspace.read((OneOf('1', b'1'), None)) is None
+
+
+def test_predicate_with_index(memspace):
+    memspace.put_many(('job', i) for i in range(500))
+    memspace.put_many(('other', i) for i in range(500))
+    before = memspace.stats()['scanned']
+    assert [('other', i) for i in range(450, 500)] == memspace.take_all(('other', Range(450)))
+    assert memspace.stats()['scanned'] - before <= 501
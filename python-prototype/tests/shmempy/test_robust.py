@@ -0,0 +1,98 @@
+import os
+from multiprocessing import Process
+import pytest
+import memspaces
+from memspaces.shmem import LOCK_STRIPES, DATA_START, _stripe
+
+
+def _run(target, *args):
+    p = Process(target=target, args=args)
+    p.start()
+    p.join()
+    assert p.exitcode == 0
+
+
+def _die_locked(name):
+    space = memspaces.MemSpace(name)
+    space._acquire(LOCK_STRIPES)
+    os._exit(0)
+
+
+def _die_publishing(name):
+    space = memspaces.MemSpace(name)
+    (start, hashes, _) = space._write(('half', 1))
+    for stripe in sorted({_stripe(hsh) for hsh in hashes}):
+        space._acquire(stripe)
+    space._link(start + 16, start, hashes[0])
+    os._exit(0)
+
+
+def _die_taking(name):
+    space = memspaces.MemSpace(name)
+    unlink = space._unlink
+
+    def die(node):
+        unlink(node)
+        os._exit(0)
+    space._unlink = die
+    space.get(('t', 0))
+
+
+def _die_compacting(name, relinks):
+    space = memspaces.MemSpace(name)
+    relink = space._relink
+    done = []
+
+    def die(*args):
+        if len(done) == relinks:
+            os._exit(0)
+        done.append(relink(*args))
+    space._relink = die
+    space.compact()
+
+
+def test_dead_space_lock_holder(memspace, shmem_name):
+    _run(_die_locked, shmem_name)
+    memspace.put(('x', 1))
+    assert memspace.stats()['records'] == 1
+    assert memspace.get(('x', None)) == ('x', 1)
+
+
+def test_dead_publisher(memspace, shmem_name):
+    _run(_die_publishing, shmem_name)
+    assert memspace.read(('half', None)) is None
+    memspace.put(('half', 2))
+    assert memspace.take_all((None, None)) == [('half', 2)]
+    memspace.compact()
+    stats = memspace.stats()
+    assert (stats['records'], stats['pending_records'], stats['arena_bytes']) == (0, 0, 0)
+    assert memspace.end == DATA_START
+
+
+def test_dead_taker(memspace, shmem_name):
+    memspace.put_many(('t', i) for i in range(10))
+    _run(_die_taking, shmem_name)
+    # the tuple being taken is gone with its taker
+    assert memspace.take_all(('t', None)) == [('t', i) for i in range(1, 10)]
+    memspace.compact()
+    assert memspace.end == DATA_START
+
+
+@pytest.mark.parametrize('relinks', [0, 1])
+@pytest.mark.parametrize('slide', [False, True])
+def test_dead_compactor(memspace, shmem_name, relinks, slide):
+    # taking the small tuples leaves holes too small for the large ones,
+    # which then have to be slid into them
+    for i in range(40):
+        memspace.put(('c', i, 'x' * (200 if slide and i % 2 else 10)))
+    memspace.take_many(('c', memspaces.OneOf(*range(0, 40, 2)), None), 20)
+    with memspace._locked(), memspace._arena_lock:
+        memspace._retire()
+
+    _run(_die_compacting, shmem_name, relinks)
+    res = memspace.take_all(('c', None, None))
+    assert sorted(i for (_, i, _) in res) == list(range(1, 40, 2))
+    memspace.compact()
+    stats = memspace.stats()
+    assert (stats['records'], stats['pending_records']) == (0, 0)
+    assert memspace.end == DATA_START
@@ -0,0 +1,50 @@
+import pytest
+import memspaces
+
+
+def test_pages(memspace):
+    memspace.put_many(('job', i) for i in range(100))
+    memspace.put_many(('other', i) for i in range(100))
+    (tpls, cursor) = memspace.scan_page(('job', None), count=30)
+    assert list(range(30)) == [t[1] for t in tpls]
+    assert cursor is not None
+    assert list(range(30, 100)) == [t[1] for t in memspace.scan(('job', None), cursor)]
+    # scanning takes nothing
+    assert 100 == len(memspace.take_all(('job', None)))
+
+
+def test_block_budget(memspace, monkeypatch):
+    monkeypatch.setattr(memspaces.shmem, 'SCAN_BLOCKS', 16)
+    memspace.put_many(('job', i) for i in range(100))
+    (tpls, cursor) = memspace.scan_page(('job', 99))
+    assert [] == tpls
+    assert cursor is not None
+    assert [('job', 99)] == [tuple(t) for t in memspace.scan(('job', 99))]
+
+
+def test_takes_during_scan(memspace, monkeypatch):
+    monkeypatch.setattr(memspaces.shmem, 'SCAN_BLOCKS', 16)
+    memspace.put_many(('job', i) for i in range(200))
+    (tpls, cursor) = memspace.scan_page(('job', None), count=50)
+    # freeing the neighbours coalesces the blocks around the cursor
+    taken = memspace.take_many(('job', None), 60)
+    assert list(range(60)) == [t[1] for t in taken]
+    rest = [t[1] for t in memspace.scan(('job', None), cursor)]
+    assert list(range(60, 200)) == rest
+
+
+def test_compact_restarts(memspace):
+    memspace.put_many(('fill', i) for i in range(100))
+    memspace.put_many(('job', i) for i in range(20))
+    (tpls, cursor) = memspace.scan_page(('job', None), count=10)
+    memspace.take_all(('fill', None))
+    memspace.compact()
+    # the records moved, out of order, so the scan starts over
+    rest = [t[1] for t in memspace.scan(('job', None), cursor)]
+    assert list(range(20)) == sorted(rest)
+
+
+def test_expired_skipped(memspace):
+    memspace.put(('lease', 1), ttl=-1)
+    memspace.put(('lease', 2))
+    assert [('lease', 2)] == [tuple(t) for t in memspace.scan(('lease', None))]
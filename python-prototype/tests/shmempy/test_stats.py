@@ -0,0 +1,48 @@
+import json
+import pytest
+from posix_ipc import ExistentialError
+import memspaces
+from memspaces import stats
+
+
+def test_counters(memspace):
+    memspace.put_many((i, 'x') for i in range(100))
+    for i in range(50):
+        assert (i, 'x') == memspace.get((i, None))
+    assert (50, 'x') == memspace.read((None, 'x'))
+    res = memspace.stats()
+    assert 100 == res['puts']
+    assert 50 == res['takes']
+    assert 50 == res['live_records'] == res['records']
+    assert 0 == res['pending_records']
+    assert res['lookups'] >= 51
+    assert res['scanned'] >= res['lookups']
+    assert res['encode_ns'] > 0 and res['decode_ns'] > 0
+
+
+def test_fragmentation(memspace):
+    for i in range(100):
+        memspace.put((i, 'x' * 100))
+    for i in range(0, 100, 2):
+        memspace.get((i, None))
+    res = memspace.stats()
+    assert res['free_blocks'] > 1
+    assert 0 < res['fragmentation'] < 1
+    memspace.compact()
+    res = memspace.stats()
+    assert 0 == res['free_blocks']
+    assert 0 == res['fragmentation']
+
+
+def test_no_create(shmem_name):
+    with pytest.raises(ExistentialError):
+        memspaces.MemSpace(shmem_name, create=False)
+
+
+def test_cli(memspace, shmem_name, capsys):
+    memspace.put(('x',))
+    stats.main([shmem_name, '--json'])
+    res = json.loads(capsys.readouterr().out)
+    assert 1 == res['records']
+    stats.main([shmem_name])
+    assert 'records:' in capsys.readouterr().out
@@ -0,0 +1,55 @@
+import time
+import pytest
+import memspaces
+
+
+@pytest.fixture
+def fast_wheel(monkeypatch):
+    monkeypatch.setattr(memspaces.shmem, 'WHEEL_TICK', 0.05)
+
+
+def test_expiry(memspace):
+    memspace.put(('lease', 1), ttl=0.1)
+    memspace.put(('lease', 2))
+    assert (1,) == tuple(t[1] for t in memspace.take_many(('lease', 1), 1))
+    memspace.put(('lease', 1), ttl=0.1)
+    assert ('lease', 1) == tuple(memspace.read(('lease', 1)))
+    time.sleep(0.15)
+    # expired tuples are never handed out, even before they are reclaimed
+    assert memspace.read(('lease', 1)) is None
+    assert [('lease', 2)] == [tuple(t) for t in memspace.take_all(('lease', None))]
+
+
+def test_bulk_reclaim(memspace, fast_wheel):
+    memspace.put_many((('job', i) for i in range(500)), ttl=0.05)
+    memspace.put(('keep', 1))
+    assert memspace.stats()['records'] == 501
+    time.sleep(0.2)
+    assert ('keep', 1) == tuple(memspace.read(('keep', None)))
+    stats = memspace.stats()
+    assert stats['expired'] == 500
+    assert stats['records'] == 1
+    assert stats['live_records'] == 1
+
+
+def test_later_turn_of_wheel(memspace, fast_wheel):
+    # one turn of the wheel later, the slot is passed over again
+    memspace.put(('late',), ttl=memspaces.shmem.WHEEL_SLOTS * 0.05 + 0.1)
+    memspace.put(('soon',), ttl=0.05)
+    time.sleep(0.2)
+    memspace.read(('late',))
+    assert memspace.stats()['expired'] == 1
+    assert ('late',) == tuple(memspace.read(('late',)))
+
+
+def test_compact_keeps_deadline(memspace, fast_wheel):
+    memspace.put_many(('fill', i) for i in range(100))
+    memspace.put_many((('lease', i) for i in range(10)), ttl=0.3)
+    memspace.take_all(('fill', None))
+    end = memspace.end
+    memspace.compact()
+    assert memspace.end < end
+    assert ('lease', 9) == tuple(memspace.read(('lease', 9)))
+    time.sleep(0.45)
+    assert memspace.read(('lease', None)) is None
+    assert memspace.stats()['records'] == 0
@@ -22,6 +22,7 @@ def server(request, hostname, port):
     yield srv
     p.terminate()
     p.join()
+    srv.server_close()
 
 
 @pytest.fixture
@@ -0,0 +1,18 @@
+
+
+def test_put_many(memspace):
+    memspace.put_many((i, 'test %d' % i) for i in range(1000))
+    for i in range(1000):
+        assert (i, 'test %d' % i) == tuple(memspace.get((i, None)))
+    assert memspace.get((None, None)) is None
+
+
+def test_take_many(memspace):
+    memspace.put_many([(i % 2, i) for i in range(100)])
+    res = memspace.take_many((1, None), 10)
+    assert [(1, i) for i in range(1, 20, 2)] == [tuple(t) for t in res]
+    res = memspace.take_all((0, None))
+    assert [(0, i) for i in range(0, 100, 2)] == [tuple(t) for t in res]
+    res = memspace.take_all((None, None))
+    assert [(1, i) for i in range(21, 100, 2)] == [tuple(t) for t in res]
+    assert [] == memspace.take_all((None, None))
@@ -0,0 +1,65 @@
+import time
+from memspaces.journal import Journal
+from memspaces.xmlrpc import MemSpaceApi
+
+
+def test_replay(tmp_path):
+    path = str(tmp_path / 'space')
+    api = MemSpaceApi(Journal(path))
+    api.put_many([('x', i) for i in range(10)])
+    assert api.take_many(('x', {'$range': [2, 5]}), 2) == [('x', 2), ('x', 3)]
+    assert api.get(('x', None)) == ('x', 0)
+    api.close()
+
+    api = MemSpaceApi(Journal(path))
+    assert api.take_all(('x', None)) == [('x', i) for i in (1, 4, 5, 6, 7, 8, 9)]
+    api.close()
+
+
+def test_snapshot(tmp_path):
+    path = str(tmp_path / 'space')
+    api = MemSpaceApi(Journal(path, snapshot_bytes=1024))
+    for i in range(200):
+        api.put(('x', i, 'payload'))
+        if i % 2:
+            api.get(('x', None, None))
+    api.close()
+    assert (tmp_path / 'space.snapshot').exists()
+    assert (tmp_path / 'space.log').stat().st_size < 2048
+
+    api = MemSpaceApi(Journal(path))
+    assert api.take_all((None, None, None)) == [('x', i, 'payload') for i in range(100, 200)]
+    api.close()
+
+
+def test_torn_tail(tmp_path):
+    path = str(tmp_path / 'space')
+    api = MemSpaceApi(Journal(path))
+    api.put(('a',))
+    api.put(('b',))
+    api.close()
+    with open(path + '.log', 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 1)
+
+    api = MemSpaceApi(Journal(path))
+    api.put(('c',))
+    assert api.take_all((None,)) == [('a',), ('c',)]
+    api.close()
+
+
+def test_ttl_replay(tmp_path):
+    path = str(tmp_path / 'space')
+    api = MemSpaceApi(Journal(path, snapshot_bytes=256))
+    api.put(('lease', 1), 0.1)
+    api.put_many([('lease', 2), ('lease', 3)], 60)
+    api.put(('lease', 4))
+    time.sleep(0.15)
+    # the take after the expiry must take the same tuple on replay
+    assert api.get(('lease', None)) == ('lease', 2)
+    api.put_many([('pad', 'x' * 100)] * 3)
+    api.close()
+    assert (tmp_path / 'space.snapshot').exists()
+
+    api = MemSpaceApi(Journal(path))
+    assert api.take_all(('lease', None)) == [('lease', 3), ('lease', 4)]
+    api.close()
@@ -0,0 +1,80 @@
+import threading
+from multiprocessing import Process
+from xmlrpc.client import Fault
+import pytest
+import memspaces
+
+PORT = 10005
+
+
+@pytest.fixture(scope='module')
+def workers_server():
+    srv = memspaces.MemSpaceServer('localhost', PORT, workers=4)
+    p = Process(target=srv.serve_forever)
+    p.start()
+    yield srv
+    p.terminate()
+    p.join()
+    srv.server_close()
+
+
+def _client():
+    return memspaces.MemSpaceClient('http://localhost:%d' % PORT)
+
+
+def test_keepalive(workers_server):
+    space = _client().space('keepalive')
+    space.put(('hello', 1))
+    transport = space._proxy_args[2]['transport']
+    [(_, connection)] = transport._idle
+    sock = connection.sock
+    assert space.get(('hello', None)) == ['hello', 1]
+    # the same connection served the next request
+    assert transport._idle[0][1].sock is sock
+
+
+def test_idle_connections_do_not_hold_workers(workers_server):
+    # more idle persistent connections than workers
+    clients = [_client() for _ in range(8)]
+    for (i, client) in enumerate(clients):
+        client.space('idle').put(('idle', i))
+    space = _client().space('idle')
+    assert sorted(map(tuple, space.take_all(('idle', None)))) == [('idle', i) for i in range(8)]
+
+
+def test_shared_client(workers_server):
+    space = _client().space('shared')
+
+    def work(i):
+        for j in range(50):
+            space.put((i, j))
+            assert space.read((i, j)) == [i, j]
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    res = space.take_all((None, None))
+    assert sorted(map(tuple, res)) == [(i, j) for i in range(16) for j in range(50)]
+    assert len(space._proxy_args[2]['transport']._idle) <= memspaces.xmlrpc.POOL_SIZE
+
+
+@pytest.mark.parametrize('workers', [False, True])
+def test_pipeline(workers, request):
+    if workers:
+        request.getfixturevalue('workers_server')
+        space = _client().space('pipeline')
+    else:
+        space = request.getfixturevalue('memspace').space('pipeline')
+    res = space.pipeline([
+        ('put', (('a', 1),)),
+        ('put_many', (iter([('a', 2), ('a', 3)]),)),
+        ('get', (('a', memspaces.Range(2, None)),)),
+        ('take_all', (('a', None),)),
+    ])
+    assert res == [None, None, ['a', 2], [['a', 1], ['a', 3]]]
+    with pytest.raises(Fault):
+        space.pipeline([('put', (('b', 1),)), ('take_many', (('b', None), 'x'))])
+    # the calls before the failure took effect
+    assert space.get(('b', None)) == ['b', 1]
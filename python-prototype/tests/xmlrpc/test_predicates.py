@@ -0,0 +1,15 @@
+from memspaces import Typed, Range, Prefix, OneOf
+
+
+def test_predicates(memspace):
+    memspace.put_many([('job:1', 1), ('job:2', 2.5), ('task:1', 3), ('job:3', 'x')])
+    assert ['job:2', 2.5] == memspace.get((Prefix('job:'), Typed(float)))
+    assert [['job:1', 1]] == memspace.take_all((None, Range(0, 2)))
+    assert ['task:1', 3] == memspace.read((OneOf('task:1', 'task:2'), None))
+    assert memspace.get((Prefix('task:'), Typed(str))) is None
+    assert [['task:1', 3], ['job:3', 'x']] == memspace.take_many((None, None), 5)
+
+
+def test_struct_values(memspace):
+    memspace.put(({'a': 1}, 1))
+    assert [{'a': 1}, 1] == memspace.get(({'a': 1}, None))
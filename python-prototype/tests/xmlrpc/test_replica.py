@@ -0,0 +1,99 @@
+import time
+from multiprocessing import Process
+import pytest
+import memspaces
+from memspaces.xmlrpc import MemSpaceApi
+from memspaces.replica import MemSpaceReplicaApi
+
+PRIMARY = 'http://localhost:10009'
+REPLICA = 'http://localhost:10010'
+
+
+@pytest.fixture(scope='module')
+def servers():
+    servers = [memspaces.MemSpaceServer('localhost', 10009),
+               memspaces.MemSpaceReplicaServer('localhost', 10010, PRIMARY)]
+    processes = [Process(target=srv.serve_forever) for srv in servers]
+    for p in processes:
+        p.start()
+    yield servers
+    for (p, srv) in zip(processes, servers):
+        p.terminate()
+        p.join()
+        srv.server_close()
+
+
+@pytest.fixture
+def client(servers, request):
+    return memspaces.MemSpaceClient(PRIMARY, replicas=[REPLICA]).space(request.node.name)
+
+
+@pytest.fixture
+def replica(servers, request):
+    return memspaces.MemSpaceClient(REPLICA).space(request.node.name)
+
+
+def _await(func, timeout=5):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            res = func()
+            if res is not None:
+                return res
+        except Exception:
+            if time.time() > deadline:
+                raise
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_change_stream():
+    api = MemSpaceApi()
+    api.put(('a', 1))
+    (position, entries) = api.changes()
+    assert [('reset',), ('put', [('a', 1)])] == entries
+    api.put_many([('b', 2), ('b', 3)])
+    api.get(('b', memspaces.Range(3, 4)))
+    (position, entries) = api.changes(position)
+    assert [('put', [('b', 2), ('b', 3)]), ('take', ['b', {'$range': [3, 4]}], 1)] == entries
+    assert [] == api.changes(position)[1]
+    # positions of another stream start over
+    assert ('reset',) == api.changes('x:1')[1][0]
+
+
+def test_reads_follow(client, replica):
+    client.put_many([('cfg', i) for i in range(10)])
+    assert ['cfg', 3] == _await(lambda: replica.read(('cfg', 3)))
+    client.get(('cfg', 3))
+    _await(lambda: True if replica.read(('cfg', 3)) is None else None)
+    assert ['cfg', 4] == client.read(('cfg', 4))
+    assert 9 == len(client.take_all(('cfg', None)))
+
+
+def test_read_only(client, replica):
+    client.put(('x', 1))
+    _await(lambda: replica.read(('x', 1)))
+    with pytest.raises(Exception):
+        replica.get(('x', 1))
+    assert ['x', 1] == client.get(('x', 1))
+
+
+class _Unreachable(object):
+    def changes(self, since):
+        raise OSError('unreachable')
+
+
+def test_stale_replica():
+    api = MemSpaceReplicaApi(_Unreachable(), poll=0.01)
+    try:
+        with pytest.raises(ValueError):
+            api.read(('x',))
+    finally:
+        api.close()
+
+
+def test_stale_replica_falls_back(servers, request):
+    # no replica listens there, so the server answers
+    client = memspaces.MemSpaceClient(PRIMARY, replicas=['http://localhost:1']).space(request.node.name)
+    client.put(('x', 1))
+    assert ['x', 1] == client.read(('x', None))
@@ -0,0 +1,92 @@
+import threading
+from multiprocessing import Process
+import pytest
+import memspaces
+
+PORTS = (10006, 10007, 10008)
+
+
+@pytest.fixture(scope='module')
+def shard_servers():
+    servers = [memspaces.MemSpaceServer('localhost', port) for port in PORTS]
+    processes = [Process(target=srv.serve_forever) for srv in servers]
+    for p in processes:
+        p.start()
+    yield servers
+    for (p, srv) in zip(processes, servers):
+        p.terminate()
+        p.join()
+        srv.server_close()
+
+
+@pytest.fixture
+def clients(shard_servers, request):
+    name = request.node.name
+    return [memspaces.MemSpaceClient('http://localhost:%d' % port).space(name) for port in PORTS]
+
+
+@pytest.fixture
+def sharded(clients):
+    with memspaces.ShardedMemSpaceClient(clients) as space:
+        yield space
+
+
+def test_routing(sharded, clients):
+    sharded.put_many(('key%d' % i, i) for i in range(30))
+    counts = [len(c.read(('key%d' % i, None)) or ()) for i in range(30) for c in clients]
+    # every tuple lives on exactly one shard, and all shards are used
+    assert sum(counts) == 60
+    assert all(c.take_all((None, None)) for c in clients)
+
+
+def test_bound_key(sharded, clients):
+    sharded.put(('job', 1))
+    [shard] = [c for c in clients if c.read(('job', None)) is not None]
+    assert sharded.read(('job', None)) == ['job', 1]
+    assert sharded.get(('job', None)) == ['job', 1]
+    assert shard.read(('job', None)) is None
+    assert sharded.get(('job', None)) is None
+
+
+def test_fan_out(sharded):
+    sharded.put_many(('k%d' % i, i) for i in range(20))
+    assert sharded.read((None, 7)) == ['k7', 7]
+    assert sharded.get((None, memspaces.Range(10, None)))[1] >= 10
+    assert len(sharded.take_many((memspaces.OneOf('k1', 'k2', 'k3'), None), 2)) == 2
+    assert len(sharded.take_many((None, None), 5)) == 5
+    assert len(sharded.take_all((memspaces.Prefix('k'), None))) == 12
+    assert sharded.get((None, None)) is None
+
+
+def test_unkeyed_fields(sharded):
+    sharded.put_many([([1, 2], 'list'), ([1, 2], 'list'), ('short',)])
+    assert sharded.read(([1, 2], None)) == [[1, 2], 'list']
+    assert sharded.take_all(([1, 2], None)) == [[[1, 2], 'list']] * 2
+    assert sharded.get(('short',)) == ['short']
+
+
+def test_take_once(sharded):
+    n = 200
+    sharded.put_many(('t%d' % i, i) for i in range(n))
+    taken = []
+
+    def work():
+        while True:
+            res = sharded.get((None, None))
+            if res is None:
+                return
+            taken.append(res[1])
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(taken) == list(range(n))
+
+
+def test_scan(sharded):
+    sharded.put_many(('key%d' % i, i) for i in range(30))
+    seen = sorted(t[1] for t in sharded.scan((None, None), count=4))
+    assert list(range(30)) == seen
+    assert 30 == len(sharded.take_all((None, None)))
@@ -0,0 +1,51 @@
+from multiprocessing import Process
+import pytest
+import memspaces
+from memspaces.xmlrpc import shmem_name
+
+PORT = 10004
+SHMEM = 'MemSpaceTestRpc'
+
+
+@pytest.fixture(scope='module')
+def server():
+    srv = memspaces.MemSpaceServer('localhost', PORT, shmem=SHMEM)
+    p = Process(target=srv.serve_forever)
+    p.start()
+    yield srv
+    p.terminate()
+    p.join()
+    srv.server_close()
+    for name in ('', 'jobs'):
+        memspaces.MemSpace(shmem_name(SHMEM, name)).unlink()
+
+
+@pytest.fixture
+def client(server):
+    return memspaces.MemSpaceClient('http://localhost:%d' % PORT)
+
+
+def test_shared_with_local(client):
+    with memspaces.MemSpace(SHMEM) as local:
+        local.put(('local', 1))
+        client.put(('remote', 2))
+        assert client.get(('local', None)) == ['local', 1]
+        assert local.get(('remote', None)) == ('remote', 2)
+        assert client.read((None, None)) is None
+
+
+def test_named_space(client):
+    with memspaces.MemSpace(shmem_name(SHMEM, 'jobs')) as local:
+        client.space('jobs').put_many([('job', i) for i in range(3)])
+        assert local.take_many(('job', None), 2) == [('job', 0), ('job', 1)]
+        assert client.space('jobs').take_all((memspaces.Typed(str), None)) == [['job', 2]]
+        assert client.read((None, None)) is None
+
+
+def test_large_field(client):
+    data = bytes(range(256)) * (memspaces.shmem.BLOB_SIZE // 256)
+    with memspaces.MemSpace(SHMEM) as local:
+        local.put(('large', data))
+        # the blob is copied out for the network
+        assert client.read(('large', None)) == ['large', data]
+        assert client.get(('large', None)) == ['large', data]
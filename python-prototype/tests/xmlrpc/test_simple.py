@@ -1,4 +1,5 @@
 
+import time
 import random
 
 
@@ -35,3 +36,19 @@ def test_read(memspace):
         assert (i, 'test %d' % i) == tuple(memspace.read((i, None)))
     for i in random.sample(range(100), 100):
         assert (i, 'test %d' % i) == tuple(memspace.get((i, None)))
+
+
+def test_ttl(memspace):
+    memspace.put(('ttl', 1), 0.1)
+    memspace.put_many([('ttl', 2)], 60)
+    time.sleep(0.15)
+    assert ['ttl', 2] == memspace.get(('ttl', None))
+    assert memspace.get(('ttl', None)) is None
+
+
+def test_scan(memspace):
+    memspace.put_many([('scan', i) for i in range(10)])
+    (tpls, cursor) = memspace.scan_page(('scan', None), count=4)
+    assert [['scan', i] for i in range(4)] == tpls
+    assert [['scan', i] for i in range(4, 10)] == list(memspace.scan(('scan', None), cursor, 4))
+    assert 10 == len(memspace.take_all(('scan', None)))
@@ -0,0 +1,21 @@
+import pytest
+from xmlrpc.client import Fault
+
+
+def test_named_spaces(memspace):
+    jobs = memspace.space('jobs')
+    results = memspace.space('results.v2')
+    memspace.put(('default', 1))
+    jobs.put(('job', 1))
+    results.put(('result', 1))
+    assert jobs.read((None, None)) == ['job', 1]
+    assert results.get((None, None)) == ['result', 1]
+    assert results.get((None, None)) is None
+    assert memspace.take_all((None, None)) == [['default', 1]]
+    assert jobs.take_all((None, None)) == [['job', 1]]
+    assert {'', 'jobs', 'results.v2'} <= set(memspace.spaces())
+
+
+def test_unsupported(memspace):
+    with pytest.raises(Fault):
+        memspace.space('jobs')._remote('_dispatch')('x', [])
@@ -0,0 +1,77 @@
+from memspaces.store import TupleStore
+
+
+def test_fifo_by_arity():
+    store = TupleStore()
+    for i in range(100):
+        store.put((i % 3, i))
+        store.put((i % 3, i, 'x'))
+    assert [(1, i) for i in range(1, 100, 3)] == store.take((1, None), None)
+    assert [(0, 0, 'x')] == store.read((None, None, 'x'))
+    assert 167 == len(store)
+
+
+def test_equal_keys():
+    store = TupleStore()
+    store.put((1, [1, 2], (3, 4)))
+    assert store.read((1.0, None, None))
+    assert store.read((True, [1.0, 2], None))
+    assert not store.read((None, (1, 2), None))
+    assert not store.read((None, None, [3, 4]))
+    assert store.take((None, None, (3.0, 4)))
+    assert 0 == len(store)
+
+
+def test_unindexed_values():
+    store = TupleStore()
+    store.put(('a', {'k': 1}))
+    store.put(('b', 2))
+    assert [('b', 2)] == store.read((None, 2))
+    assert [('a', {'k': 1})] == store.take((None, {'k': 1}))
+    assert [('b', 2)] == store.take((None, 2))
+    assert [] == store.take((None, None))
+
+
+def test_large_backlog():
+    store = TupleStore()
+    for i in range(200000):
+        store.put(('job', i, 'payload'))
+    store.put(('needle', 0, 'payload'))
+    assert [('needle', 0, 'payload')] == store.take(('needle', None, None))
+    assert [('job', 199999, 'payload')] == store.take((None, 199999, None))
+    assert 199999 == len(store)
+
+
+def test_one_of_index():
+    from memspaces.templates import OneOf, Range
+    store = TupleStore()
+    for i in range(1000):
+        store.put((i % 100, i))
+    assert [(7, 7), (3, 103), (7, 107)] == store.take((OneOf(3.0, 7, 'x'), Range(5)), 3)
+    assert 17 == len(store.read((OneOf(3, 7), None), None))
+
+
+def test_expire():
+    store = TupleStore()
+    store.put(('a', 1), 10.0)
+    store.put(('a', 2))
+    store.put(('a', 3), 5.0)
+    store.put(('b',), 5.0)
+    assert [('a', 1)] == store.take(('a', 1))
+    assert 0 == store.expire(4.0)
+    assert 2 == store.expire(10.0)
+    assert [('a', 2)] == store.read(('a', None), None)
+    assert [(('a', 2), None)] == list(store.items())
+
+
+def test_scan():
+    store = TupleStore()
+    for i in range(100):
+        store.put(('job', i))
+    store.put(('other', 0))
+    (tpls, after) = store.scan(('job', None), limit=30)
+    assert [('job', i) for i in range(30)] == tpls
+    # taking most tuples drops their sequence numbers from the scan order
+    store.take(('job', None), 80)
+    assert ([('job', i) for i in range(80, 100)], None) == store.scan(('job', None), after)
+    assert ([('other', 0)], None) == store.scan(('other', None))
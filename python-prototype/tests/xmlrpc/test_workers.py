@@ -0,0 +1,46 @@
+import socket
+import threading
+from multiprocessing import Process
+import pytest
+import memspaces
+
+PORT = 10003
+
+
+@pytest.fixture(scope='module')
+def server():
+    srv = memspaces.MemSpaceServer('localhost', PORT, workers=4)
+    p = Process(target=srv.serve_forever)
+    p.start()
+    yield srv
+    p.terminate()
+    p.join()
+    srv.server_close()
+
+
+def _client():
+    return memspaces.MemSpaceClient('http://localhost:%d' % PORT)
+
+
+def test_stalled_client(server):
+    # a client that never completes its request must not stall the others
+    with socket.create_connection(('localhost', PORT)) as sock:
+        sock.sendall(b'POST /RPC2 HTTP/1.0\r\n')
+        space = _client()
+        space.put(('stalled', 1))
+        assert space.get(('stalled', None)) == ['stalled', 1]
+
+
+def test_concurrent_clients(server):
+    def work(i):
+        space = _client().space('workers')
+        for j in range(50):
+            space.put((i, j))
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    res = _client().space('workers').take_all((None, None))
+    assert sorted(map(tuple, res)) == [(i, j) for i in range(8) for j in range(50)]